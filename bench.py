@@ -0,0 +1,530 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from client_state import ClientState
+from delta import content_hash
+from history import HistoryStore
+from protocol import RECV_BUFFER_SIZE, FrameDecoder, available_codecs, encode_message
+from server_state import SERVER_FILES_DIR, ServerState
+from storage import DURABILITY_MODES, DiskWriter, FileStore
+
+
+MESSAGE_SIZES = [256, 1024, 4 * 1024, 64 * 1024, 1024 * 1024, 5 * 1024 * 1024]
+WORDS = "editare fișier partajat server client rețea conținut versiune blocare actualizare ștergere adăugare".split()
+
+
+def sample_text(size: int, seed: int = 0):
+	rng = random.Random(seed)
+	lines = []
+	length = 0
+	while length < size:
+		line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))) + "\n"
+		lines.append(line)
+		length += len(line)
+	return "".join(lines)[:size]
+
+
+def measure(function, repeat: int):
+	start = time.perf_counter()
+	for _ in range(repeat):
+		result = function()
+	return result, (time.perf_counter() - start) / repeat
+
+
+def bench_compression(repeat: int):
+	results = []
+	for size in MESSAGE_SIZES:
+		content = sample_text(size)
+		message = {"type": "VIEW_RESPONSE", "status": 200, "message": "Fișier descărcat cu succes.", "payload": {"file": "f.txt", "content": content}}
+		runs = max(1, repeat * 64 * 1024 // max(size, 64 * 1024))
+
+		for compression in [None] + available_codecs():
+			frame, encode_time = measure(lambda: encode_message(message, compression), runs)
+			decoder = FrameDecoder()
+			_, decode_time = measure(lambda: list(decoder.messages(frame)), runs)
+			results.append(
+				{
+					"size": size,
+					"codec": compression or "none",
+					"wire_bytes": len(frame),
+					"ratio": round(len(frame) / len(content.encode("utf-8")), 3),
+					"encode_us": round(encode_time * 1e6, 1),
+					"decode_us": round(decode_time * 1e6, 1),
+				}
+			)
+	return results
+
+
+CONTROL_MESSAGE = {"type": "FILE_LOCKED", "status": 200, "message": "ana a blocat fișierul.txt.", "payload": {"file": "fișierul.txt", "user": "ana"}}
+
+
+def bench_encoding(repeat: int):
+	# JSON față de codificarea binară, fără compresie, pentru un mesaj de control și pentru conținut de diverse dimensiuni
+	messages = [("control", CONTROL_MESSAGE)]
+	for size in MESSAGE_SIZES:
+		content = sample_text(size)
+		messages.append((size, {"type": "VIEW_RESPONSE", "status": 200, "message": "Fișier descărcat cu succes.", "payload": {"file": "f.txt", "content": content, "version": "0" * 32}}))
+
+	results = []
+	for size, message in messages:
+		runs = 50 * repeat if size == "control" else max(1, repeat * 64 * 1024 // max(size, 64 * 1024))
+		for encoding in ("json", "binary"):
+			frame, encode_time = measure(lambda: encode_message(message, encoding=encoding), runs)
+			decoder = FrameDecoder()
+			_, decode_time = measure(lambda: list(decoder.messages(frame)), runs)
+			results.append(
+				{
+					"size": size,
+					"encoding": encoding,
+					"wire_bytes": len(frame),
+					"encode_us": round(encode_time * 1e6, 1),
+					"decode_us": round(decode_time * 1e6, 1),
+				}
+			)
+	return results
+
+
+WRITE_SIZE = 16 * 1024
+WRITE_THREADS = [1, 8, 32]
+
+
+def write_in_place(path: str, data: bytes):
+	# comportamentul inițial al serverului: fișierul este rescris pe loc
+	with open(path, "wb") as f:
+		f.write(data)
+
+
+def run_writers(write, directory: str, threads: int, repeat: int, data: bytes):
+	# fiecare fir salvează repetat propriul fișier, ca niște UPDATE-uri concurente pe fișiere diferite
+	latencies = []
+	lock = threading.Lock()
+
+	def writer(index: int):
+		path = os.path.join(directory, f"f{index}.txt")
+		local = []
+		for _ in range(repeat):
+			start = time.perf_counter()
+			write(path, data)
+			local.append(time.perf_counter() - start)
+		with lock:
+			latencies.extend(local)
+
+	workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+	start = time.perf_counter()
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	return latencies, time.perf_counter() - start
+
+
+def bench_writes(repeat: int):
+	data = sample_text(WRITE_SIZE).encode("utf-8")
+	results = []
+	for threads in WRITE_THREADS:
+		for mode in ("in-place",) + DURABILITY_MODES:
+			with tempfile.TemporaryDirectory(dir=".") as directory:
+				store = FileStore(mode) if mode != "in-place" else None
+				write = store.write if store else write_in_place
+				latencies, elapsed = run_writers(write, directory, threads, repeat, data)
+			latencies.sort()
+			results.append(
+				{
+					"threads": threads,
+					"mode": mode,
+					"ops_per_s": round(len(latencies) / elapsed),
+					"p50_ms": round(statistics.median(latencies) * 1000, 3),
+					"p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+					"fsync_batches": store.batches if store else 0,
+				}
+			)
+	return results
+
+
+STARTUP_FILES = 100_000
+STARTUP_CHANGES = 100
+
+
+def scan_listdir():
+	# pornirea inițială a serverului: os.path.isfile pentru fiecare intrare
+	return [name for name in os.listdir(SERVER_FILES_DIR) if os.path.isfile(os.path.join(SERVER_FILES_DIR, name))]
+
+
+def bench_startup(repeat: int):
+	runs = max(1, repeat // 4)
+	results = []
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory(dir=".") as directory:
+		os.chdir(directory)
+		try:
+			os.makedirs(SERVER_FILES_DIR)
+			for i in range(STARTUP_FILES):
+				with open(os.path.join(SERVER_FILES_DIR, f"f{i}.txt"), "wb") as f:
+					f.write(b"x")
+
+			def row(case: str, seconds: float):
+				results.append({"case": case, "files": STARTUP_FILES, "seconds": round(seconds, 4)})
+
+			row("listdir+isfile", measure(scan_listdir, runs)[1])
+			state, seconds = measure(ServerState, runs)
+			row("cold", seconds)
+
+			for file in list(state.files)[: STARTUP_FILES // 10]:
+				state.file_version(file)
+			row("snapshot save", measure(state.save_snapshot, runs)[1])
+			row("warm", measure(ServerState, runs)[1])
+
+			for i in range(STARTUP_CHANGES):
+				os.remove(os.path.join(SERVER_FILES_DIR, f"f{i}.txt"))
+				with open(os.path.join(SERVER_FILES_DIR, f"new{i}.txt"), "wb") as f:
+					f.write(b"y")
+			state, seconds = measure(ServerState, runs)
+			row(f"warm, {STARTUP_CHANGES} changed", seconds)
+			assert len(state.files) == STARTUP_FILES
+		finally:
+			os.chdir(cwd)
+	return results
+
+
+LOGIN_FILES = [1_000, 10_000, 100_000]
+
+
+class BenchConnection:
+	compression = None
+
+
+def bench_login(repeat: int):
+	# AUTH cu lista inline față de AUTH fără listă urmat de prima pagină LIST, pe un index în memorie
+	results = []
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory(dir=".") as directory:
+		os.chdir(directory)
+		try:
+			state = ServerState()
+			users = itertools.count()
+			for count in LOGIN_FILES:
+				state.files = {f"f{i:06}.txt": {"locked_by": None, "viewers": {}, "version": None} for i in range(count)}
+				state.index = sorted(state.files)
+
+				for inline in (True, False):
+					def login():
+						conn = BenchConnection()
+						frames = [encode_message(state.handle_auth(conn, {"username": f"u{next(users)}", "list": inline}))]
+						if not inline:
+							frames.append(encode_message(state.handle_list(conn, {})))
+						with state.registry_lock:
+							state.users.pop(state.clients.pop(conn), None)
+						return frames
+
+					frames, seconds = measure(login, repeat)
+					results.append(
+						{
+							"files": count,
+							"login": "AUTH inline" if inline else "AUTH + LIST",
+							"wire_bytes": sum(len(frame) for frame in frames),
+							"ms": round(seconds * 1000, 3),
+						}
+					)
+		finally:
+			os.chdir(cwd)
+	return results
+
+
+OPEN_FILES = 50
+OPEN_FILE_SIZE = 4 * 1024
+
+
+def start_server(directory: str, *options: str):
+	with socket.socket() as probe:
+		probe.bind(("localhost", 0))
+		port = probe.getsockname()[1]
+	server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+	command = [sys.executable, server_path, "--port", str(port), "--watch", "off", "--snapshot-interval", "0", *options]
+	server = subprocess.Popen(command, cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	for _ in range(100):
+		try:
+			socket.create_connection(("localhost", port)).close()
+			return server, port
+		except ConnectionRefusedError:
+			time.sleep(0.05)
+	server.kill()
+	raise RuntimeError("Serverul nu a pornit.")
+
+
+def receive(sock: socket.socket, decoder: FrameDecoder, count: int):
+	messages = []
+	while len(messages) < count:
+		messages.extend(decoder.messages(sock.recv(RECV_BUFFER_SIZE)))
+	return messages
+
+
+def bench_open(repeat: int):
+	# deschiderea unui set de lucru de OPEN_FILES fișiere: VIEW cu VIEW, VIEW-uri în pipeline, un singur BATCH
+	files = [f"f{i}.txt" for i in range(OPEN_FILES)]
+	views = [{"type": "VIEW", "payload": {"file": file}, "id": i} for i, file in enumerate(files)]
+	modes = {
+		"sequential": [[view] for view in views],
+		"pipelined": [views],
+		"batch": [[{"type": "BATCH", "payload": {"requests": views}}]],
+	}
+	results = []
+	with tempfile.TemporaryDirectory(dir=".") as directory:
+		os.makedirs(os.path.join(directory, SERVER_FILES_DIR))
+		for file in files:
+			with open(os.path.join(directory, SERVER_FILES_DIR, file), "w", encoding="utf-8") as f:
+				f.write(sample_text(OPEN_FILE_SIZE))
+
+		server, port = start_server(directory)
+		try:
+			users = itertools.count()
+			for mode, round_trips in modes.items():
+				times = []
+				for _ in range(repeat):
+					with socket.create_connection(("localhost", port)) as sock:
+						sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+						decoder = FrameDecoder()
+						sock.sendall(encode_message({"type": "AUTH", "payload": {"username": f"u{next(users)}", "list": False}}))
+						receive(sock, decoder, 1)
+
+						start = time.perf_counter()
+						for messages in round_trips:
+							sock.sendall(b"".join(encode_message(message) for message in messages))
+							receive(sock, decoder, len(messages))
+						times.append(time.perf_counter() - start)
+				results.append(
+					{
+						"mode": mode,
+						"files": OPEN_FILES,
+						"round_trips": len(round_trips),
+						"p50_ms": round(statistics.median(times) * 1000, 3),
+						"min_ms": round(min(times) * 1000, 3),
+					}
+				)
+		finally:
+			server.terminate()
+			server.wait()
+	return results
+
+
+HISTORY_FILE_SIZE = 20 * 1024
+HISTORY_EDITS = 100  # modificări per repetiție
+HISTORY_READS = 50
+
+
+def edit_trace(count: int, seed: int = 0):
+	# versiunile succesive ale unui fișier editat des: la fiecare pas o linie este rescrisă, inserată sau ștearsă
+	rng = random.Random(seed)
+	lines = sample_text(HISTORY_FILE_SIZE, seed).splitlines(keepends=True)
+	versions = ["".join(lines)]
+	for _ in range(count):
+		position = rng.randrange(len(lines))
+		line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))) + "\n"
+		match rng.choice(("replace", "replace", "insert", "delete")):
+			case "replace":
+				lines[position] = line
+			case "insert":
+				lines.insert(position, line)
+			case "delete" if len(lines) > 1:
+				del lines[position]
+		versions.append("".join(lines))
+	return versions
+
+
+def bench_history(repeat: int):
+	# istoricul cu patch-uri față de păstrarea fiecărei versiuni ca un fișier întreg, pe aceeași secvență de UPDATE-uri
+	versions = edit_trace(repeat * HISTORY_EDITS)
+	hashes = [content_hash(content) for content in versions]
+	logical = sum(len(content.encode("utf-8")) for content in versions)
+	rng = random.Random(1)
+	reads = [rng.randrange(len(versions)) for _ in range(HISTORY_READS)]
+	results = []
+	for case in ("copies", "history"):
+		with tempfile.TemporaryDirectory(dir=".") as directory:
+			store = FileStore()
+			history = HistoryStore(directory, store)
+			latencies = []
+			for i, content in enumerate(versions):
+				start = time.perf_counter()
+				if case == "copies":
+					store.write(os.path.join(directory, hashes[i]), content.encode("utf-8"))
+				elif i == 0:
+					history.record("f.txt", content, hashes[i], "bench")
+				else:
+					history.record("f.txt", content, hashes[i], "bench", versions[i - 1], hashes[i - 1])
+				latencies.append(time.perf_counter() - start)
+
+			stored = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+			start = time.perf_counter()
+			for i in reads:
+				if case == "copies":
+					with open(os.path.join(directory, hashes[i]), "rb") as f:
+						content = f.read().decode("utf-8")
+				else:
+					content = history.read(hashes[i])
+				assert content == versions[i]
+			read_time = (time.perf_counter() - start) / len(reads)
+
+		latencies.sort()
+		results.append(
+			{
+				"case": case,
+				"versions": len(versions),
+				"logical_mb": round(logical / 1024 / 1024, 2),
+				"stored_mb": round(stored / 1024 / 1024, 3),
+				"bytes_per_update": round(stored / len(versions)),
+				"p50_ms": round(statistics.median(latencies) * 1000, 3),
+				"p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+				"read_old_ms": round(read_time * 1000, 3),
+			}
+		)
+	return results
+
+
+CLIENT_FILES = 10
+CLIENT_FILE_SIZE = 64 * 1024
+CLIENT_UPDATES = 50  # FILE_UPDATED per repetiție
+
+
+def bench_client_writes(repeat: int):
+	# timpul petrecut de firul care citește socketul cu FILE_UPDATED pentru fișiere urmărite: sync așteaptă
+	# fiecare scriere pe disc (ca înainte de DiskWriter), background doar o pune în coadă
+	files = [f"f{i}.txt" for i in range(CLIENT_FILES)]
+	contents = [sample_text(CLIENT_FILE_SIZE, seed) for seed in range(4)]
+	messages = [
+		{"type": "FILE_UPDATED", "status": 200, "payload": {"file": files[i % CLIENT_FILES], "version": f"v{i}", "content": contents[i % 4]}}
+		for i in range(repeat * CLIENT_UPDATES)
+	]
+	results = []
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory(dir=".") as directory:
+		os.chdir(directory)
+		try:
+			for durability in ("none", "fsync"):
+				for mode in ("sync", "background"):
+					state = ClientState()
+					state.writer = DiskWriter(FileStore(durability))
+					state.handle_response({"type": "AUTH_RESPONSE", "status": 200, "payload": {"username": f"{durability}-{mode}", "files": {}}})
+					for file in files:
+						state.handle_response({"type": "VIEW_RESPONSE", "status": 200, "payload": {"file": file, "version": "v", "content": ""}})
+					state.writer.flush()
+
+					start = time.perf_counter()
+					for message in messages:
+						state.handle_response(message)
+						if mode == "sync":
+							state.writer.flush()
+					listener = time.perf_counter() - start
+					state.writer.flush()
+					total = time.perf_counter() - start
+					stats = state.writer.stats()
+					results.append(
+						{
+							"durability": durability,
+							"mode": mode,
+							"messages": len(messages),
+							"listener_msg_s": round(len(messages) / listener),
+							"drained_s": round(total, 3),
+							"disk_writes": stats["written"],
+							"coalesced": stats["coalesced"],
+						}
+					)
+		finally:
+			os.chdir(cwd)
+	return results
+
+
+RANGE_FILE_SIZE = 32 * 1024 * 1024
+RANGE_WINDOW = 100  # linii
+
+
+def bench_range(repeat: int):
+	# VIEW pe un jurnal mare: fișierul întreg (cât citește un transfer în bucăți) față de un interval de linii
+	# sau de octeți; prima cerere pe linii construiește indexul, următoarele fac un singur seek
+	results = []
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory(dir=".") as directory:
+		os.chdir(directory)
+		try:
+			os.makedirs(SERVER_FILES_DIR)
+			with open(os.path.join(SERVER_FILES_DIR, "log.txt"), "w", encoding="utf-8") as f:
+				f.write(sample_text(RANGE_FILE_SIZE))
+			state = ServerState()
+			state.history = None
+
+			def read_full():
+				with state.file_lock("log.txt"):
+					stream = state.open_stream("VIEW_RESPONSE", "", "log.txt")
+				try:
+					return len(stream.file.read())
+				finally:
+					stream.close()
+
+			def read_window(window: tuple):
+				with state.file_lock("log.txt"):
+					state.current_version("log.txt")
+					return len(state.read_window("log.txt", window)["content"].encode("utf-8"))
+
+			cases = [
+				("full", read_full, repeat),
+				("lines tail, cold", lambda: read_window(("lines", -RANGE_WINDOW, None)), 1),
+				("lines tail", lambda: read_window(("lines", -RANGE_WINDOW, None)), repeat),
+				("lines middle", lambda: read_window(("lines", 100_000, 100_000 + RANGE_WINDOW)), repeat),
+				("bytes tail", lambda: read_window(("bytes", -8192, None)), repeat),
+			]
+			file_mb = round(os.path.getsize(state.file_path("log.txt")) / 1024 / 1024, 1)
+			for case, function, runs in cases:
+				size, seconds = measure(function, runs)
+				results.append({"case": case, "file_mb": file_mb, "bytes_read": size, "ms": round(seconds * 1000, 3)})
+		finally:
+			os.chdir(cwd)
+	return results
+
+
+BENCHMARKS = {
+	"compression": bench_compression,
+	"encoding": bench_encoding,
+	"writes": bench_writes,
+	"startup": bench_startup,
+	"login": bench_login,
+	"open": bench_open,
+	"history": bench_history,
+	"client-writes": bench_client_writes,
+	"range": bench_range,
+}
+
+
+def print_results(results: list[dict]):
+	columns = list(results[0])
+	print(" | ".join(f"{column:>12}" for column in columns))
+	for row in results:
+		print(" | ".join(f"{row[column]!s:>12}" for column in columns))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Microbenchmark-uri pentru protocol și server.")
+	parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+	parser.add_argument("--repeat", type=int, default=20)
+	parser.add_argument("--output", help="fișier JSONL în care se adaugă rezultatele")
+	args = parser.parse_args()
+
+	results = BENCHMARKS[args.benchmark](args.repeat)
+	print_results(results)
+
+	if args.output:
+		with open(args.output, "a", encoding="utf-8") as f:
+			for row in results:
+				f.write(json.dumps({"benchmark": args.benchmark, **row}) + "\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,182 @@
+from array import array
+import sys
+import threading
+from collections import OrderedDict
+
+from protocol import CODECS
+
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+MAX_LINE_INDEXES = 128  # fișiere pentru care se păstrează indexul liniilor
+
+
+class CacheEntry:
+	def __init__(self, content: str, data: bytes, version: str, stamp: tuple):
+		self.content: str = content
+		self.data: bytes = data  # conținutul codificat UTF-8
+		self.version: str = version
+		self.stamp: tuple = stamp  # (mtime_ns, size) de pe disc, pentru a detecta modificările din afară
+		self.compressed: dict[str, bytes] = {}  # codec -> conținutul comprimat
+		self.size: int = len(data) + sys.getsizeof(content)
+
+
+class LineIndex:
+	# offsets[i] este octetul la care începe linia i; ultimul element este dimensiunea fișierului
+	def __init__(self, offsets: array, stamp: tuple):
+		self.offsets: array = offsets
+		self.stamp: tuple = stamp
+
+	def line_count(self):
+		return len(self.offsets) - 1
+
+	def span(self, start: int, end: int):
+		# octeții liniilor [start, end)
+		return self.offsets[start], self.offsets[end]
+
+
+class ContentCache:
+	def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+		self.max_bytes: int = max_bytes
+		self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+		self.versions: dict[str, tuple[tuple, str]] = {}  # fișiere prea mari pentru cache: file -> (stamp, version)
+		self.line_indexes: OrderedDict[str, LineIndex] = OrderedDict()  # pentru VIEW pe intervale de linii
+		self.size: int = 0
+		self.hits: int = 0
+		self.misses: int = 0
+		self.evictions: int = 0
+		self.invalidations: int = 0
+		self.compressed_hits: int = 0
+		self.compressed_misses: int = 0
+		self.lock = threading.Lock()
+
+	def get(self, file: str, stamp: tuple):
+		with self.lock:
+			entry = self.entries.get(file)
+			if entry is not None and entry.stamp == stamp:
+				self.entries.move_to_end(file)
+				self.hits += 1
+				return entry
+
+			if entry is not None and self.discard(file):
+				self.invalidations += 1
+			self.misses += 1
+			return None
+
+	def put(self, file: str, content: str, data: bytes, version: str, stamp: tuple):
+		entry = CacheEntry(content, data, version, stamp)
+		with self.lock:
+			self.discard(file)
+			self.line_indexes.pop(file, None)
+			if entry.size > self.max_bytes:
+				return entry
+
+			self.entries[file] = entry
+			self.size += entry.size
+			self.evict()
+		return entry
+
+	def get_version(self, file: str, stamp: tuple):
+		with self.lock:
+			entry = self.entries.get(file)
+			if entry is not None and entry.stamp == stamp:
+				return entry.version
+			known = self.versions.get(file)
+			if known is not None and known[0] == stamp:
+				return known[1]
+			return None
+
+	def has_version(self, file: str):
+		# dacă se cunoaște o versiune pentru file, valabilă sau nu pentru stamp-ul curent
+		with self.lock:
+			return file in self.entries or file in self.versions
+
+	def put_version(self, file: str, stamp: tuple, version: str):
+		with self.lock:
+			self.versions[file] = (stamp, version)
+
+	def get_line_index(self, file: str, stamp: tuple):
+		with self.lock:
+			index = self.line_indexes.get(file)
+			if index is None or index.stamp != stamp:
+				return None
+			self.line_indexes.move_to_end(file)
+			return index
+
+	def put_line_index(self, file: str, offsets: array, stamp: tuple):
+		index = LineIndex(offsets, stamp)
+		with self.lock:
+			self.line_indexes[file] = index
+			self.line_indexes.move_to_end(file)
+			while len(self.line_indexes) > MAX_LINE_INDEXES:
+				self.line_indexes.popitem(last=False)
+		return index
+
+	def known_versions(self):
+		# file -> (stamp, version) pentru toate fișierele a căror versiune este cunoscută
+		with self.lock:
+			known = {file: stamp_version for file, stamp_version in self.versions.items()}
+			for file, entry in self.entries.items():
+				known[file] = (entry.stamp, entry.version)
+		return known
+
+	def compressed(self, file: str, content: str, compression: str):
+		# forma comprimată se păstrează doar pentru conținutul aflat acum în cache (același obiect)
+		with self.lock:
+			entry = self.entries.get(file)
+			if entry is None or entry.content is not content:
+				return None
+			data = entry.compressed.get(compression)
+			if data is not None:
+				self.compressed_hits += 1
+				return data
+			self.compressed_misses += 1
+
+		data = CODECS[compression].compress(entry.data)
+		with self.lock:
+			if self.entries.get(file) is entry and compression not in entry.compressed:
+				entry.compressed[compression] = data
+				entry.size += len(data)
+				self.size += len(data)
+				self.evict()
+		return data
+
+	def invalidate(self, file: str):
+		with self.lock:
+			self.versions.pop(file, None)
+			self.line_indexes.pop(file, None)
+			if self.discard(file):
+				self.invalidations += 1
+
+	def discard(self, file: str):
+		entry = self.entries.pop(file, None)
+		if entry is None:
+			return False
+		self.size -= entry.size
+		return True
+
+	def evict(self):
+		while self.size > self.max_bytes and self.entries:
+			_, entry = self.entries.popitem(last=False)
+			self.size -= entry.size
+			self.evictions += 1
+
+	def resize(self, max_bytes: int):
+		with self.lock:
+			self.max_bytes = max_bytes
+			self.evict()
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return {
+			"entries": len(self.entries),
+			"bytes": self.size,
+			"max_bytes": self.max_bytes,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+			"evictions": self.evictions,
+			"invalidations": self.invalidations,
+			"compressed_hits": self.compressed_hits,
+			"compressed_misses": self.compressed_misses,
+			"line_indexes": len(self.line_indexes),
+		}
@@ -3,40 +3,124 @@ import os
 import socket
 import sys
 import threading
+import time
 
 from client_state import ClientState
 from printing import print_error, print_info, print_prompt, print_response
+from protocol import ENCODINGS, RECV_BUFFER_SIZE, FrameDecoder, FrameError, available_codecs, decode_message, encode_message
+from streaming import FLAG_CHUNK, STREAM_THRESHOLD, IncomingStream, OutgoingStream
 
 
 state: ClientState = ClientState()
+send_lock = threading.Lock()  # firul de HEARTBEAT și bucla de comenzi scriu pe același socket
 
 SERVER_ADDRESS = ("localhost", 12345)
+LIST_PAGE_SIZE = 50
+
+
+def print_file_list(files):
+	raspuns = "Lista de fisiere:\n"
+	for f in files:
+		info = state.files.get(f, {})
+		lock = info.get("locked_by") or "-"
+		viewing = "✓" if info.get("viewing") else "-"
+		raspuns += f"- {f} | locked by: {lock} | viewing: {viewing}\n"
+	print_info(raspuns.strip())
+
+
+def print_history(payload: dict):
+	raspuns = f"Istoricul fișierului {payload['file']} ({payload['total']} versiuni):\n"
+	for entry in payload["versions"]:
+		moment = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"]))
+		raspuns += f"- {entry['version'][:12]} | {moment} | {entry.get('user') or '-'} | {entry['size']} B\n"
+	print_info(raspuns.strip())
+
+
+def deliver(response: dict):
+	if response.get("type") == "HEARTBEAT_RESPONSE":
+		return
+	print_response(response)
+	if response.get("type") == "BATCH_RESPONSE":
+		for result in response.get("payload", {}).get("results", []):
+			print_response(result)
+	state.handle_response(response)
+	if response.get("type") == "HISTORY_RESPONSE" and response.get("status") == 200:
+		print_history(response["payload"])
+	if response.get("type") == "STATS_RESPONSE" and response.get("status") == 200:
+		print_info(json.dumps(response["payload"], indent=2, ensure_ascii=False))
+	if response.get("type") == "LIST_RESPONSE" and response.get("status") == 200:
+		print_file_list(response["payload"].get("files", {}))
+		if response["payload"].get("next_cursor"):
+			print_info("[CLIENT] Mai sunt fișiere: MORE pentru pagina următoare.")
+	print_prompt()
+
+
+def finish_stream(incoming: IncomingStream):
+	if incoming.path is not None:
+		state.commit_stream(incoming)
+	deliver(incoming.message)
 
 
 def listen_to_server(sock: socket.socket):
+	decoder = FrameDecoder()
+	incoming: IncomingStream = None
 	while True:
 		try:
-			data = sock.recv(4096)
+			data = sock.recv(RECV_BUFFER_SIZE)
 			if not data:
 				print_error("[CLIENT] Conexiune închisă de server.")
 				print_prompt()
 				break
 
-			response: dict = json.loads(data.decode("utf-8"))
-			print_response(response)
-			state.handle_response(response)
-			print_prompt()
+			for flags, body in decoder.feed(data):
+				if flags & FLAG_CHUNK:
+					# bucățile unui fișier mare sunt scrise direct pe disc, fără a fi ținute în memorie
+					if incoming is not None and incoming.write(body):
+						finish_stream(incoming)
+						incoming = None
+					continue
+
+				response = decode_message(body, flags, decoder.max_frame_size)
+				if "stream" in response.get("payload", {}):
+					incoming = IncomingStream(response, state.stream_target(response))
+					if incoming.is_complete():
+						finish_stream(incoming)
+						incoming = None
+					continue
+
+				deliver(response)
 
 		except OSError:
 			break
 
+		except FrameError as e:
+			print_error(f"[CLIENT] Mesaj invalid de la server: {e}")
+			print_prompt()
+			break
+
 		except Exception as e:
 			print_error(f"[CLIENT] Eroare la ascultare: {e}")
 			print_prompt()
 			break
 
+	if incoming is not None:
+		incoming.discard()
+
+
+def send_heartbeats(sock: socket.socket):
+	# fără activitate, serverul eliberează lock-urile și închide conexiunea după termenele anunțate la AUTH
+	while True:
+		time.sleep(state.heartbeat or 1.0)
+		if state.heartbeat is None:
+			continue
+		try:
+			with send_lock:
+				sock.sendall(encode_message({"type": "HEARTBEAT", "payload": {}}, state.compression, encoding=state.encoding))
+		except OSError:
+			return
+
 
-def handle_request(request: str) -> dict | None:
+def handle_request(request: str) -> dict | OutgoingStream | None:
 	tokens = request.strip().split(maxsplit=1)
 	if not tokens:
 		print_error("[CLIENT] Comandă invalidă.")
@@ -55,14 +139,49 @@ def handle_request(request: str) -> dict | None:
 				print_prompt()
 				return None
 			payload["username"] = arg
+			payload["compression"] = available_codecs()
+			payload["encoding"] = ENCODINGS
+			payload["list"] = False
 			return {"type": "AUTH", "payload": payload}
 
+		case "VIEW" if arg and len(arg.split()) == 3:
+			# VIEW <file> lines|bytes <start>:<end>: doar un interval, salvat ca <nume>@window.<ext>
+			file, kind, bounds = arg.split()
+			start, _, end = bounds.partition(":")
+			try:
+				payload[kind.lower()] = [int(start) if start else None, int(end) if end else None]
+			except ValueError:
+				payload = {}
+			if kind.lower() not in ("lines", "bytes") or not payload:
+				print_info("[CLIENT] Utilizare: VIEW <nume_fisier> lines|bytes <start>:<end>, de exemplu VIEW log.txt lines -100:")
+				print_prompt()
+				return None
+			payload["file"] = file
+			return {"type": "VIEW", "payload": payload}
+
+		case "VIEW" if arg and len(arg.split()) == 2:
+			# VIEW <file> <versiune>: o versiune anterioară din istoric (prefixul afișat de HISTORY)
+			payload["file"], payload["at"] = arg.split()
+			return {"type": "VIEW", "payload": payload}
+
+		case "HISTORY":
+			if not arg:
+				print_info("[CLIENT] Utilizare: HISTORY <nume_fisier>")
+				print_prompt()
+				return None
+			payload["file"] = arg
+			return {"type": "HISTORY", "payload": payload}
+
 		case "VIEW" | "LOCK" | "RELEASE" | "DELETE":
 			if not arg:
 				print_info(f"[CLIENT] Utilizare: {command} <nume_fisier>")
 				print_prompt()
 				return None
 			payload["file"] = arg
+			if command in ("VIEW", "LOCK"):
+				version = state.cached_version(arg)
+				if version:
+					payload["version"] = version
 			return {"type": command, "payload": payload}
 
 		case "UPDATE":
@@ -74,17 +193,23 @@ def handle_request(request: str) -> dict | None:
 			temp_filename = f"{name}_temp{ext}"
 
 			temp_path = f"client_files/{username}/{temp_filename}"
+			# copia de editare creată de LOCK poate fi încă în coada de scriere
+			state.writer.flush()
 
 			if not os.path.exists(temp_path):
 				print_error(f"[CLIENT] Fișierul de editat nu există: {temp_path}")
 				print_prompt()
 				return None
 
+			size = os.path.getsize(temp_path)
+			if size > STREAM_THRESHOLD:
+				state.bases.pop(arg, None)
+				return OutgoingStream({"type": "UPDATE", "payload": {"file": arg, "stream": size}}, temp_path)
+
 			with open(temp_path, "r", encoding="utf-8") as f:
 				content = f.read()
 
-			payload["file"] = arg
-			payload["content"] = content
+			payload = state.make_update_payload(arg, content)
 			return {"type": "UPDATE", "payload": payload}
 
 		case "ADD":
@@ -100,6 +225,10 @@ def handle_request(request: str) -> dict | None:
 				print_prompt()
 				return None
 
+			size = os.path.getsize(path)
+			if size > STREAM_THRESHOLD:
+				return OutgoingStream({"type": "ADD", "payload": {"file": arg, "stream": size}}, path)
+
 			with open(path, "r", encoding="utf-8") as f:
 				content = f.read()
 
@@ -108,12 +237,44 @@ def handle_request(request: str) -> dict | None:
 			return {"type": "ADD", "payload": payload}
 
 		case "LIST":
-			raspuns = "Lista de fisiere:\n"
-			for f, info in state.files.items():
-				lock = info.get("locked_by") or "-"
-				viewing = "✓" if info.get("viewing") else "-"
-				raspuns += f"- {f} | locked by: {lock} | viewing: {viewing}\n"
-			print_info(raspuns.strip())
+			payload["limit"] = LIST_PAGE_SIZE
+			if arg and any(char in arg for char in "*?["):
+				payload["glob"] = arg
+			elif arg:
+				payload["prefix"] = arg
+			state.list_query = payload
+			return {"type": "LIST", "payload": dict(payload)}
+
+		case "BATCH":
+			# BATCH <VIEW|LOCK|RELEASE> <file> [<file> ...]: toate cererile într-un singur drum dus-întors
+			parts = arg.split() if arg else []
+			if len(parts) < 2 or parts[0].upper() not in ("VIEW", "LOCK", "RELEASE"):
+				print_info("[CLIENT] Utilizare: BATCH <VIEW|LOCK|RELEASE> <file> [<file> ...]")
+				print_prompt()
+				return None
+			batch_type = parts[0].upper()
+			requests = []
+			for file in parts[1:]:
+				item = {"type": batch_type, "payload": {"file": file}}
+				version = state.cached_version(file) if batch_type != "RELEASE" else None
+				if version:
+					item["payload"]["version"] = version
+				state.track_request(item)
+				requests.append(item)
+			return {"type": "BATCH", "payload": {"requests": requests}}
+
+		case "MORE":
+			if state.list_query is None or not state.list_query.get("cursor"):
+				print_info("[CLIENT] Nu mai sunt fișiere de listat.")
+				print_prompt()
+				return None
+			return {"type": "LIST", "payload": dict(state.list_query)}
+
+		case "STATS":
+			return {"type": "STATS", "payload": payload}
+
+		case "FILES":
+			print_file_list(state.files)
 			print_prompt()
 			return None
 
@@ -121,12 +282,20 @@ def handle_request(request: str) -> dict | None:
 			print_info("""Comenzi disponibile:
 - AUTH <username>           | autentificare
 - VIEW <file>               | descarcă un fișier read-only
+- VIEW <file> <versiune>    | descarcă o versiune anterioară ca <nume>@<versiune>.<ext>
+- VIEW <file> lines <a>:<b> | descarcă doar liniile [a, b) ca <nume>@window.<ext>, urmărite apoi
+                              (bytes <a>:<b> pentru octeți; negativ = de la sfârșit, gol = până la capăt)
+- HISTORY <file>            | afișează versiunile anterioare ale fișierului
 - LOCK <file>               | începe editarea unui fișier
 - UPDATE <file>             | trimite modificările
 - RELEASE <file>            | eliberează un fișier
 - ADD <file>                | adaugă un fișier local pe server
 - DELETE <file>             | șterge un fișier de pe server
-- LIST                      | afișează lista locală de fișiere
+- LIST [prefix|glob]        | afișează fișierele de pe server, pe pagini
+- MORE                      | pagina următoare a ultimei listări
+- BATCH <cmd> <f1> <f2> ... | VIEW/LOCK/RELEASE pe mai multe fișiere dintr-o dată
+- FILES                     | afișează lista locală de fișiere
+- STATS                     | afișează statisticile serverului
 - HELP                      | afișează comenzile disponibile
 - EXIT                      | ieșire din aplicație""")
 			print_prompt()
@@ -146,6 +315,7 @@ def main():
 
 		broadcast_thread = threading.Thread(target=listen_to_server, args=(client_socket,), daemon=True)
 		broadcast_thread.start()
+		threading.Thread(target=send_heartbeats, args=(client_socket,), daemon=True).start()
 
 		print_prompt()
 		while True:
@@ -156,8 +326,17 @@ def main():
 					break
 
 				json_msg = handle_request(request)
-				if json_msg:
-					client_socket.sendall(json.dumps(json_msg).encode("utf-8"))
+				if isinstance(json_msg, OutgoingStream):
+					state.track_request(json_msg.message)
+					try:
+						with send_lock:
+							json_msg.send_to(client_socket)
+					finally:
+						json_msg.close()
+				elif json_msg:
+					state.track_request(json_msg)
+					with send_lock:
+						client_socket.sendall(encode_message(json_msg, state.compression, encoding=state.encoding))
 
 			except KeyboardInterrupt:
 				break
@@ -172,7 +351,7 @@ def main():
 
 	finally:
 		client_socket.close()
-		state.remove_local_directory()
+		state.writer.flush()
 		print_info("[CLIENT] S-a închis.")
 
 
@@ -0,0 +1,240 @@
+import asyncio
+import os
+
+from client_state import ClientState
+from protocol import ENCODINGS, RECV_BUFFER_SIZE, FrameDecoder, FrameError, available_codecs, decode_message, encode_message
+from streaming import FLAG_CHUNK, STREAM_THRESHOLD, IncomingStream, OutgoingStream
+
+
+SERVER_HOST = "localhost"
+SERVER_PORT = 12345
+
+# Client asyncio pentru automatizări, fără interfață:
+#
+#   async with await AsyncClient.connect("bot") as client:
+#       response = await client.lock("config.txt")
+#       await client.update("config.txt", "cheie = valoare\n")
+#       await client.release("config.txt")
+#       async for event in client.events():  # FILE_ADDED, FILE_UPDATED, ...
+#           ...
+#
+# Fiecare cerere primește un id și se încheie cu răspunsul cu același id (un dict cu type, status, message,
+# payload), deci mai multe cereri pot fi în zbor simultan. Copiile locale și versiunile lor rămân în
+# ClientState, în client_files/<username>/, ca la clientul interactiv.
+
+
+class AsyncClient:
+	def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		self.reader: asyncio.StreamReader = reader
+		self.writer: asyncio.StreamWriter = writer
+		self.state = ClientState()
+		self.pending: dict[int, asyncio.Future] = {}  # id -> răspunsul așteptat
+		self.subscribers: list[asyncio.Queue] = []  # cozile iteratorilor events() activi
+		self.send_lock = asyncio.Lock()  # un transfer în bucăți nu poate fi întrerupt de alte cadre
+		self.closed: bool = False
+		self.task = asyncio.get_running_loop().create_task(self.run())
+		self.heartbeat_task: asyncio.Task | None = None
+
+	@classmethod
+	async def connect(cls, username: str = None, host: str = SERVER_HOST, port: int = SERVER_PORT, encoding: str = "binary"):
+		# cu username, conexiunea este și autentificată; un AUTH respins închide conexiunea cu ConnectionError
+		reader, writer = await asyncio.open_connection(host, port)
+		client = cls(reader, writer)
+		if username is not None:
+			response = await client.auth(username, encoding)
+			if response["status"] != 200:
+				await client.close()
+				raise ConnectionError(response.get("message", "Autentificare eșuată."))
+		return client
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.close()
+
+	async def run(self):
+		decoder = FrameDecoder()
+		incoming: IncomingStream = None
+		try:
+			while data := await self.reader.read(RECV_BUFFER_SIZE):
+				for flags, body in decoder.feed(data):
+					if flags & FLAG_CHUNK:
+						# bucățile unui fișier mare sunt scrise direct pe disc, fără a fi ținute în memorie
+						if incoming is not None and incoming.write(body):
+							self.finish_stream(incoming)
+							incoming = None
+						continue
+
+					message = decode_message(body, flags, decoder.max_frame_size)
+					if "stream" in message.get("payload", {}):
+						incoming = IncomingStream(message, self.state.stream_target(message))
+						if incoming.is_complete():
+							self.finish_stream(incoming)
+							incoming = None
+						continue
+					self.receive(message)
+		except (OSError, FrameError, ValueError):
+			pass
+		finally:
+			if incoming is not None:
+				incoming.discard()
+			self.closed = True
+			for future in self.pending.values():
+				if not future.done():
+					future.set_exception(ConnectionError("Conexiunea cu serverul s-a închis."))
+			self.pending.clear()
+			for queue in self.subscribers:
+				queue.put_nowait(None)
+
+	def finish_stream(self, incoming: IncomingStream):
+		if incoming.path is not None:
+			self.state.commit_stream(incoming)
+		self.receive(incoming.message)
+
+	def receive(self, message: dict):
+		self.state.handle_response(message)
+		if message.get("type", "").startswith("FILE_"):
+			for queue in self.subscribers:
+				queue.put_nowait(message)
+		future = self.pending.pop(message.get("id"), None)
+		if future is not None and not future.done():
+			future.set_result(message)
+
+	async def events(self):
+		# notificările FILE_* primite de la începutul iterației; se termină când conexiunea se închide
+		queue: asyncio.Queue = asyncio.Queue()
+		self.subscribers.append(queue)
+		try:
+			while (event := await queue.get()) is not None:
+				yield event
+		finally:
+			self.subscribers.remove(queue)
+
+	async def request(self, message: dict | OutgoingStream):
+		if self.closed:
+			raise ConnectionError("Conexiunea cu serverul s-a închis.")
+		stream = message if isinstance(message, OutgoingStream) else None
+		if stream is not None:
+			message = stream.message
+		request_id = self.state.track_request(message)
+		future = asyncio.get_running_loop().create_future()
+		self.pending[request_id] = future
+
+		try:
+			async with self.send_lock:
+				if stream is not None:
+					await stream.write_to(self.writer, asyncio.get_running_loop())
+				else:
+					self.writer.write(encode_message(message, self.state.compression, encoding=self.state.encoding))
+					await self.writer.drain()
+		except OSError as e:
+			self.pending.pop(request_id, None)
+			raise ConnectionError(str(e)) from e
+		finally:
+			if stream is not None:
+				stream.close()
+		return await future
+
+	async def auth(self, username: str, encoding: str = "binary"):
+		payload = {"username": username, "compression": available_codecs(), "list": False}
+		payload["encoding"] = ENCODINGS if encoding == "binary" else ["json"]
+		response = await self.request({"type": "AUTH", "payload": payload})
+		if self.state.heartbeat and self.heartbeat_task is None:
+			self.heartbeat_task = asyncio.get_running_loop().create_task(self.send_heartbeats())
+		return response
+
+	async def send_heartbeats(self):
+		# păstrează lock-urile și conexiunea cât timp sesiunea este deschisă, chiar fără alte cereri
+		while not self.closed:
+			await asyncio.sleep(self.state.heartbeat)
+			try:
+				await self.request({"type": "HEARTBEAT", "payload": {}})
+			except ConnectionError:
+				return
+
+	def file_payload(self, file: str, cached: bool = False):
+		payload = {"file": file}
+		version = self.state.cached_version(file) if cached else None
+		if version:
+			payload["version"] = version
+		return payload
+
+	async def view(self, file: str, at: str = None, lines: tuple = None, byte_range: tuple = None):
+		# cu at (o versiune sau un prefix al ei) se descarcă o versiune din istoric, fără abonare la modificări;
+		# cu lines sau byte_range, (start, end) ca la slice, doar acel interval, urmărit apoi prin FILE_UPDATED
+		if at is not None:
+			return await self.request({"type": "VIEW", "payload": {"file": file, "at": at}})
+		if lines is not None:
+			return await self.request({"type": "VIEW", "payload": {"file": file, "lines": list(lines)}})
+		if byte_range is not None:
+			return await self.request({"type": "VIEW", "payload": {"file": file, "bytes": list(byte_range)}})
+		return await self.request({"type": "VIEW", "payload": self.file_payload(file, cached=True)})
+
+	async def lock(self, file: str):
+		return await self.request({"type": "LOCK", "payload": self.file_payload(file, cached=True)})
+
+	async def update(self, file: str, content: str = None):
+		# fără content se trimite copia de editare locală (fișierul _temp creat de LOCK), ca la clientul interactiv
+		path = self.state.get_temp_file_path(file)
+		if content is not None:
+			self.state.save_temp_file(file, content)
+		# copiile locale sunt scrise în fundal; fișierul trimis trebuie să fie complet pe disc
+		await asyncio.get_running_loop().run_in_executor(None, self.state.writer.flush)
+		size = os.path.getsize(path)
+		if size > STREAM_THRESHOLD:
+			self.state.bases.pop(file, None)
+			return await self.request(OutgoingStream({"type": "UPDATE", "payload": {"file": file, "stream": size}}, path))
+
+		if content is None:
+			with open(path, "r", encoding="utf-8") as f:
+				content = f.read()
+		return await self.request({"type": "UPDATE", "payload": self.state.make_update_payload(file, content)})
+
+	async def release(self, file: str):
+		return await self.request({"type": "RELEASE", "payload": self.file_payload(file)})
+
+	async def add(self, file: str, content: str = None):
+		# fără content se trimite fișierul local client_files/<username>/<file>
+		if content is None:
+			path = os.path.join(self.state.local_directory, file)
+			size = os.path.getsize(path)
+			if size > STREAM_THRESHOLD:
+				return await self.request(OutgoingStream({"type": "ADD", "payload": {"file": file, "stream": size}}, path))
+			with open(path, "r", encoding="utf-8") as f:
+				content = f.read()
+		return await self.request({"type": "ADD", "payload": {"file": file, "content": content}})
+
+	async def delete(self, file: str):
+		return await self.request({"type": "DELETE", "payload": self.file_payload(file)})
+
+	async def list_files(self, prefix: str = None, glob: str = None, cursor: str = None, limit: int = None):
+		payload = {key: value for key, value in (("prefix", prefix), ("glob", glob), ("cursor", cursor), ("limit", limit)) if value is not None}
+		return await self.request({"type": "LIST", "payload": payload})
+
+	async def batch(self, request_type: str, files: list[str]):
+		# fișierele mari nu încap în BATCH_RESPONSE: rezultatul lor (status 202) este urmat de un transfer separat
+		requests = []
+		for file in files:
+			item = {"type": request_type, "payload": self.file_payload(file, cached=request_type != "RELEASE")}
+			self.state.track_request(item)
+			requests.append(item)
+		return await self.request({"type": "BATCH", "payload": {"requests": requests}})
+
+	async def history(self, file: str, limit: int = None):
+		payload = {"file": file} if limit is None else {"file": file, "limit": limit}
+		return await self.request({"type": "HISTORY", "payload": payload})
+
+	async def stats(self):
+		return await self.request({"type": "STATS", "payload": {}})
+
+	async def close(self):
+		if self.heartbeat_task is not None:
+			self.heartbeat_task.cancel()
+		self.writer.close()
+		try:
+			await self.writer.wait_closed()
+		except OSError:
+			pass
+		await self.task
+		await asyncio.get_running_loop().run_in_executor(None, self.state.writer.flush)
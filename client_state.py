@@ -1,21 +1,60 @@
+import itertools
+import json
 import os
 import shutil
+import threading
+
+from delta import apply_patch, make_patch, patch_size
+from storage import DiskWriter
+from streaming import STREAM_THRESHOLD
+
+
+WINDOW_KINDS = ("lines", "bytes")
 
 
 CLIENT_FILES_DIR = "client_files"
+CACHE_INDEX_FILE = ".cache.json"
 
 
 class ClientState:
 	def __init__(self):
 		self.username: str = None
-		self.files: dict[str, dict[str, bool]] = {}  # file: str -> { locked_by: str | None, viewing: bool }
+		self.compression: str = None  # codecul acceptat de server la AUTH
+		self.encoding: str = "json"  # codificarea mesajelor acceptată de server la AUTH
+		self.heartbeat: float | None = None  # intervalul HEARTBEAT cerut de server la AUTH, pentru a păstra lock-urile
+		self.files: dict[str, dict] = {}  # file: str -> { locked_by: str | None, viewing: bool, version: str | None }
+		self.bases: dict[str, tuple[str, str]] = {}  # fișier blocat -> (versiune, conținut) pe care se calculează patch-ul
+		self.pending_updates: dict[str, str] = {}  # fișier -> conținutul trimis în UPDATE, în așteptarea răspunsului
+		# copiile locale păstrate între sesiuni: file -> { version, mtime_ns, size }
+		self.cache_index: dict[str, dict] = {}
+		self.list_query: dict | None = None  # ultima cerere LIST, cu cursorul paginii următoare
+		self.request_ids = itertools.count(1)
+		self.requests: dict[int, dict] = {}  # id -> cererea trimisă și încă fără răspuns
+		# copiile locale sunt scrise în fundal, ca firul care citește socketul să nu aștepte discul;
+		# citirile lor trec prin writer, care întoarce conținutul cel mai nou chiar înainte de scriere
+		self.writer: DiskWriter = DiskWriter()
+		self.index_lock = threading.Lock()  # cache_index este actualizat și de firul de scriere
 		os.makedirs(CLIENT_FILES_DIR, exist_ok=True)
 		self.local_directory: str = None
 
+	def track_request(self, message: dict):
+		# răspunsurile sunt asociate cererilor după id, nu după ordinea în care au fost trimise
+		request_id = next(self.request_ids)
+		message["id"] = request_id
+		self.requests[request_id] = {"type": message["type"], "file": message.get("payload", {}).get("file")}
+		if message.get("payload", {}).get("at") is not None:
+			self.requests[request_id]["at"] = message["payload"]["at"]
+		return request_id
+
 	def handle_response(self, message_json: dict):
 		msg_type: str = message_json["type"]
 		status: int = message_json.get("status", 0)
 		payload: dict = message_json.get("payload", {})
+		request = self.requests.pop(message_json.get("id"), None)
+
+		if status == 404 and request is not None and request["type"] in ("VIEW", "LOCK") and request["file"] and "at" not in request:
+			# fișierul nu mai există pe server: copia locală păstrată din sesiunile anterioare nu mai e utilă
+			self.delete_file(request["file"])
 
 		match msg_type:
 			case "AUTH_RESPONSE":
@@ -32,6 +71,11 @@ class ClientState:
 				self.handle_add_response(status, payload)
 			case "DELETE_RESPONSE":
 				self.handle_delete_response(status, payload)
+			case "LIST_RESPONSE":
+				self.handle_list_response(status, payload)
+			case "BATCH_RESPONSE":
+				for result in payload.get("results", []):
+					self.handle_response(result)
 
 			case "FILE_ADDED":
 				self.handle_file_added(payload)
@@ -51,39 +95,99 @@ class ClientState:
 		if status == 200:
 			username = payload.get("username")
 			self.username = username
+			self.compression = payload.get("compression")
+			self.encoding = payload.get("encoding", "json")
+			self.heartbeat = payload.get("heartbeat")
 			self.local_directory = os.path.join(CLIENT_FILES_DIR, self.username)
-			self.remove_local_directory()
 			os.makedirs(self.local_directory, exist_ok=True)
-			files: dict = payload.get("files", {})
-			for file, info in files.items():
+			# fără listă inline, fișierele sunt aflate pe pagini prin LIST
+			files: dict | None = payload.get("files")
+			for file, info in (files or {}).items():
 				self.files[file] = {"locked_by": info.get("locked_by"), "viewing": False}
+			self.load_cache_index(files)
 
 	def handle_view_response(self, status: int, payload: dict):
-		if status == 200:
+		if status == 200 and payload.get("at"):
+			# o versiune din istoric este salvată separat, fără a înlocui copia urmărită a fișierului;
+			# una mare a fost deja scrisă din transferul în bucăți
+			if "stream" not in payload:
+				self.save_file(self.get_version_file_name(payload["file"], payload["at"]), payload.get("content"))
+			return
+		if status == 200 and any(kind in payload for kind in WINDOW_KINDS):
+			# doar un interval: salvat separat, actualizat apoi de FILE_UPDATED cu același interval
+			file = payload["file"]
+			self.save_file(self.get_window_file_name(file), payload.get("content"))
+			self.add_file_to_local_list(file)
+			self.files[file]["viewing"] = True
+			self.files[file]["version"] = payload.get("version")
+			return
+		# 304: copia locală are deja versiunea cerută
+		if status in (200, 304):
 			file = payload.get("file")
-			content = payload.get("content")
-			self.save_file(file, content)
 			self.add_file_to_local_list(file)
 			self.files[file]["viewing"] = True
+			self.files[file]["version"] = payload.get("version")
+			if status == 200 and "stream" not in payload:
+				self.save_file(file, payload.get("content"), payload.get("version"))
+			elif status == 304:
+				self.remember_version(file, payload.get("version"))
 
 	def handle_lock_response(self, status: int, payload: dict):
-		if status == 200:
+		if status in (200, 304):
 			file = payload.get("file")
 			content = payload.get("content")
+			if file and status == 304:
+				# copia _temp este făcută de firul de scriere, după operațiile din coadă pe copia locală;
+				# baza pentru patch-uri este reținută după copiere
+				self.writer.copy(
+					os.path.join(self.local_directory, file), self.get_temp_file_path(file), self.base_remembered(file, payload.get("version"))
+				)
 			if file:
-				self.save_temp_file(file, content)
+				if status == 200 and "stream" not in payload:
+					self.save_temp_file(file, content)
 				if file not in self.files:
 					self.files[file] = {}
 				self.files[file]["locked_by"] = self.username
+				if payload.get("version") and content is not None:
+					self.bases[file] = (payload["version"], content)
+
+	def base_remembered(self, file: str, version: str):
+		# apel după scrierea copiei _temp: conținutul ei devine baza patch-urilor, dacă nu este prea mare
+		if not version:
+			return None
+
+		def remember(path: str):
+			if os.path.getsize(path) <= STREAM_THRESHOLD:
+				with open(path, "r", encoding="utf-8") as f:
+					self.bases[file] = (version, f.read())
+
+		return remember
 
 	def handle_update_response(self, status: int, payload: dict):
+		file = payload.get("file")
+		content = self.pending_updates.pop(file, None)
 		if status == 200:
-			pass
+			if content is not None and payload.get("version"):
+				self.bases[file] = (payload["version"], content)
+		elif status == 409:
+			# baza locală nu mai corespunde: următorul UPDATE trimite conținutul complet
+			self.bases.pop(file, None)
+
+	def make_update_payload(self, file: str, content: str) -> dict:
+		self.pending_updates[file] = content
+		base = self.bases.get(file)
+		if base is not None:
+			version, base_content = base
+			patch = make_patch(base_content, content)
+			if patch_size(patch) < len(content):
+				return {"file": file, "base": version, "patch": patch}
+		return {"file": file, "content": content}
 
 	def handle_release_response(self, status: int, payload: dict):
 		if status == 200:
 			file = payload.get("file")
 			self.delete_temp_file(file)
+			self.bases.pop(file, None)
 			if file in self.files:
 				self.files[file]["locked_by"] = None
 
@@ -91,15 +195,21 @@ class ClientState:
 		if status == 200:
 			file = payload.get("file")
 			self.add_file_to_local_list(file)
-			path = os.path.join(self.local_directory, file)
-			if os.path.exists(path):
-				os.remove(path)
+			self.writer.remove(os.path.join(self.local_directory, file))
 
 	def handle_delete_response(self, status: int, payload: dict):
 		if status == 200:
 			file = payload.get("file")
 			self.delete_file(file)
 
+	def handle_list_response(self, status: int, payload: dict):
+		if status == 200:
+			for file, info in payload.get("files", {}).items():
+				self.add_file_to_local_list(file)
+				self.files[file]["locked_by"] = info.get("locked_by")
+			if self.list_query is not None:
+				self.list_query["cursor"] = payload.get("next_cursor")
+
 	def handle_file_added(self, payload: dict):
 		file = payload.get("file")
 		self.add_file_to_local_list(file)
@@ -122,29 +232,88 @@ class ClientState:
 
 	def handle_file_updated(self, payload: dict):
 		file = payload.get("file")
-		content = payload.get("content")
-		if file and content and self.files.get(file, {}).get("viewing"):
-			self.save_file(file, content)
+		if not file or not self.files.get(file, {}).get("viewing"):
+			return
 
-	def save_file(self, file: str, content: str):
-		path = os.path.join(self.local_directory, file)
-		with open(path, "w", encoding="utf-8") as f:
-			f.write(content)
+		if any(kind in payload for kind in WINDOW_KINDS):
+			self.files[file]["version"] = payload.get("version")
+			self.save_file(self.get_window_file_name(file), payload.get("content"))
+			return
+
+		if "stream" in payload:
+			# conținutul vine din bucățile transferului, mutat la destinație prin commit_stream
+			self.files[file]["version"] = payload.get("version")
+			return
+
+		if "patch" in payload:
+			if self.files[file].get("version") != payload.get("base"):
+				return
+			content = apply_patch(self.read_file(file), payload["patch"])
+		else:
+			content = payload.get("content")
+			if content is None:
+				return
+
+		self.files[file]["version"] = payload.get("version")
+		self.save_file(file, content, payload.get("version"))
+
+	def read_file(self, file: str):
+		return self.writer.read(os.path.join(self.local_directory, file))
+
+	def stream_target(self, message: dict):
+		# fișierul local în care se scrie un transfer în bucăți; None dacă transferul nu este păstrat
+		payload = message.get("payload", {})
+		file = payload.get("file")
+		if not file or self.local_directory is None or message.get("status") != 200:
+			return None
+		match message["type"]:
+			case "VIEW_RESPONSE" if payload.get("at"):
+				path = os.path.join(self.local_directory, self.get_version_file_name(file, payload["at"]))
+			case "VIEW_RESPONSE":
+				path = os.path.join(self.local_directory, file)
+			case "LOCK_RESPONSE":
+				path = self.get_temp_file_path(file)
+			case "FILE_UPDATED" if self.files.get(file, {}).get("viewing"):
+				path = os.path.join(self.local_directory, file)
+			case _:
+				return None
+		return path
+
+	def commit_stream(self, incoming):
+		# transferul terminat este mutat la destinație de firul de scriere, după operațiile mai vechi pe
+		# aceeași cale; versiunea copiei locale este reținută după mutare
+		payload = incoming.message.get("payload", {})
+		file = payload.get("file")
+		version = payload.get("version")
+		on_written = None
+		if version and incoming.path == os.path.join(self.local_directory, file):
+			on_written = lambda path: self.remember_version(file, version)
+		self.writer.move(incoming.temp_path, incoming.path, on_written)
+		incoming.temp_path = None
+
+	def save_file(self, file: str, content: str, version: str = None):
+		# versiunea este reținută pentru cache abia după ce copia ajunge pe disc, cu mtime-ul și dimensiunea ei
+		on_written = (lambda path: self.remember_version(file, version)) if version else None
+		self.writer.write(os.path.join(self.local_directory, file), content, on_written)
 
 	def get_temp_file_path(self, file: str):
 		name, ext = os.path.splitext(file)
 		temp_file = f"{name}_temp{ext}"
 		return os.path.join(self.local_directory, temp_file)
 
+	def get_version_file_name(self, file: str, version: str):
+		name, ext = os.path.splitext(file)
+		return f"{name}@{version[:8]}{ext}"
+
+	def get_window_file_name(self, file: str):
+		name, ext = os.path.splitext(file)
+		return f"{name}@window{ext}"
+
 	def save_temp_file(self, file: str, content: str):
-		path = self.get_temp_file_path(file)
-		with open(path, "w", encoding="utf-8") as f:
-			f.write(content)
+		self.writer.write(self.get_temp_file_path(file), content)
 
 	def delete_temp_file(self, file: str):
-		path = self.get_temp_file_path(file)
-		if os.path.exists(path):
-			os.remove(path)
+		self.writer.remove(self.get_temp_file_path(file))
 
 	def add_file_to_local_list(self, file: str):
 		if file not in self.files:
@@ -153,10 +322,55 @@ class ClientState:
 	def delete_file(self, file: str):
 		if file in self.files:
 			del self.files[file]
+		self.writer.remove(os.path.join(self.local_directory, file))
+		with self.index_lock:
+			if self.cache_index.pop(file, None) is not None:
+				self.save_cache_index()
+
+	def cached_version(self, file: str):
+		# versiunea copiei locale, doar dacă fișierul nu a fost modificat de la ultima descărcare
+		entry = self.cache_index.get(file)
+		if entry is None or self.local_directory is None or self.writer.is_pending(os.path.join(self.local_directory, file)):
+			return None
+		try:
+			stat = os.stat(os.path.join(self.local_directory, file))
+		except OSError:
+			return None
+		if (stat.st_mtime_ns, stat.st_size) != (entry["mtime_ns"], entry["size"]):
+			return None
+		return entry["version"]
+
+	def remember_version(self, file: str, version: str):
 		path = os.path.join(self.local_directory, file)
-		if os.path.exists(path):
-			os.remove(path)
+		if not version or not os.path.exists(path):
+			return
+		stat = os.stat(path)
+		with self.index_lock:
+			self.cache_index[file] = {"version": version, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+			self.save_cache_index()
+
+	def load_cache_index(self, server_files: dict | None):
+		path = os.path.join(self.local_directory, CACHE_INDEX_FILE)
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				self.cache_index = json.load(f)
+		except (OSError, ValueError):
+			self.cache_index = {}
+		if server_files is None:
+			return
+
+		# copiile fișierelor șterse de pe server în lipsa clientului nu mai sunt utile
+		with self.index_lock:
+			for file in [f for f in self.cache_index if f not in server_files]:
+				self.writer.remove(os.path.join(self.local_directory, file))
+				del self.cache_index[file]
+			self.save_cache_index()
+
+	def save_cache_index(self):
+		# apelat cu index_lock; salvările repetate ale indexului se comasează în writer
+		self.writer.write(os.path.join(self.local_directory, CACHE_INDEX_FILE), json.dumps(self.cache_index))
 
 	def remove_local_directory(self):
+		self.writer.flush()
 		if self.local_directory is not None and os.path.exists(self.local_directory):
 			shutil.rmtree(self.local_directory)
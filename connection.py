@@ -0,0 +1,333 @@
+import asyncio
+import socket
+import threading
+import time
+from collections import deque
+
+from streaming import CHUNK_SIZE, OutgoingStream
+
+
+OUTBOUND_HIGH_WATER = 8 * 1024 * 1024
+WRITE_BATCH_BYTES = 256 * 1024
+SLOW_CLIENT_POLICIES = ("drop", "coalesce", "disconnect")
+SLOW_CLIENT_POLICY = "coalesce"
+# tipurile de broadcast (broadcast_key()[0]) pentru care contează doar ultimul mesaj al unui fișier
+COALESCED_KEYS = ("FILE_UPDATED", "lock")
+BROADCAST_INTERVAL = 0.0  # secunde minime între două mesaje cu aceeași cheie către o conexiune (0 = fără limită)
+SENT_KEYS_LIMIT = 1024  # peste atâtea chei reținute, cele ale căror interval a trecut sunt uitate
+
+
+def queued_size(data) -> int:
+	# cât contează un mesaj față de high_water: un transfer în bucăți este citit de pe disc pe măsură ce pleacă,
+	# deci ocupă cel mult o bucată, nu tot fișierul (altfel un fișier peste high_water n-ar încăpea niciodată)
+	if isinstance(data, OutgoingStream):
+		return min(len(data), CHUNK_SIZE)
+	return len(data)
+
+
+class Connection:
+	# coadă de ieșire a unei conexiuni; mesajele cu cheie (broadcast-uri) sunt supuse politicii
+	# pentru clienți lenți odată ce coada depășește high_water, răspunsurile sunt mereu livrate.
+	# Pentru cheile din COALESCED_KEYS un mesaj nou înlocuiește mesajul cu aceeași cheie încă netrimis,
+	# iar cu min_interval mesajele care vin prea des sunt ținute deoparte și doar ultimul pleacă la termen
+	def __init__(self, high_water: int = OUTBOUND_HIGH_WATER, policy: str = SLOW_CLIENT_POLICY, min_interval: float = BROADCAST_INTERVAL):
+		self.high_water: int = high_water
+		self.policy: str = policy
+		self.min_interval: float = min_interval
+		self.queue: deque[list] = deque()  # [key, data]
+		self.keyed: dict[tuple, list] = {}  # key -> ultimul mesaj cu acea cheie aflat în coadă
+		self.held: dict[tuple, bytes] = {}  # key -> ultimul mesaj amânat până la trecerea intervalului minim
+		self.sent_at: dict[tuple, float] = {}  # key -> momentul în care ultimul mesaj cu cheia a intrat în coadă
+		self.queued_bytes: int = 0
+		self.closed: bool = False
+		self.compression: str | None = None  # codecul negociat la AUTH
+		self.encoding: str = "json"  # codificarea mesajelor negociată la AUTH
+		self.upload = None  # transferul în bucăți primit în acest moment de la client
+		self.lock = threading.Lock()
+		self.dropped: int = 0
+		self.coalesced: int = 0
+		self.bytes_received: int = 0
+		self.last_seen: float = time.monotonic()  # ultima dată când s-a primit ceva de la client
+		self.bytes_sent: int = 0  # actualizat doar de scriitorul conexiunii
+
+	def is_congested(self):
+		return self.queued_bytes >= self.high_water
+
+	def is_pending(self, key: tuple):
+		# un mesaj cu această cheie nu a plecat încă și poate fi înlocuit de următorul
+		return key in self.keyed or key in self.held
+
+	def send(self, data: bytes, key: tuple = None):
+		abort = False
+		with self.lock:
+			if self.closed:
+				return False
+
+			coalesced = key is not None and key[0] in COALESCED_KEYS
+			if key is not None and self.held:
+				self.release_held_for(key)
+
+			if coalesced and key in self.held:
+				self.release(self.held[key])
+				self.held[key] = data
+				self.coalesced += 1
+				delivered = True
+			elif key in self.keyed and (coalesced or self.policy == "coalesce" and self.queued_bytes + queued_size(data) > self.high_water):
+				self.replace(self.keyed[key], data)
+				delivered = True
+			elif coalesced and self.min_interval and time.monotonic() < self.sent_at.get(key, 0.0) + self.min_interval:
+				self.held[key] = data
+				delivered = True
+			elif key is None or self.queued_bytes + queued_size(data) <= self.high_water:
+				self.enqueue(data, key)
+				delivered = True
+			elif self.policy == "disconnect":
+				self.closed = True
+				abort = True
+				delivered = False
+			else:
+				self.dropped += 1
+				delivered = False
+
+			if not delivered:
+				self.release(data)
+
+		if abort:
+			self.abort()
+		else:
+			self.wakeup()
+		return delivered
+
+	def enqueue(self, data: bytes, key: tuple):
+		item = [key, data]
+		self.queue.append(item)
+		self.queued_bytes += queued_size(data)
+		if key is not None:
+			self.keyed[key] = item
+			if key[0] in COALESCED_KEYS and self.min_interval:
+				self.sent_at[key] = time.monotonic()
+
+	def replace(self, item: list, data: bytes):
+		self.queued_bytes += queued_size(data) - queued_size(item[1])
+		self.release(item[1])
+		item[1] = data
+		self.coalesced += 1
+
+	def release_held_for(self, key: tuple):
+		# apelat cu self.lock deținut; un mesaj amânat al aceluiași fișier pleacă înaintea unuia cu altă cheie
+		# (de exemplu FILE_UPDATED înainte de FILE_DELETED), ca ordinea evenimentelor unui fișier să se păstreze
+		for other in [other for other in self.held if other[1] == key[1] and other != key]:
+			self.enqueue(self.held.pop(other), other)
+
+	def release_due(self):
+		# apelat cu self.lock deținut de scriitor; mută în coadă mesajele amânate al căror interval a trecut
+		# și întoarce câte secunde mai sunt până la următorul termen (None dacă nu așteaptă nimic)
+		if not self.held:
+			if len(self.sent_at) > SENT_KEYS_LIMIT:
+				now = time.monotonic()
+				self.sent_at = {key: at for key, at in self.sent_at.items() if at + self.min_interval > now}
+			return None
+		now = time.monotonic()
+		timeout = None
+		for key in list(self.held):
+			due = self.sent_at.get(key, 0.0) + self.min_interval
+			if due <= now:
+				self.enqueue(self.held.pop(key), key)
+			elif timeout is None or due - now < timeout:
+				timeout = due - now
+		return timeout
+
+	def take(self):
+		# apelat cu self.lock deținut; întoarce următorul lot de octeți de trimis sau un transfer în bucăți
+		chunks = []
+		size = 0
+		while self.queue and size < WRITE_BATCH_BYTES:
+			if isinstance(self.queue[0][1], OutgoingStream) and chunks:
+				break
+			item = self.queue.popleft()
+			key, data = item
+			if key is not None and self.keyed.get(key) is item:
+				del self.keyed[key]
+			self.queued_bytes -= queued_size(data)
+			if isinstance(data, OutgoingStream):
+				return data
+			chunks.append(data)
+			size += len(data)
+		return b"".join(chunks) if chunks else None
+
+	def release(self, data):
+		if isinstance(data, OutgoingStream):
+			data.close()
+
+	def clear(self):
+		# apelat cu self.lock deținut
+		for _, data in self.queue:
+			self.release(data)
+		for data in self.held.values():
+			self.release(data)
+		self.queue.clear()
+		self.keyed.clear()
+		self.held.clear()
+		self.queued_bytes = 0
+
+	def wakeup(self):
+		raise NotImplementedError
+
+	def abort(self):
+		raise NotImplementedError
+
+
+class ThreadConnection(Connection):
+	def __init__(
+		self, sock: socket.socket, high_water: int = OUTBOUND_HIGH_WATER, policy: str = SLOW_CLIENT_POLICY, min_interval: float = BROADCAST_INTERVAL
+	):
+		super().__init__(high_water, policy, min_interval)
+		self.sock: socket.socket = sock
+		self.condition = threading.Condition(self.lock)
+		self.writer = threading.Thread(target=self.run, daemon=True)
+		self.writer.start()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while True:
+					timeout = self.release_due()
+					if self.queue or self.closed:
+						break
+					self.condition.wait(timeout)
+				chunk = self.take()
+				self.condition.notify_all()
+
+			if chunk is None:
+				return
+
+			try:
+				if isinstance(chunk, OutgoingStream):
+					try:
+						chunk.send_to(self.sock)
+					finally:
+						chunk.close()
+				else:
+					self.sock.sendall(chunk)
+				self.bytes_sent += len(chunk)
+			except OSError:
+				with self.condition:
+					self.closed = True
+					self.clear()
+					self.condition.notify_all()
+				self.abort()
+				return
+
+	def wakeup(self):
+		with self.condition:
+			self.condition.notify_all()
+
+	def wait_writable(self):
+		with self.condition:
+			while self.is_congested() and not self.closed:
+				self.condition.wait()
+
+	def abort(self):
+		try:
+			self.sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+
+	def close(self, timeout: float = 1.0):
+		with self.condition:
+			self.closed = True
+			self.condition.notify_all()
+		if threading.current_thread() is not self.writer:
+			self.writer.join(timeout)
+		self.abort()
+		self.sock.close()
+
+
+class AsyncConnection(Connection):
+	def __init__(
+		self,
+		writer: asyncio.StreamWriter,
+		high_water: int = OUTBOUND_HIGH_WATER,
+		policy: str = SLOW_CLIENT_POLICY,
+		min_interval: float = BROADCAST_INTERVAL,
+	):
+		super().__init__(high_water, policy, min_interval)
+		self.writer: asyncio.StreamWriter = writer
+		self.loop = asyncio.get_running_loop()
+		self.ready = asyncio.Event()
+		self.writable = asyncio.Event()
+		self.writable.set()
+		self.task = self.loop.create_task(self.run())
+
+	async def run(self):
+		try:
+			while True:
+				with self.lock:
+					timeout = self.release_due()
+					waiting = not self.queue
+				if waiting and not self.closed:
+					try:
+						await asyncio.wait_for(self.ready.wait(), timeout)
+					except asyncio.TimeoutError:
+						pass
+				self.ready.clear()
+
+				while True:
+					with self.lock:
+						chunk = self.take()
+					if chunk is None:
+						break
+					if isinstance(chunk, OutgoingStream):
+						try:
+							await chunk.write_to(self.writer, asyncio.get_running_loop())
+						finally:
+							chunk.close()
+					else:
+						self.writer.write(chunk)
+					await self.writer.drain()
+					self.bytes_sent += len(chunk)
+					if not self.is_congested():
+						self.writable.set()
+
+				if self.closed:
+					return
+		except (ConnectionError, OSError):
+			with self.lock:
+				self.closed = True
+				self.clear()
+			self.abort()
+		finally:
+			self.writable.set()
+
+	def on_loop(self):
+		# mesajele pot fi trimise și de pe alte fire (cererile tratate în executor când există coordonator)
+		try:
+			return asyncio.get_running_loop() is self.loop
+		except RuntimeError:
+			return False
+
+	def wakeup(self):
+		if not self.on_loop():
+			self.loop.call_soon_threadsafe(self.wakeup)
+			return
+		self.ready.set()
+		if self.is_congested():
+			self.writable.clear()
+
+	async def wait_writable(self):
+		await self.writable.wait()
+
+	def abort(self):
+		if not self.on_loop():
+			self.loop.call_soon_threadsafe(self.abort)
+			return
+		self.writer.transport.abort()
+
+	async def close(self, timeout: float = 1.0):
+		self.closed = True
+		self.ready.set()
+		try:
+			await asyncio.wait_for(self.task, timeout)
+		except asyncio.TimeoutError:
+			self.abort()
+		self.writer.close()
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import json
+import os
+import queue
+import socket
+import threading
+
+from protocol import RECV_BUFFER_SIZE, FrameDecoder, encode_frame
+
+
+REQUEST_TIMEOUT = 5.0  # secunde după care o cerere auth sau lock fără răspuns este considerată refuzată
+
+# Coordonatorul local al modului cu mai multe procese: fiecare proces worker acceptă conexiuni pe același
+# port (SO_REUSEPORT) și păstrează o copie a stării fișierelor; coordonatorul deține singura evidență
+# autoritară a utilizatorilor conectați și a lock-urilor și retransmite broadcast-urile între workeri.
+#
+# Mesajele sunt obiecte JSON încadrate ca în protocolul clienților:
+#   worker -> coordonator: {"op": "auth" | "logout" | "lock" | "release" | "publish", "id"?: int, ...}
+#   coordonator -> worker: {"id": int, "ok": bool, ...} ca răspuns, {"op": "broadcast", ...} pentru evenimentele altor workeri
+# Doar auth și lock așteaptă răspuns; celelalte sunt aplicate în ordinea în care au fost trimise.
+
+
+class Coordinator:
+	def __init__(self):
+		self.workers: set[asyncio.StreamWriter] = set()
+		self.users: dict[str, asyncio.StreamWriter] = {}  # username -> workerul la care este conectat
+		self.locks: dict[str, tuple[str, asyncio.StreamWriter]] = {}  # file -> (user, worker)
+		self.published: int = 0
+
+	async def serve(self, path: str, ready: asyncio.Event = None):
+		server = await asyncio.start_unix_server(self.handle_worker, path)
+		if ready is not None:
+			ready.set()
+		async with server:
+			await server.serve_forever()
+
+	async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+		self.workers.add(writer)
+		decoder = FrameDecoder()
+		try:
+			while True:
+				data = await reader.read(RECV_BUFFER_SIZE)
+				if not data:
+					break
+				for _, body in decoder.feed(data):
+					response = self.handle(writer, json.loads(body))
+					if response is not None:
+						writer.write(encode_frame(json.dumps(response).encode("utf-8")))
+				await writer.drain()
+		except (ConnectionError, ValueError):
+			pass
+		finally:
+			self.workers.discard(writer)
+			self.worker_lost(writer)
+			writer.close()
+
+	def handle(self, worker: asyncio.StreamWriter, request: dict):
+		match request.get("op"):
+			case "auth":
+				user = request["user"]
+				ok = user not in self.users
+				if ok:
+					self.users[user] = worker
+				return {"id": request["id"], "ok": ok}
+			case "logout":
+				if self.users.get(request["user"]) is worker:
+					del self.users[request["user"]]
+			case "lock":
+				holder = self.locks.get(request["file"])
+				if holder is None:
+					self.locks[request["file"]] = (request["user"], worker)
+				return {"id": request["id"], "ok": holder is None, "holder": holder[0] if holder else None}
+			case "release":
+				holder = self.locks.get(request["file"])
+				if holder is not None and holder[0] == request["user"]:
+					del self.locks[request["file"]]
+			case "publish":
+				self.broadcast(request, exclude=worker)
+		return None
+
+	def broadcast(self, event: dict, exclude: asyncio.StreamWriter = None):
+		frame = encode_frame(json.dumps({
+			"op": "broadcast",
+			"message": event["message"],
+			"delta": event.get("delta"),
+			"exclude": event.get("exclude"),
+		}).encode("utf-8"))
+		self.published += 1
+		for worker in self.workers:
+			if worker is not exclude:
+				worker.write(frame)
+
+	def worker_lost(self, worker: asyncio.StreamWriter):
+		# un worker oprit sau căzut: utilizatorii lui sunt deconectați, iar lock-urile lor eliberate pentru ceilalți
+		for user in [user for user, owner in self.users.items() if owner is worker]:
+			del self.users[user]
+		for file, (user, owner) in list(self.locks.items()):
+			if owner is not worker:
+				continue
+			del self.locks[file]
+			self.broadcast({
+				"message": {
+					"type": "FILE_RELEASED",
+					"status": 200,
+					"message": f"{user} s-a deconectat și a eliberat lock-ul pe {file}.",
+					"payload": {"file": file, "user": user},
+				},
+			})
+
+
+class CoordinatorClient:
+	# capătul unui worker: cererile se fac sincron din firele care tratează clienții; un fir cititor
+	# primește răspunsurile, iar broadcast-urile altor workeri sunt livrate de un fir separat, pentru ca
+	# un broadcast care așteaptă lock-ul unui fișier să nu blocheze răspunsul așteptat de deținătorul lui
+	def __init__(self, path: str, on_broadcast, timeout: float = REQUEST_TIMEOUT):
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(path)
+		self.on_broadcast = on_broadcast  # (message, delta, exclude_username)
+		self.timeout: float = timeout
+		self.send_lock = threading.Lock()
+		self.ids = itertools.count(1)
+		self.pending: dict[int, list] = {}  # id -> [Event, răspuns]
+		self.events: queue.Queue = queue.Queue()
+		self.requests: int = 0
+		self.timeouts: int = 0
+		self.published: int = 0
+		self.received: int = 0
+		threading.Thread(target=self.read, daemon=True).start()
+		threading.Thread(target=self.deliver, daemon=True).start()
+
+	def send(self, op: str, **fields):
+		frame = encode_frame(json.dumps({"op": op, **fields}).encode("utf-8"))
+		with self.send_lock:
+			self.sock.sendall(frame)
+
+	def request(self, op: str, **fields):
+		request_id = next(self.ids)
+		waiter = [threading.Event(), None]
+		self.pending[request_id] = waiter
+		self.send(op, id=request_id, **fields)
+		self.requests += 1
+		if not waiter[0].wait(self.timeout):
+			# răspunsul întârziat va fi ignorat de firul cititor
+			self.pending.pop(request_id, None)
+			self.timeouts += 1
+			raise TimeoutError(f"Coordonatorul nu a răspuns la {op} în {self.timeout} s.")
+		return waiter[1]
+
+	def publish(self, message: dict, delta: dict = None, exclude_username: str = None):
+		self.published += 1
+		self.send("publish", message=message, delta=delta, exclude=exclude_username)
+
+	def read(self):
+		decoder = FrameDecoder()
+		while True:
+			data = self.sock.recv(RECV_BUFFER_SIZE)
+			if not data:
+				# fără coordonator lock-urile nu mai pot fi garantate între procese
+				os._exit(1)
+			for _, body in decoder.feed(data):
+				message = json.loads(body)
+				if message.get("op") == "broadcast":
+					self.events.put(message)
+					continue
+				waiter = self.pending.pop(message["id"], None)
+				if waiter is None:
+					continue
+				waiter[1] = message
+				waiter[0].set()
+
+	def deliver(self):
+		while True:
+			message = self.events.get()
+			self.received += 1
+			self.on_broadcast(message["message"], message["delta"], message["exclude"])
+
+	def stats(self):
+		return {"requests": self.requests, "timeouts": self.timeouts, "published": self.published, "received": self.received}
@@ -0,0 +1,65 @@
+import difflib
+import hashlib
+
+
+# Un patch este o listă de operații [start, end, text], ordonate și fără suprapuneri:
+# intervalul [start, end) din versiunea de bază este înlocuit cu text.
+
+
+def content_hash(content: str) -> str:
+	return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def common_prefix_length(a: str, b: str, chunk: int = 4096) -> int:
+	limit = min(len(a), len(b))
+	position = 0
+	while position < limit and a[position : position + chunk] == b[position : position + chunk]:
+		position += chunk
+	position = min(position, limit)
+	end = min(position + chunk, limit)
+	while position < end and a[position] == b[position]:
+		position += 1
+	return position
+
+
+def make_patch(old: str, new: str) -> list[list]:
+	prefix = common_prefix_length(old, new)
+	suffix = common_prefix_length(old[prefix:][::-1], new[prefix:][::-1])
+
+	old_middle = old[prefix : len(old) - suffix]
+	new_middle = new[prefix : len(new) - suffix]
+	if not old_middle and not new_middle:
+		return []
+
+	old_lines = old_middle.splitlines(keepends=True)
+	new_lines = new_middle.splitlines(keepends=True)
+	if len(old_lines) <= 1 or len(new_lines) <= 1:
+		return [[prefix, prefix + len(old_middle), new_middle]]
+
+	old_offsets = [prefix]
+	for line in old_lines:
+		old_offsets.append(old_offsets[-1] + len(line))
+
+	patch = []
+	matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+	for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+		if tag != "equal":
+			patch.append([old_offsets[i1], old_offsets[i2], "".join(new_lines[j1:j2])])
+	return patch
+
+
+def patch_size(patch: list[list]) -> int:
+	return sum(len(text) for _, _, text in patch)
+
+
+def apply_patch(content: str, patch: list[list]) -> str:
+	pieces = []
+	position = 0
+	for start, end, text in patch:
+		if not (position <= start <= end <= len(content)) or not isinstance(text, str):
+			raise ValueError("Patch invalid.")
+		pieces.append(content[position:start])
+		pieces.append(text)
+		position = end
+	pieces.append(content[position:])
+	return "".join(pieces)
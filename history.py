@@ -0,0 +1,170 @@
+import json
+import os
+import string
+import struct
+import threading
+import time
+import zlib
+
+from delta import apply_patch, make_patch, patch_size
+from streaming import CHUNK_SIZE
+
+
+HISTORY_DIR = "server_history"
+MAX_CHAIN = 32  # patch-uri consecutive după care o versiune este păstrată din nou întreagă
+MIN_VERSION_PREFIX = 6  # caracterele minime cu care un client poate indica o versiune
+HISTORY_PAGE_SIZE = 50
+ZLIB_LEVEL = 6
+OBJECT_HEADER = struct.Struct("!cH")  # tipul obiectului și lungimea lanțului de patch-uri până la o versiune întreagă
+FULL = b"F"
+DELTA = b"D"
+
+# Istoricul versiunilor, adresat după conținut:
+#   objects/<v[:2]>/<v>   versiunea v: FULL + zlib(conținut) sau DELTA + zlib(JSON [versiunea de bază, patch])
+#   logs/<fișier>.jsonl   o linie pentru fiecare versiune a fișierului: {version, time, user, size}
+# Versiunea este hash-ul conținutului (delta.content_hash), deci un conținut care revine nu mai este scris
+# a doua oară. Versiunea curentă rămâne în server_files, citită ca până acum; istoricul este doar adăugat.
+
+
+class HistoryStore:
+	def __init__(self, directory: str = HISTORY_DIR, store=None):
+		self.directory: str = directory
+		self.store = store  # FileStore prin care sunt scrise obiectele (None: os.replace simplu)
+		self.lock = threading.Lock()
+		self.versions: int = 0
+		self.objects: int = 0
+		self.deduplicated: int = 0
+		self.bytes_written: int = 0
+		os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+		os.makedirs(os.path.join(directory, "logs"), exist_ok=True)
+
+	def object_path(self, version: str):
+		# versiunile sunt hash-uri hex; orice altceva (de exemplu dintr-un jurnal modificat) nu poate indica un obiect
+		if not isinstance(version, str) or not version or any(char not in string.hexdigits for char in version):
+			raise FileNotFoundError(f"Versiune invalidă: {version!r}")
+		return os.path.join(self.directory, "objects", version[:2], version)
+
+	def log_path(self, file: str):
+		return os.path.join(self.directory, "logs", file + ".jsonl")
+
+	def chain_length(self, version: str):
+		# None dacă versiunea nu există în istoric
+		try:
+			with open(self.object_path(version), "rb") as f:
+				kind, depth = OBJECT_HEADER.unpack(f.read(OBJECT_HEADER.size))
+		except (OSError, struct.error):
+			return None
+		return depth
+
+	def record(self, file: str, content: str, version: str, user: str | None, previous: str = None, previous_version: str = None, patch: list = None):
+		# adaugă o versiune nouă; previous este conținutul peste care a fost făcută modificarea, dacă este cunoscut,
+		# iar patch (opțional) este patch-ul deja calculat de la previous la content, refolosit în loc de make_patch.
+		# O versiune anterioară care lipsește din istoric (de exemplu modificată din afara serverului) este
+		# salvată întâi întreagă, ca noua versiune să poată fi un patch față de ea
+		if previous is not None and previous_version and previous_version != version and self.chain_length(previous_version) is None:
+			self.record(file, previous, previous_version, None)
+
+		depth = self.chain_length(version)
+		if depth is not None:
+			self.deduplicated += 1
+		else:
+			base_depth = self.chain_length(previous_version) if previous is not None and previous_version else None
+			if base_depth is None or base_depth >= MAX_CHAIN:
+				patch = None
+			elif patch is None:
+				patch = make_patch(previous, content)
+			if patch is not None and patch_size(patch) < len(content) // 2:
+				body = zlib.compress(json.dumps([previous_version, patch], ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL)
+				self.write_object(version, OBJECT_HEADER.pack(DELTA, base_depth + 1) + body)
+			else:
+				self.write_object(version, OBJECT_HEADER.pack(FULL, 0) + zlib.compress(content.encode("utf-8"), ZLIB_LEVEL))
+		self.append_log(file, version, user, len(content.encode("utf-8")))
+
+	def record_file(self, file: str, path: str, version: str, user: str | None):
+		# fișierele mari sunt salvate întregi, comprimate în bucăți, fără a fi încărcate în memorie
+		if self.chain_length(version) is not None:
+			self.deduplicated += 1
+		else:
+			compressor = zlib.compressobj(ZLIB_LEVEL)
+			parts = [OBJECT_HEADER.pack(FULL, 0)]
+			with open(path, "rb") as f:
+				while chunk := f.read(CHUNK_SIZE):
+					parts.append(compressor.compress(chunk))
+			parts.append(compressor.flush())
+			self.write_object(version, b"".join(parts))
+		self.append_log(file, version, user, os.path.getsize(path))
+
+	def write_object(self, version: str, data: bytes):
+		path = self.object_path(version)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		if self.store is not None:
+			self.store.write(path, data)
+		else:
+			with open(path + ".tmp", "wb") as f:
+				f.write(data)
+			os.replace(path + ".tmp", path)
+		with self.lock:
+			self.objects += 1
+			self.bytes_written += len(data)
+
+	def append_log(self, file: str, version: str, user: str | None, size: int):
+		line = json.dumps({"version": version, "time": round(time.time(), 3), "user": user, "size": size}, ensure_ascii=False) + "\n"
+		data = line.encode("utf-8")
+		# o singură scriere în modul append, ca liniile mai multor procese worker să nu se amestece
+		fd = os.open(self.log_path(file), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			os.write(fd, data)
+		finally:
+			os.close(fd)
+		with self.lock:
+			self.versions += 1
+			self.bytes_written += len(data)
+
+	def log(self, file: str):
+		# versiunile fișierului, de la cea mai veche la cea mai nouă
+		try:
+			with open(self.log_path(file), "r", encoding="utf-8") as f:
+				return [json.loads(line) for line in f if line.strip()]
+		except OSError:
+			return []
+
+	def resolve(self, file: str, prefix: str):
+		# versiunile fișierului care încep cu prefix, fără duplicate: {versiune: dimensiune}
+		if not isinstance(prefix, str) or len(prefix) < MIN_VERSION_PREFIX:
+			return {}
+		return {entry["version"]: entry["size"] for entry in self.log(file) if entry["version"].startswith(prefix)}
+
+	def read(self, version: str):
+		# reconstituie conținutul: urmează lanțul de patch-uri până la o versiune întreagă și le aplică în ordine
+		patches = []
+		while True:
+			with open(self.object_path(version), "rb") as f:
+				kind, _ = OBJECT_HEADER.unpack(f.read(OBJECT_HEADER.size))
+				body = zlib.decompress(f.read())
+			if kind == FULL:
+				content = body.decode("utf-8")
+				break
+			version, patch = json.loads(body)
+			patches.append(patch)
+		for patch in reversed(patches):
+			content = apply_patch(content, patch)
+		return content
+
+	def export(self, version: str, path: str):
+		# scrie versiunea în path fără a o ține întreagă în memorie când este salvată întreagă (fișierele mari,
+		# înregistrate prin record_file); o versiune salvată ca patch este reconstituită prin read
+		with open(self.object_path(version), "rb") as f:
+			kind, _ = OBJECT_HEADER.unpack(f.read(OBJECT_HEADER.size))
+			if kind == FULL:
+				decompressor = zlib.decompressobj()
+				with open(path, "wb") as out:
+					while chunk := f.read(CHUNK_SIZE):
+						out.write(decompressor.decompress(chunk))
+					out.write(decompressor.flush())
+				return
+		with open(path, "wb") as out:
+			out.write(self.read(version).encode("utf-8"))
+
+	def stats(self):
+		with self.lock:
+			return {"versions": self.versions, "objects": self.objects, "deduplicated": self.deduplicated, "bytes_written": self.bytes_written}
@@ -0,0 +1,351 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from bench import print_results, sample_text
+from client_state import ClientState
+from delta import content_hash
+from protocol import ENCODINGS, RECV_BUFFER_SIZE, FrameDecoder, available_codecs, decode_message, encode_message
+from streaming import FLAG_CHUNK, IncomingStream
+
+
+DEFAULT_MIX = "view=60,edit=25,add=10,delete=5"
+OPERATIONS = ("view", "edit", "add", "delete", "list")
+REQUEST_TIMEOUT = 10.0
+PERCENTILES = (50, 95, 99)
+
+# Un scenariu JSONL conține câte un pas pe linie, reluat de fiecare utilizator simulat:
+#   {"op": "view", "file": "a.txt"}
+#   {"op": "edit", "file": "a.txt", "updates": 3}
+#   {"op": "add", "file": "{user}.txt", "size": 2048}
+#   {"op": "delete", "file": "{user}.txt"}
+#   {"op": "list", "prefix": "a"}
+#   {"op": "sleep", "ms": 50}
+# "{user}" din numele fișierului este înlocuit cu numele utilizatorului.
+
+
+def percentile(values: list[float], p: int):
+	if not values:
+		return None
+	values = sorted(values)
+	return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def broadcast_key(message_type: str, payload: dict):
+	# cheia după care un broadcast primit este asociat cererii care l-a provocat
+	match message_type:
+		case "FILE_UPDATED":
+			return (message_type, payload.get("file"), payload.get("version"))
+		case "FILE_LOCKED" | "FILE_RELEASED":
+			return (message_type, payload.get("file"), payload.get("user"))
+		case _:
+			return (message_type, payload.get("file"))
+
+
+class Recorder:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.latencies: dict[str, list[float]] = {}  # tipul cererii -> latențe în secunde
+		self.errors: dict[str, int] = {}
+		self.sent_at: dict[tuple, float] = {}  # cheia broadcast-ului așteptat -> momentul trimiterii cererii
+		self.lags: dict[str, list[float]] = {}  # tipul broadcast-ului -> întârzieri de livrare
+
+	def record_request(self, request_type: str, seconds: float, status: int):
+		with self.lock:
+			self.latencies.setdefault(request_type, []).append(seconds)
+			if not status or status >= 400:
+				self.errors[request_type] = self.errors.get(request_type, 0) + 1
+
+	def expect_broadcast(self, key: tuple):
+		with self.lock:
+			self.sent_at[key] = time.perf_counter()
+
+	def record_broadcast(self, key: tuple, received: float):
+		with self.lock:
+			sent = self.sent_at.get(key)
+			if sent is not None:
+				self.lags.setdefault(key[0], []).append(received - sent)
+
+	def results(self, elapsed: float):
+		rows = []
+		with self.lock:
+			everything = [value for values in self.latencies.values() for value in values]
+			for request_type, values in sorted(self.latencies.items()):
+				rows.append(self.row("request", request_type, values, elapsed, self.errors.get(request_type, 0)))
+			for broadcast_type, values in sorted(self.lags.items()):
+				rows.append(self.row("broadcast lag", broadcast_type, values, elapsed, 0))
+			rows.append(self.row("total", "*", everything, elapsed, sum(self.errors.values())))
+		return rows
+
+	def row(self, kind: str, name: str, values: list[float], elapsed: float, errors: int):
+		row = {"kind": kind, "type": name, "count": len(values), "per_s": round(len(values) / elapsed, 1), "errors": errors}
+		for p in PERCENTILES:
+			value = percentile(values, p)
+			row[f"p{p}_ms"] = round(value * 1000, 3) if value is not None else None
+		return row
+
+
+class SimulatedUser:
+	def __init__(self, username: str, address: tuple, recorder: Recorder, encoding: str):
+		self.username: str = username
+		self.recorder: Recorder = recorder
+		self.encoding: str = encoding
+		self.state = ClientState()
+		self.added: list[str] = []  # fișierele adăugate de acest utilizator, candidate pentru DELETE
+		self.waiting: dict[int, list] = {}  # id -> [eveniment, răspuns]
+		self.lock = threading.Lock()
+		self.sock = socket.create_connection(address)
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.reader = threading.Thread(target=self.run, daemon=True)
+		self.reader.start()
+
+	def run(self):
+		decoder = FrameDecoder()
+		incoming: IncomingStream = None
+		try:
+			while data := self.sock.recv(RECV_BUFFER_SIZE):
+				for flags, body in decoder.feed(data):
+					if flags & FLAG_CHUNK:
+						if incoming is not None and incoming.write(body):
+							self.finish_stream(incoming)
+							incoming = None
+						continue
+
+					message = decode_message(body, flags, decoder.max_frame_size)
+					if "stream" in message.get("payload", {}):
+						incoming = IncomingStream(message, self.state.stream_target(message))
+						if incoming.is_complete():
+							self.finish_stream(incoming)
+							incoming = None
+						continue
+					self.receive(message)
+		except OSError:
+			pass
+		finally:
+			if incoming is not None:
+				incoming.discard()
+			with self.lock:
+				for waiter in self.waiting.values():
+					waiter[0].set()
+
+	def finish_stream(self, incoming: IncomingStream):
+		if incoming.path is not None:
+			self.state.commit_stream(incoming)
+		self.receive(incoming.message)
+
+	def receive(self, message: dict):
+		received = time.perf_counter()
+		if message.get("type", "").startswith("FILE_"):
+			self.recorder.record_broadcast(broadcast_key(message["type"], message.get("payload", {})), received)
+		self.state.handle_response(message)
+		with self.lock:
+			waiter = self.waiting.pop(message.get("id"), None)
+		if waiter is not None:
+			waiter[1] = message
+			waiter[0].set()
+
+	def request(self, message: dict, expected_broadcast: tuple = None):
+		request_id = self.state.track_request(message)
+		waiter = [threading.Event(), None]
+		with self.lock:
+			self.waiting[request_id] = waiter
+		if expected_broadcast is not None:
+			self.recorder.expect_broadcast(expected_broadcast)
+
+		start = time.perf_counter()
+		self.sock.sendall(encode_message(message, self.state.compression, encoding=self.state.encoding))
+		waiter[0].wait(REQUEST_TIMEOUT)
+		response = waiter[1] or {}
+		self.recorder.record_request(message["type"], time.perf_counter() - start, response.get("status", 0))
+		return response
+
+	def auth(self):
+		payload = {"username": self.username, "compression": available_codecs(), "list": False}
+		payload["encoding"] = ENCODINGS if self.encoding == "binary" else ["json"]
+		return self.request({"type": "AUTH", "payload": payload})
+
+	def view(self, file: str):
+		return self.request({"type": "VIEW", "payload": {"file": file}})
+
+	def edit(self, file: str, updates: int = 1):
+		response = self.request({"type": "LOCK", "payload": {"file": file}}, ("FILE_LOCKED", file, self.username))
+		if response.get("status") not in (200, 304):
+			return response
+
+		# copia _temp a LOCK-ului poate fi încă în coada de scriere a clientului: writer.read o întoarce oricum
+		try:
+			content = self.state.writer.read(self.state.get_temp_file_path(file))
+		except FileNotFoundError:
+			content = ""
+		for i in range(updates):
+			content += f"{self.username} {time.time():.6f} {i}\n"
+			payload = self.state.make_update_payload(file, content)
+			self.request({"type": "UPDATE", "payload": payload}, ("FILE_UPDATED", file, content_hash(content)))
+		return self.request({"type": "RELEASE", "payload": {"file": file}}, ("FILE_RELEASED", file, self.username))
+
+	def add(self, file: str, size: int):
+		response = self.request(
+			{"type": "ADD", "payload": {"file": file, "content": sample_text(size)}}, ("FILE_ADDED", file)
+		)
+		if response.get("status") == 200:
+			self.added.append(file)
+		return response
+
+	def delete(self, file: str):
+		response = self.request({"type": "DELETE", "payload": {"file": file}}, ("FILE_DELETED", file))
+		if file in self.added:
+			self.added.remove(file)
+		return response
+
+	def list(self, prefix: str = None):
+		payload = {"prefix": prefix} if prefix else {}
+		return self.request({"type": "LIST", "payload": payload})
+
+	def close(self):
+		try:
+			self.sock.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self.sock.close()
+
+
+def parse_mix(mix: str):
+	weights = {}
+	for part in mix.split(","):
+		name, _, weight = part.partition("=")
+		if name not in OPERATIONS:
+			raise argparse.ArgumentTypeError(f"Operație necunoscută: {name}")
+		weights[name] = float(weight or 1)
+	return weights
+
+
+def load_scenario(path: str):
+	with open(path, "r", encoding="utf-8") as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+
+def run_step(user: SimulatedUser, step: dict):
+	file = step.get("file", "").replace("{user}", user.username)
+	match step["op"]:
+		case "view":
+			user.view(file)
+		case "edit":
+			user.edit(file, step.get("updates", 1))
+		case "add":
+			user.add(file, step.get("size", 1024))
+		case "delete":
+			user.delete(file)
+		case "list":
+			user.list(step.get("prefix"))
+		case "sleep":
+			time.sleep(step.get("ms", 0) / 1000)
+		case _:
+			raise ValueError(f"Pas de scenariu necunoscut: {step['op']}")
+
+
+def random_steps(user: SimulatedUser, rng: random.Random, weights: dict, files: list[str], ops: int, size: int):
+	names = list(weights)
+	counter = 0
+	for _ in range(ops):
+		op = rng.choices(names, [weights[name] for name in names])[0]
+		if op == "delete" and not user.added:
+			op = "add"
+		if op == "add":
+			counter += 1
+			yield {"op": "add", "file": f"{user.username}_{counter}.txt", "size": size}
+		elif op == "delete":
+			yield {"op": "delete", "file": rng.choice(user.added)}
+		elif op == "list":
+			yield {"op": "list"}
+		else:
+			yield {"op": op, "file": rng.choice(files)}
+
+
+def run_user(user: SimulatedUser, args, scenario: list[dict] | None, files: list[str], weights: dict, start: threading.Barrier):
+	user.auth()
+	start.wait()
+	if scenario is not None:
+		steps = (step for _ in range(args.repeat) for step in scenario)
+	else:
+		steps = random_steps(user, random.Random(f"{args.seed}-{user.username}"), weights, files, args.ops, args.size)
+	for step in steps:
+		run_step(user, step)
+
+
+def prepare_files(address: tuple, args):
+	# fișierele comune pe care lucrează utilizatorii în modul aleator; ADD eșuează inofensiv dacă există deja
+	files = [f"load_{i}.txt" for i in range(args.files)]
+	setup = SimulatedUser("loadgen-setup", address, Recorder(), args.encoding)
+	try:
+		setup.auth()
+		for file in files:
+			setup.add(file, args.size)
+	finally:
+		setup.close()
+	return files
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Generator de trafic pentru server, fără interfață interactivă.")
+	parser.add_argument("--host", default="localhost")
+	parser.add_argument("--port", type=int, default=12345)
+	parser.add_argument("--users", type=int, default=20, help="numărul de utilizatori simulați")
+	parser.add_argument("--scenario", help="fișier JSONL cu pașii reluați de fiecare utilizator")
+	parser.add_argument("--repeat", type=int, default=1, help="de câte ori reia fiecare utilizator scenariul")
+	parser.add_argument("--ops", type=int, default=100, help="operații aleatoare per utilizator, fără --scenario")
+	parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"ponderile operațiilor aleatoare (implicit {DEFAULT_MIX})")
+	parser.add_argument("--files", type=int, default=20, help="fișiere comune pentru operațiile aleatoare")
+	parser.add_argument("--size", type=int, default=4096, help="dimensiunea fișierelor adăugate")
+	parser.add_argument("--encoding", choices=ENCODINGS, default="json")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--label", default="", help="eticheta rulării în fișierul de rezultate, de ex. versiunea")
+	parser.add_argument("--output", help="fișier JSONL în care se adaugă rezultatele")
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	address = (args.host, args.port)
+	scenario = load_scenario(args.scenario) if args.scenario else None
+	recorder = Recorder()
+
+	# copiile locale ale utilizatorilor simulați sunt scrise într-un director temporar
+	cwd = os.getcwd()
+	workdir = tempfile.mkdtemp(prefix="loadgen-")
+	os.chdir(workdir)
+	try:
+		files = prepare_files(address, args) if scenario is None else []
+		users = [SimulatedUser(f"load{i}", address, recorder, args.encoding) for i in range(args.users)]
+		start = threading.Barrier(len(users) + 1)
+		threads = [threading.Thread(target=run_user, args=(user, args, scenario, files, args.mix, start)) for user in users]
+		for thread in threads:
+			thread.start()
+		start.wait()
+		started = time.perf_counter()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - started
+		for user in users:
+			user.close()
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	results = recorder.results(elapsed)
+	print_results(results)
+
+	if args.output:
+		run = {"benchmark": "loadgen", "label": args.label, "users": args.users, "scenario": args.scenario or args.mix, "encoding": args.encoding}
+		with open(args.output, "a", encoding="utf-8") as f:
+			for row in results:
+				f.write(json.dumps({**run, **row}) + "\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,141 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+
+# limitele superioare ale intervalelor histogramei de latență, în secunde: 50 µs ... ~52 s
+LATENCY_BUCKETS = [0.00005 * 2**i for i in range(21)]
+FANOUT_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384]
+PROFILE_INTERVAL = 0.01
+PROFILE_DEPTH = 32
+
+
+class Histogram:
+	def __init__(self, bounds: list[float]):
+		self.bounds: list[float] = bounds
+		self.counts: list[int] = [0] * (len(bounds) + 1)  # ultimul interval: peste ultima limită
+		self.count: int = 0
+		self.total: float = 0.0
+
+	def add(self, value: float):
+		# căutare liniară: valorile tipice cad în primele intervale
+		i = 0
+		while i < len(self.bounds) and value > self.bounds[i]:
+			i += 1
+		self.counts[i] += 1
+		self.count += 1
+		self.total += value
+
+	def percentile(self, p: float):
+		# limita superioară a intervalului în care cade percentila p
+		if not self.count:
+			return None
+		target = p / 100 * self.count
+		seen = 0
+		for i, count in enumerate(self.counts):
+			seen += count
+			if seen >= target:
+				return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+		return self.bounds[-1]
+
+
+class Metrics:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.started: float = time.time()
+		self.requests: dict[str, list] = {}  # tipul cererii -> [număr, erori, histograma latențelor]
+		self.broadcasts: int = 0
+		self.fanout = Histogram(FANOUT_BUCKETS)
+		self.connections_total: int = 0
+		# octeții conexiunilor deja închise; cei ai conexiunilor active se adună la fiecare citire a statisticilor
+		self.closed_bytes_in: int = 0
+		self.closed_bytes_out: int = 0
+
+	def record_request(self, request_type: str, seconds: float, status: int):
+		with self.lock:
+			entry = self.requests.get(request_type)
+			if entry is None:
+				entry = self.requests[request_type] = [0, 0, Histogram(LATENCY_BUCKETS)]
+			entry[0] += 1
+			if status >= 400:
+				entry[1] += 1
+			entry[2].add(seconds)
+
+	def record_broadcast(self, recipients: int):
+		with self.lock:
+			self.broadcasts += 1
+			self.fanout.add(recipients)
+
+	def connection_opened(self):
+		with self.lock:
+			self.connections_total += 1
+
+	def connection_closed(self, bytes_in: int, bytes_out: int):
+		with self.lock:
+			self.closed_bytes_in += bytes_in
+			self.closed_bytes_out += bytes_out
+
+	def snapshot(self):
+		with self.lock:
+			requests = {}
+			for request_type, (count, errors, histogram) in sorted(self.requests.items()):
+				requests[request_type] = {
+					"count": count,
+					"errors": errors,
+					"mean_ms": round(histogram.total / count * 1000, 3),
+					"p50_ms": round(histogram.percentile(50) * 1000, 3),
+					"p95_ms": round(histogram.percentile(95) * 1000, 3),
+					"p99_ms": round(histogram.percentile(99) * 1000, 3),
+				}
+			return {
+				"uptime_s": round(time.time() - self.started, 1),
+				"requests": requests,
+				"broadcasts": self.broadcasts,
+				"fanout_mean": round(self.fanout.total / self.fanout.count, 2) if self.fanout.count else 0,
+				"fanout_p99": self.fanout.percentile(99) or 0,
+				"connections_total": self.connections_total,
+				"bytes_in": self.closed_bytes_in,
+				"bytes_out": self.closed_bytes_out,
+			}
+
+
+class SamplingProfiler:
+	# eșantionează periodic stivele tuturor firelor și le numără în format "collapsed" (f1;f2;f3 n),
+	# citit direct de flamegraph.pl / speedscope
+	def __init__(self, interval: float = PROFILE_INTERVAL):
+		self.interval: float = interval
+		self.stacks: collections.Counter = collections.Counter()
+		self.samples: int = 0
+		self.lock = threading.Lock()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def run(self):
+		own = threading.get_ident()
+		while True:
+			time.sleep(self.interval)
+			frames = sys._current_frames()
+			with self.lock:
+				self.samples += 1
+				for thread_id, frame in frames.items():
+					if thread_id == own:
+						continue
+					stack = []
+					while frame is not None and len(stack) < PROFILE_DEPTH:
+						code = frame.f_code
+						stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+						frame = frame.f_back
+					self.stacks[";".join(reversed(stack))] += 1
+
+	def write(self, path: str):
+		with self.lock:
+			stacks = self.stacks.most_common()
+		with open(path, "w", encoding="utf-8") as f:
+			for stack, count in stacks:
+				f.write(f"{stack} {count}\n")
+		return len(stacks)
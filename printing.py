@@ -1,4 +1,6 @@
+import queue
 import sys
+import threading
 
 
 GREEN = "\033[92m"
@@ -14,7 +16,7 @@ def print_response(response: dict):
 
 	if msg_type.startswith("FILE_"):
 		color = YELLOW
-	elif int(status) == 200:
+	elif int(status) < 400:
 		color = GREEN
 	else:
 		color = RED
@@ -38,3 +40,49 @@ def print_error(message: str):
 def print_info(message: str):
 	sys.stdout.write(f"\n{YELLOW}{message}{RESET}\n\n")
 	sys.stdout.flush()
+
+
+LOG_LEVELS = {"debug": 10, "info": 20, "error": 40, "off": 100}
+
+
+class Log:
+	# jurnalul serverului: mesajele sub nivelul ales sunt ignorate, celelalte sunt scrise de un fir separat,
+	# astfel încât firele care tratează cereri nu așteaptă după stdout
+	def __init__(self, level: str = "info", stream=sys.stdout):
+		self.level: int = LOG_LEVELS[level]
+		self.stream = stream
+		self.queue: queue.SimpleQueue = queue.SimpleQueue()
+		self.writer = threading.Thread(target=self.run, daemon=True)
+		self.writer.start()
+
+	def set_level(self, level: str):
+		self.level = LOG_LEVELS[level]
+
+	def write(self, level: str, color: str, message: str):
+		if LOG_LEVELS[level] >= self.level:
+			self.queue.put(f"\n{color}{message}{RESET}\n\n")
+
+	def debug(self, message: str):
+		self.write("debug", YELLOW, message)
+
+	def info(self, message: str):
+		self.write("info", YELLOW, message)
+
+	def error(self, message: str):
+		self.write("error", RED, message)
+
+	def run(self):
+		while True:
+			lines = [self.queue.get()]
+			# tot ce s-a adunat între timp este scris dintr-o dată
+			while not self.queue.empty() and lines[-1] is not None:
+				lines.append(self.queue.get())
+			done = lines[-1] is None
+			self.stream.write("".join(line for line in lines if line is not None))
+			self.stream.flush()
+			if done:
+				return
+
+	def close(self, timeout: float = 1.0):
+		self.queue.put(None)
+		self.writer.join(timeout)
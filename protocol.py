@@ -0,0 +1,281 @@
+import json
+import struct
+import zlib
+
+
+HEADER = struct.Struct("!IB")  # lungimea corpului (big-endian) și flag-urile cadrului
+CONTENT_HEADER = struct.Struct("!I")  # lungimea antetului JSON dintr-un cadru cu conținut separat
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+RECV_BUFFER_SIZE = 256 * 1024
+
+# biții 0-3 din flag-uri: codecul de compresie al conținutului (0 = necomprimat)
+COMPRESSION_MASK = 0x0F
+# conținutul fișierului este trimis ca octeți bruți după antetul JSON, nu în interiorul lui
+FLAG_CONTENT = 0x10
+# corpul cadrului este în codificarea binară (BINARY_HEADER), nu JSON; 0x20 este FLAG_CHUNK din streaming
+FLAG_BINARY = 0x40
+
+# tip, status, id-ul cererii + 1 (0 = fără id), lungimea mesajului, lungimea payload-ului JSON fără conținut;
+# urmează mesajul UTF-8, payload-ul și, cu FLAG_CONTENT, octeții conținutului (comprimați după biții 0-3)
+BINARY_HEADER = struct.Struct("!BHIHI")
+MESSAGE_TYPES = [
+	None,
+	"ERROR",
+	"AUTH",
+	"AUTH_RESPONSE",
+	"VIEW",
+	"VIEW_RESPONSE",
+	"LOCK",
+	"LOCK_RESPONSE",
+	"UPDATE",
+	"UPDATE_RESPONSE",
+	"RELEASE",
+	"RELEASE_RESPONSE",
+	"ADD",
+	"ADD_RESPONSE",
+	"DELETE",
+	"DELETE_RESPONSE",
+	"LIST",
+	"LIST_RESPONSE",
+	"FILE_ADDED",
+	"FILE_DELETED",
+	"FILE_LOCKED",
+	"FILE_RELEASED",
+	"FILE_UPDATED",
+	"BATCH",
+	"BATCH_RESPONSE",
+	"STATS",
+	"STATS_RESPONSE",
+	"HEARTBEAT",
+	"HEARTBEAT_RESPONSE",
+	"HISTORY",
+	"HISTORY_RESPONSE",
+]
+MESSAGE_TYPE_IDS: dict[str, int] = {name: i for i, name in enumerate(MESSAGE_TYPES) if name}
+BINARY_FIELDS = {"type", "status", "message", "payload", "id"}
+# codificările mesajelor, în ordinea de preferință; fără negociere se folosește JSON
+ENCODINGS = ["binary", "json"]
+
+COMPRESSION_THRESHOLD = 1024  # caractere de conținut sub care nu se comprimă
+ZLIB_LEVEL = 6
+
+
+class FrameError(Exception):
+	pass
+
+
+class Codec:
+	def __init__(self, name: str, codec_id: int, compress, decompress):
+		self.name: str = name
+		self.id: int = codec_id
+		self.compress = compress
+		self.decompress = decompress  # (data, max_size) -> bytes
+
+
+def zlib_decompress(data: bytes, max_size: int) -> bytes:
+	decompressor = zlib.decompressobj()
+	result = decompressor.decompress(data, max_size)
+	if decompressor.unconsumed_tail:
+		raise ValueError(f"Conținut decomprimat prea mare (maxim {max_size} octeți).")
+	return result
+
+
+CODECS: dict[str, Codec] = {"zlib": Codec("zlib", 1, lambda data: zlib.compress(data, ZLIB_LEVEL), zlib_decompress)}
+
+try:
+	import lz4.frame
+
+	def lz4_decompress(data: bytes, max_size: int) -> bytes:
+		decompressor = lz4.frame.LZ4FrameDecompressor()
+		result = decompressor.decompress(data, max_length=max_size)
+		# oprit la max_size înaintea sfârșitului cadrului, cu date încă nedecomprimate
+		if not decompressor.eof and not decompressor.needs_input:
+			raise ValueError(f"Conținut decomprimat prea mare (maxim {max_size} octeți).")
+		return result
+
+	CODECS["lz4"] = Codec("lz4", 2, lz4.frame.compress, lz4_decompress)
+except ImportError:
+	pass
+
+CODECS_BY_ID: dict[int, Codec] = {codec.id: codec for codec in CODECS.values()}
+# ordinea de preferință la negociere: codecurile mai rapide primele
+COMPRESSION_PREFERENCE = ["lz4", "zlib"]
+
+
+def available_codecs() -> list[str]:
+	return [name for name in COMPRESSION_PREFERENCE if name in CODECS]
+
+
+def negotiate_compression(offered: list) -> str | None:
+	if not isinstance(offered, list):
+		return None
+	for name in available_codecs():
+		if name in offered:
+			return name
+	return None
+
+
+def negotiate_encoding(offered: list) -> str:
+	if isinstance(offered, list) and "binary" in offered:
+		return "binary"
+	return "json"
+
+
+def encode_frame(body: bytes, flags: int = 0, max_frame_size: int = MAX_FRAME_SIZE) -> bytes:
+	if len(body) > max_frame_size:
+		raise FrameError(f"Mesaj prea mare: {len(body)} octeți (maxim {max_frame_size}).")
+	return HEADER.pack(len(body), flags) + body
+
+
+def encode_message(
+	data: dict,
+	compression: str = None,
+	compressed_content: bytes = None,
+	threshold: int = COMPRESSION_THRESHOLD,
+	max_frame_size: int = MAX_FRAME_SIZE,
+	encoding: str = "json",
+) -> bytes:
+	codec = CODECS.get(compression) if compression else None
+	if encoding == "binary":
+		frame = encode_binary(data, codec, compressed_content, threshold, max_frame_size)
+		if frame is not None:
+			return frame
+
+	payload = data.get("payload")
+	content = payload.get("content") if isinstance(payload, dict) else None
+
+	if codec is None or not isinstance(content, str) or (compressed_content is None and len(content) < threshold):
+		return encode_frame(json.dumps(data).encode("utf-8"), 0, max_frame_size)
+
+	if compressed_content is None:
+		compressed_content = codec.compress(content.encode("utf-8"))
+
+	header = dict(data)
+	header["payload"] = {k: v for k, v in payload.items() if k != "content"}
+	header_json = json.dumps(header).encode("utf-8")
+	body = CONTENT_HEADER.pack(len(header_json)) + header_json + compressed_content
+	return encode_frame(body, FLAG_CONTENT | codec.id, max_frame_size)
+
+
+def encode_binary(data: dict, codec: Codec, compressed_content: bytes, threshold: int, max_frame_size: int) -> bytes | None:
+	# None dacă mesajul nu se poate reprezenta binar (tip necunoscut, câmpuri în plus), caz în care se trimite JSON
+	type_id = MESSAGE_TYPE_IDS.get(data.get("type"))
+	status = data.get("status", 0)
+	request_id = data.get("id", -1)
+	payload = data.get("payload", {})
+	message = data.get("message", "").encode("utf-8") if isinstance(data.get("message", ""), str) else None
+	if (
+		type_id is None
+		or not BINARY_FIELDS.issuperset(data)
+		or not isinstance(payload, dict)
+		or message is None
+		or len(message) > 0xFFFF
+		or not isinstance(status, int)
+		or not 0 <= status <= 0xFFFF
+		or not isinstance(request_id, int)
+		or not -1 <= request_id < 0xFFFFFFFF
+	):
+		return None
+
+	flags = FLAG_BINARY
+	content = payload.get("content")
+	content_bytes = b""
+	if isinstance(content, str):
+		payload = {k: v for k, v in payload.items() if k != "content"}
+		flags |= FLAG_CONTENT
+		if codec is not None and (compressed_content is not None or len(content) >= threshold):
+			content_bytes = compressed_content if compressed_content is not None else codec.compress(content.encode("utf-8"))
+			flags |= codec.id
+		else:
+			content_bytes = content.encode("utf-8")
+
+	payload_json = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if payload else b""
+	header = BINARY_HEADER.pack(type_id, status, request_id + 1, len(message), len(payload_json))
+	return encode_frame(b"".join((header, message, payload_json, content_bytes)), flags, max_frame_size)
+
+
+def decode_binary(body: bytes, flags: int, max_size: int) -> dict:
+	if len(body) < BINARY_HEADER.size:
+		raise ValueError("Cadru binar trunchiat.")
+	type_id, status, request_id, message_length, payload_length = BINARY_HEADER.unpack_from(body)
+	if type_id >= len(MESSAGE_TYPES) or MESSAGE_TYPES[type_id] is None:
+		raise ValueError(f"Tip de mesaj necunoscut: {type_id}.")
+
+	message_end = BINARY_HEADER.size + message_length
+	payload_end = message_end + payload_length
+	if len(body) < payload_end:
+		raise ValueError("Cadru binar trunchiat.")
+
+	data: dict = {"type": MESSAGE_TYPES[type_id]}
+	if status:
+		data["status"] = status
+	if message_length:
+		data["message"] = body[BINARY_HEADER.size : message_end].decode("utf-8")
+	if request_id:
+		data["id"] = request_id - 1
+	payload = json.loads(body[message_end:payload_end]) if payload_length else {}
+	if not isinstance(payload, dict):
+		raise ValueError("Payload binar invalid.")
+	data["payload"] = payload
+
+	if flags & FLAG_CONTENT:
+		payload["content"] = decompress_content(body[payload_end:], flags, max_size).decode("utf-8")
+	return data
+
+
+def decompress_content(content: bytes, flags: int, max_size: int) -> bytes:
+	codec_id = flags & COMPRESSION_MASK
+	if not codec_id:
+		return content
+	codec = CODECS_BY_ID.get(codec_id)
+	if codec is None:
+		raise ValueError(f"Codec de compresie necunoscut: {codec_id}.")
+	return codec.decompress(content, max_size)
+
+
+def decode_message(body: bytes, flags: int = 0, max_size: int = MAX_FRAME_SIZE) -> dict:
+	if flags & FLAG_BINARY:
+		return decode_binary(body, flags, max_size)
+	if not flags & FLAG_CONTENT:
+		return json.loads(body)
+
+	if len(body) < CONTENT_HEADER.size:
+		raise ValueError("Cadru de conținut trunchiat.")
+	(header_length,) = CONTENT_HEADER.unpack_from(body)
+	header_end = CONTENT_HEADER.size + header_length
+	message = json.loads(body[CONTENT_HEADER.size : header_end])
+	content = decompress_content(body[header_end:], flags, max_size)
+
+	message.setdefault("payload", {})["content"] = content.decode("utf-8")
+	return message
+
+
+class FrameDecoder:
+	def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+		self.max_frame_size: int = max_frame_size
+		self.buffer: bytearray = bytearray()
+
+	def feed(self, data: bytes) -> list[tuple[int, bytes]]:
+		self.buffer += data
+		frames: list[tuple[int, bytes]] = []
+		offset = 0
+
+		while len(self.buffer) - offset >= HEADER.size:
+			length, flags = HEADER.unpack_from(self.buffer, offset)
+			if length > self.max_frame_size:
+				raise FrameError(f"Mesaj prea mare: {length} octeți (maxim {self.max_frame_size}).")
+
+			end = offset + HEADER.size + length
+			if len(self.buffer) < end:
+				break
+
+			frames.append((flags, bytes(self.buffer[offset + HEADER.size : end])))
+			offset = end
+
+		if offset:
+			del self.buffer[:offset]
+		return frames
+
+	def messages(self, data: bytes):
+		for flags, body in self.feed(data):
+			yield decode_message(body, flags, self.max_frame_size)
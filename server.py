@@ -1,57 +1,283 @@
+import argparse
+import asyncio
 import json
+import os
+import shutil
+import signal
 import socket
+import subprocess
+import sys
+import tempfile
 import threading
+import time
 
-from printing import print_error, print_info
-from server_state import ServerState
+from cache import DEFAULT_CACHE_BYTES
+from connection import (
+	BROADCAST_INTERVAL,
+	OUTBOUND_HIGH_WATER,
+	SLOW_CLIENT_POLICIES,
+	SLOW_CLIENT_POLICY,
+	AsyncConnection,
+	Connection,
+	ThreadConnection,
+)
+from coordinator import Coordinator, CoordinatorClient
+from metrics import PROFILE_INTERVAL, SamplingProfiler
+from printing import LOG_LEVELS, Log
+from protocol import RECV_BUFFER_SIZE, FrameDecoder, FrameError, decode_message
+from server_state import IDLE_TIMEOUT, LOCK_TIMEOUT, SERVER_FILES_DIR, SNAPSHOT_INTERVAL, ServerState
+from storage import DURABILITY, DURABILITY_MODES, GROUP_COMMIT_WINDOW, FileStore
+from streaming import FLAG_CHUNK, STREAM_THRESHOLD
+from timers import TimerHeap
+from watcher import POLL_INTERVAL, WATCH_DEBOUNCE, WATCH_MODES, DirectoryWatcher
 
 
 SERVER_HOST = "localhost"
 SERVER_PORT = 12345
+SERVER_BACKLOG = 128
+WORKER_SHUTDOWN_TIMEOUT = 10.0
 
 state = ServerState()
+log = Log()
+outbound_options: dict = {"high_water": OUTBOUND_HIGH_WATER, "policy": SLOW_CLIENT_POLICY, "min_interval": BROADCAST_INTERVAL}
+
+
+def handle_data(conn: Connection, decoder: FrameDecoder, data: bytes):
+	conn.bytes_received += len(data)
+	conn.last_seen = time.monotonic()
+	for flags, body in decoder.feed(data):
+		if flags & FLAG_CHUNK:
+			handle_chunk(conn, body)
+			continue
+
+		try:
+			message_json = decode_message(body, flags, decoder.max_frame_size)
+		except ValueError:
+			error = state.make_response("ERROR", 400, "Mesaj JSON invalid.")
+			state.send(conn, error)
+			continue
+
+		payload = message_json.get("payload")
+		if isinstance(payload, dict) and "stream" in payload:
+			if conn.upload is not None:
+				# un transfer nou îl abandonează pe cel neterminat
+				conn.upload.discard()
+				conn.upload = None
+			try:
+				rejected = state.start_upload(conn, message_json)
+			except (ValueError, OSError) as e:
+				state.send(conn, state.make_response("ERROR", 400, str(e)))
+				continue
+			if rejected is not None:
+				state.send(conn, rejected)
+			if conn.upload.is_complete():
+				finish_upload(conn)
+			continue
+
+		dispatch(conn, message_json)
+
+
+def handle_chunk(conn: Connection, body: bytes):
+	if conn.upload is None:
+		state.send(conn, state.make_response("ERROR", 400, "Bucată de transfer neașteptată."))
+		return
+
+	try:
+		complete = conn.upload.write(body)
+	except ValueError as e:
+		conn.upload.discard()
+		conn.upload = None
+		state.send(conn, state.make_response("ERROR", 400, str(e)))
+		return
+
+	if complete:
+		finish_upload(conn)
+
+
+def finish_upload(conn: Connection):
+	# transferul rămâne în conn.upload cât timp cererea lui este tratată; unul respins a primit deja răspunsul
+	upload = conn.upload
+	try:
+		if upload.path is not None:
+			dispatch(conn, upload.message)
+	finally:
+		conn.upload = None
+		upload.discard()
+
+
+def dispatch(conn: Connection, message_json: dict):
+	response = state.handle_request(conn, message_json)
+	if response:
+		state.send(conn, response)
+
+
+def disconnect(conn: Connection, client_address):
+	log.debug(f"[INFO] Conexiune închisă cu {client_address}")
+	if conn.upload is not None:
+		conn.upload.discard()
+		conn.upload = None
+	state.unregister(conn)
 
 
 def handle_client(client_socket: socket.socket, client_address):
-	print_info(f"[INFO] Conexiune nouă de la {client_address}")
-	state.clients[client_socket] = ""
+	log.debug(f"[INFO] Conexiune nouă de la {client_address}")
+	# scriitorul conexiunii grupează deja mesajele; Nagle ar întârzia răspunsurile cererilor trimise în pipeline
+	client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	conn = ThreadConnection(client_socket, **outbound_options)
+	state.register(conn)
+
+	decoder = FrameDecoder()
 
 	try:
 		while True:
-			data = client_socket.recv(4096)
+			data = client_socket.recv(RECV_BUFFER_SIZE)
 			if not data:
 				break
 
-			try:
-				message_json = json.loads(data.decode("utf-8"))
-			except json.JSONDecodeError:
-				error = state.make_response("ERROR", 400, "Mesaj JSON invalid.")
-				client_socket.sendall(json.dumps(error).encode("utf-8"))
-				continue
+			handle_data(conn, decoder, data)
+			conn.wait_writable()
+
+	except FrameError as e:
+		log.error(f"[ERROR] Mesaj respins de la {client_address}: {e}")
+		state.send(conn, state.make_response("ERROR", 413, "Mesaj prea mare."))
+	except ConnectionResetError:
+		log.debug(f"[INFO] Clientul {client_address} s-a deconectat forțat.")
+	except Exception as e:
+		log.error(f"[ERROR] Eroare cu clientul {client_address}: {e}")
+	finally:
+		disconnect(conn, client_address)
+		conn.close()
 
-			response = state.handle_request(client_socket, message_json)
-			if response:
-				client_socket.sendall(json.dumps(response).encode("utf-8"))
 
+async def handle_client_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+	client_address = writer.get_extra_info("peername")
+	log.debug(f"[INFO] Conexiune nouă de la {client_address}")
+	conn = AsyncConnection(writer, **outbound_options)
+	state.register(conn)
+
+	decoder = FrameDecoder()
+
+	try:
+		while True:
+			data = await reader.read(RECV_BUFFER_SIZE)
+			if not data:
+				break
+
+			if state.coordinator is not None:
+				# AUTH, LOCK, ADD și DELETE așteaptă răspunsul coordonatorului: nu pe firul buclei de evenimente
+				await asyncio.get_running_loop().run_in_executor(None, handle_data, conn, decoder, data)
+			else:
+				handle_data(conn, decoder, data)
+			await conn.wait_writable()
+
+	except FrameError as e:
+		log.error(f"[ERROR] Mesaj respins de la {client_address}: {e}")
+		state.send(conn, state.make_response("ERROR", 413, "Mesaj prea mare."))
 	except ConnectionResetError:
-		print_info(f"[INFO] Clientul {client_address} s-a deconectat forțat.")
+		log.debug(f"[INFO] Clientul {client_address} s-a deconectat forțat.")
 	except Exception as e:
-		print_error(f"[ERROR] Eroare cu clientul {client_address}: {e}")
+		log.error(f"[ERROR] Eroare cu clientul {client_address}: {e}")
 	finally:
-		print_info(f"[INFO] Conexiune închisă cu {client_address}")
-		username = state.clients.pop(client_socket, None)
-		if username:
-			state.cleanup_disconnected_user(username)
-		client_socket.close()
+		disconnect(conn, client_address)
+		await conn.close()
 
 
-def main():
+def start_watcher(mode: str, debounce: float, loop: asyncio.AbstractEventLoop = None):
+	if mode == "off":
+		return None
+
+	on_change = state.reconcile_files
+	if loop is not None:
+		# conexiunile asyncio se folosesc doar din bucla de evenimente
+		def on_change(names):
+			loop.call_soon_threadsafe(state.reconcile_files, names)
+
+	watcher = DirectoryWatcher(SERVER_FILES_DIR, on_change, mode, debounce, POLL_INTERVAL)
+	log.info(f"[INFO] Se urmărește {SERVER_FILES_DIR} ({watcher.mode})")
+	state.watcher = watcher
+	return watcher.start()
+
+
+def apply_remote(message: dict, delta: dict, exclude_username: str):
+	try:
+		state.apply_remote(message, delta, exclude_username)
+	except Exception as e:
+		log.error(f"[ERROR] Evenimentul altui worker nu a putut fi livrat: {e}")
+
+
+def connect_coordinator(path: str, loop: asyncio.AbstractEventLoop = None):
+	if path is None:
+		return
+	on_broadcast = apply_remote
+	if loop is not None:
+		def on_broadcast(message, delta, exclude_username):
+			loop.call_soon_threadsafe(apply_remote, message, delta, exclude_username)
+
+	state.attach_coordinator(CoordinatorClient(path, on_broadcast))
+
+
+def start_reaper(loop: asyncio.AbstractEventLoop = None):
+	# expiră lock-urile deținătorilor tăcuți și închide conexiunile inactive
+	if state.lock_timeout <= 0 and state.idle_timeout <= 0:
+		return
+	on_expire = state.on_timer
+	if loop is not None:
+		def on_expire(item):
+			loop.call_soon_threadsafe(state.on_timer, item)
+
+	state.timers = TimerHeap(on_expire).start()
+
+
+def schedule_lock_expiry(loop: asyncio.AbstractEventLoop = None):
+	deadline = state.restored_lock_deadline()
+	if deadline is None:
+		return
+	delay = max(0.0, deadline - time.time())
+	if loop is not None:
+		loop.call_later(delay, state.expire_restored_locks)
+	else:
+		timer = threading.Timer(delay, state.expire_restored_locks)
+		timer.daemon = True
+		timer.start()
+
+
+def save_snapshots(interval: float):
+	while True:
+		time.sleep(interval)
+		try:
+			state.save_snapshot()
+		except OSError as e:
+			log.error(f"[ERROR] Snapshot-ul indexului nu a putut fi salvat: {e}")
+
+
+def dump_stats(path: str, interval: float):
+	# adaugă periodic statisticile serverului, câte un obiect JSON pe linie
+	while True:
+		time.sleep(interval)
+		try:
+			with open(path, "a", encoding="utf-8") as f:
+				f.write(json.dumps({"time": time.time(), **state.stats()}) + "\n")
+		except OSError as e:
+			log.error(f"[ERROR] Statisticile nu au putut fi scrise: {e}")
+
+
+def serve_threaded(
+	host: str, port: int, backlog: int, watch: str = "off", watch_debounce: float = WATCH_DEBOUNCE, coordinator: str = None
+):
+	connect_coordinator(coordinator)
+	start_reaper()
+	start_watcher(watch, watch_debounce)
+	schedule_lock_expiry()
+
 	server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 	server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-	server_socket.bind((SERVER_HOST, SERVER_PORT))
-	server_socket.listen(10)
+	if coordinator is not None:
+		# toți workerii ascultă pe același port; nucleul împarte conexiunile noi între ei
+		server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+	server_socket.bind((host, port))
+	server_socket.listen(backlog)
 
-	print_info(f"[INFO] Serverul ascultă pe {SERVER_HOST}:{SERVER_PORT}")
+	log.info(f"[INFO] Serverul ascultă pe {host}:{port}" + (f" (worker {os.getpid()})" if coordinator else ""))
 
 	while True:
 		client_socket, client_address = server_socket.accept()
@@ -59,5 +285,211 @@ def main():
 		client_thread.start()
 
 
+async def serve_async(
+	host: str, port: int, backlog: int, watch: str = "off", watch_debounce: float = WATCH_DEBOUNCE, coordinator: str = None
+):
+	connect_coordinator(coordinator, asyncio.get_running_loop())
+	start_reaper(asyncio.get_running_loop())
+	start_watcher(watch, watch_debounce, asyncio.get_running_loop())
+	schedule_lock_expiry(asyncio.get_running_loop())
+
+	server = await asyncio.start_server(
+		handle_client_async, host, port, backlog=backlog, reuse_address=True, reuse_port=coordinator is not None
+	)
+
+	log.info(f"[INFO] Serverul (asyncio) ascultă pe {host}:{port}" + (f" (worker {os.getpid()})" if coordinator else ""))
+
+	async with server:
+		await server.serve_forever()
+
+
+def worker_command(path: str):
+	# argumentele procesului curent, fără --workers, plus adresa coordonatorului
+	argv = []
+	skip = False
+	for arg in sys.argv[1:]:
+		if skip:
+			skip = False
+		elif arg == "--workers":
+			skip = True
+		elif not arg.startswith("--workers="):
+			argv.append(arg)
+	return [sys.executable, os.path.abspath(__file__), *argv, "--coordinator", path]
+
+
+def serve_workers(count: int):
+	# procesul curent rulează coordonatorul și pornește count procese worker care acceptă pe același port;
+	# coordonatorul rămâne activ până la oprirea ultimului worker, ca acesta să-și poată salva indexul
+	directory = tempfile.mkdtemp(prefix="server-")
+	path = os.path.join(directory, "coordinator.sock")
+	coordinator = Coordinator()
+
+	async def run():
+		loop = asyncio.get_running_loop()
+		ready = asyncio.Event()
+		server = asyncio.create_task(coordinator.serve(path, ready))
+		await ready.wait()
+
+		workers = [subprocess.Popen(worker_command(path)) for _ in range(count)]
+		log.info(f"[INFO] Coordonator pe {path}, {count} workeri: {', '.join(str(worker.pid) for worker in workers)}")
+		exited = [asyncio.ensure_future(loop.run_in_executor(None, worker.wait)) for worker in workers]
+
+		stopping = asyncio.Event()
+		for signum in (signal.SIGINT, signal.SIGTERM):
+			loop.add_signal_handler(signum, stopping.set)
+		# un worker căzut nu oprește serverul: coordonatorul îi eliberează lock-urile, ceilalți continuă
+		await asyncio.wait([asyncio.ensure_future(stopping.wait()), asyncio.gather(*exited)], return_when=asyncio.FIRST_COMPLETED)
+
+		# la Ctrl+C workerii primesc și ei SIGINT; cei care nu l-au primit sunt opriți la fel după o scurtă pauză
+		await asyncio.wait(exited, timeout=1.0)
+		for worker in workers:
+			if worker.poll() is None:
+				worker.send_signal(signal.SIGINT)
+		await asyncio.wait(exited, timeout=WORKER_SHUTDOWN_TIMEOUT)
+		for worker in workers:
+			if worker.poll() is None:
+				worker.kill()
+		await asyncio.wait(exited)
+		server.cancel()
+
+	try:
+		asyncio.run(run())
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Server pentru editarea partajată de fișiere text.")
+	parser.add_argument("--host", default=SERVER_HOST)
+	parser.add_argument("--port", type=int, default=SERVER_PORT)
+	parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread", help="modelul de concurență")
+	parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG, help="lungimea cozii de conexiuni în așteptare")
+	parser.add_argument("--slow-client-policy", choices=SLOW_CLIENT_POLICIES, default=SLOW_CLIENT_POLICY)
+	parser.add_argument(
+		"--outbound-high-water-mb",
+		type=int,
+		default=OUTBOUND_HIGH_WATER // (1024 * 1024),
+		help="dimensiunea cozii de ieșire a unei conexiuni peste care se aplică politica pentru clienți lenți",
+	)
+	parser.add_argument(
+		"--broadcast-interval-ms",
+		type=float,
+		default=BROADCAST_INTERVAL * 1000,
+		help="intervalul minim între două FILE_UPDATED (sau FILE_LOCKED/FILE_RELEASED) ale aceluiași fișier către un client; "
+		"între timp se păstrează doar ultimul",
+	)
+	parser.add_argument(
+		"--stream-threshold-kb",
+		type=int,
+		default=STREAM_THRESHOLD // 1024,
+		help="fișierele mai mari sunt transmise în bucăți, direct de pe disc",
+	)
+	parser.add_argument(
+		"--lock-timeout",
+		type=float,
+		default=LOCK_TIMEOUT,
+		help="secunde fără niciun mesaj (nici HEARTBEAT) de la deținător după care lock-urile lui expiră; 0 = niciodată",
+	)
+	parser.add_argument(
+		"--idle-timeout", type=float, default=IDLE_TIMEOUT, help="secunde fără niciun mesaj după care o conexiune este închisă; 0 = niciodată"
+	)
+	parser.add_argument(
+		"--history",
+		choices=["on", "off"],
+		default="on",
+		help="păstrarea versiunilor anterioare ale fișierelor în server_history (comanda HISTORY, VIEW <fișier> <versiune>)",
+	)
+	parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024), help="memoria pentru cache-ul de fișiere")
+	parser.add_argument(
+		"--durability",
+		choices=DURABILITY_MODES,
+		default=DURABILITY,
+		help="none: doar redenumire atomică; fsync: fiecare scriere pe disc înainte de răspuns; group: fsync în loturi",
+	)
+	parser.add_argument(
+		"--group-commit-ms",
+		type=float,
+		default=GROUP_COMMIT_WINDOW * 1000,
+		help="fereastra în care scrierile sunt adunate într-un lot (pentru --durability group)",
+	)
+	parser.add_argument("--watch", choices=WATCH_MODES, default="auto", help="urmărirea modificărilor din server_files făcute din afara serverului")
+	parser.add_argument(
+		"--watch-debounce-ms",
+		type=float,
+		default=WATCH_DEBOUNCE * 1000,
+		help="liniștea după o rafală de modificări înainte ca acestea să fie anunțate",
+	)
+	parser.add_argument(
+		"--snapshot-interval",
+		type=float,
+		default=SNAPSHOT_INTERVAL,
+		help="secunde între salvările indexului de fișiere (0 = doar la oprire)",
+	)
+	parser.add_argument("--log-level", choices=LOG_LEVELS, default="info", help="debug afișează și conexiunile individuale")
+	parser.add_argument("--stats-file", help="fișier JSONL în care se adaugă periodic statisticile serverului")
+	parser.add_argument("--stats-interval", type=float, default=10.0, help="secunde între două înregistrări în --stats-file")
+	parser.add_argument("--profile", help="activează profilerul prin eșantionare și scrie stivele în acest fișier la oprire")
+	parser.add_argument("--profile-interval-ms", type=float, default=PROFILE_INTERVAL * 1000)
+	parser.add_argument(
+		"--workers",
+		type=int,
+		default=1,
+		help="numărul de procese worker care acceptă conexiuni pe același port, coordonate printr-un proces local",
+	)
+	parser.add_argument("--coordinator", help=argparse.SUPPRESS)  # socketul Unix al coordonatorului, pentru workeri
+	args = parser.parse_args()
+	if args.engine == "asyncio" and args.durability != "none":
+		# cererile asyncio sunt tratate în bucla de evenimente: fiecare fsync (sau fereastra unui lot) ar opri
+		# toate conexiunile, iar scrierile nu ar mai putea fi adunate în loturi
+		parser.error("--durability fsync și group sunt disponibile doar cu --engine thread")
+	return args
+
+
+def main():
+	args = parse_args()
+	if args.coordinator is not None:
+		# workerii sunt opriți de coordonator cu SIGINT, chiar dacă au fost porniți cu el ignorat
+		signal.signal(signal.SIGINT, signal.default_int_handler)
+	elif args.workers > 1:
+		log.set_level(args.log_level)
+		serve_workers(args.workers)
+		log.info("[INFO] Coordonatorul s-a oprit.")
+		log.close()
+		return
+
+	state.cache.resize(args.cache_mb * 1024 * 1024)
+	state.stream_threshold = args.stream_threshold_kb * 1024
+	state.lock_timeout = args.lock_timeout
+	state.idle_timeout = args.idle_timeout
+	state.store = FileStore(args.durability, args.group_commit_ms / 1000)
+	if args.history == "off":
+		state.history = None
+	else:
+		state.history.store = state.store
+	outbound_options["high_water"] = args.outbound_high_water_mb * 1024 * 1024
+	outbound_options["policy"] = args.slow_client_policy
+	outbound_options["min_interval"] = args.broadcast_interval_ms / 1000
+	watch_debounce = args.watch_debounce_ms / 1000
+	log.set_level(args.log_level)
+	if args.stats_file:
+		threading.Thread(target=dump_stats, args=(args.stats_file, args.stats_interval), daemon=True).start()
+	profiler = SamplingProfiler(args.profile_interval_ms / 1000).start() if args.profile else None
+	if args.snapshot_interval > 0:
+		threading.Thread(target=save_snapshots, args=(args.snapshot_interval,), daemon=True).start()
+
+	try:
+		if args.engine == "asyncio":
+			asyncio.run(serve_async(args.host, args.port, args.backlog, args.watch, watch_debounce, args.coordinator))
+		else:
+			serve_threaded(args.host, args.port, args.backlog, args.watch, watch_debounce, args.coordinator)
+	except KeyboardInterrupt:
+		files = state.save_snapshot()
+		log.info(f"[INFO] Serverul s-a oprit. Index salvat ({files} fișiere). Cache: {state.cache.stats()} Scrieri: {state.store.stats()}")
+		if profiler is not None:
+			stacks = profiler.write(args.profile)
+			log.info(f"[INFO] Profil scris în {args.profile}: {profiler.samples} eșantioane, {stacks} stive distincte.")
+		log.close()
+
+
 if __name__ == "__main__":
 	main()
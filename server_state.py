@@ -1,29 +1,365 @@
+from array import array
+import hashlib
 import json
 import os
-import socket
+from bisect import bisect_left, bisect_right, insort
+from fnmatch import fnmatchcase
+import tempfile
+import threading
+import time
+
+from cache import DEFAULT_CACHE_BYTES, ContentCache
+from connection import Connection
+from delta import apply_patch, content_hash
+from history import HISTORY_PAGE_SIZE, HistoryStore
+from metrics import Metrics
+from protocol import encode_message, negotiate_compression, negotiate_encoding
+from storage import FileStore
+from streaming import CHUNK_SIZE, STREAM_THRESHOLD, TEMP_PREFIX, IncomingStream, OutgoingStream, file_digest
 
 
 SERVER_FILES_DIR = "server_files"
+SERVER_INDEX_FILE = "server_index.json"  # snapshot-ul indexului de fișiere, citit la pornire
+SNAPSHOT_INTERVAL = 30.0
+LOCK_LEASE = 120.0  # secunde cât un lock din snapshot rămâne rezervat deținătorului după o repornire
+LOCK_TIMEOUT = 60.0  # secunde fără niciun mesaj de la deținător după care lock-urile lui expiră (0 = niciodată)
+IDLE_TIMEOUT = 300.0  # secunde fără niciun mesaj după care conexiunea este închisă (0 = niciodată)
+HEARTBEAT_FRACTION = 3  # clienții trimit HEARTBEAT de atâtea ori în cel mai scurt dintre termene
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+LIST_SCAN_FACTOR = 10  # o pagină filtrată cu glob parcurge cel mult limit * LIST_SCAN_FACTOR intrări
+GLOB_CHARS = "*?["
+BATCH_TYPES = ("VIEW", "LOCK", "RELEASE")
+# cererile tratate de route(); metricile celorlalte tipuri trimise de clienți sunt adunate sub UNKNOWN_REQUEST
+REQUEST_TYPES = ("AUTH", "VIEW", "LOCK", "UPDATE", "RELEASE", "ADD", "DELETE", "LIST", "BATCH", "HISTORY", "STATS", "HEARTBEAT")
+UNKNOWN_REQUEST = "unknown"
+BATCH_MAX_REQUESTS = 100
+WINDOW_KINDS = ("lines", "bytes")  # intervalele pe care le poate cere un VIEW
+FILE_LOCK_STRIPES = 1024  # lock-uri de fișier, împărțite după hash-ul numelui
 
 
 class ServerState:
-	def __init__(self):
-		self.clients: dict[socket.socket, str] = {}  # socket -> username
-		self.files: dict[str, dict[str, set[str]]] = {}  # file: str -> { locked_by: str | None, viewers: set[str] }
+	def __init__(self, cache_bytes: int = DEFAULT_CACHE_BYTES, stream_threshold: int = STREAM_THRESHOLD):
+		self.clients: dict[Connection, str] = {}  # connection -> username
+		self.users: dict[str, Connection] = {}  # username -> connection, indexul invers al lui clients
+		self.files: dict[str, dict] = {}  # file: str -> { locked_by: str | None, viewers: { user -> version }, version: str | None }
+		self.index: list[str] = []  # numele din files, sortate, pentru LIST
+		self.cache: ContentCache = ContentCache(cache_bytes)
+		self.stream_threshold: int = stream_threshold  # fișierele mai mari se transmit în bucăți, direct de pe disc
+		self.store: FileStore = FileStore()  # scrierile atomice (și durabile, după configurare) pe disc
+		self.metrics: Metrics = Metrics()
+		self.history: HistoryStore | None = HistoryStore()  # versiunile anterioare ale fișierelor (None: dezactivat)
+		# registry_lock protejează structura dicționarelor clients/files; lock-ul unui fișier protejează
+		# intrarea lui din files și conținutul de pe disc. Ordinea de achiziție: fișier, apoi registry.
+		self.registry_lock = threading.RLock()
+		# un număr fix de lock-uri, alese după numele fișierului: memoria nu crește cu numele cerute de clienți
+		# (inclusiv inexistente sau șterse), iar un lock nu trebuie eliminat cât timp alt fir îl așteaptă.
+		# Niciun fir nu ține două lock-uri de fișier simultan, deci două nume pe același lock nu se pot bloca reciproc
+		self.file_locks: list[threading.RLock] = [threading.RLock() for _ in range(FILE_LOCK_STRIPES)]
+		self.viewing: dict[str, set[str]] = {}  # username -> fișierele pe care le urmărește, pentru deconectare
+		self.windows: dict[tuple[str, str], tuple] = {}  # (file, user) -> (tip, start, end) pentru viewer-ii unui interval
+		self.restored_locks: dict[str, tuple[str, float]] = {}  # file -> (user, expirare) pentru lock-urile din snapshot
+		self.coordinator = None  # CoordinatorClient în modul cu mai multe procese worker
+		self.held_locks: dict[str, set[str]] = {}  # username -> fișierele blocate de el prin acest proces
+		self.lock_timeout: float = LOCK_TIMEOUT
+		self.idle_timeout: float = IDLE_TIMEOUT
+		self.timers = None  # TimerHeap pentru expirarea lock-urilor și a conexiunilor inactive
+		self.watcher = None  # DirectoryWatcher pe server_files, anunțat după modificările făcute de server
 		os.makedirs(SERVER_FILES_DIR, exist_ok=True)
 		self.initialize_files()
 
 	def initialize_files(self):
-		for filename in os.listdir(SERVER_FILES_DIR):
-			if os.path.isfile(os.path.join(SERVER_FILES_DIR, filename)):
-				self.files[filename] = {"locked_by": None, "viewers": set()}
+		# dacă directorul nu s-a schimbat de la ultimul snapshot, lista de fișiere este luată din snapshot;
+		# versiunile salvate sunt validate ulterior după (mtime_ns, size), doar pentru fișierele folosite
+		snapshot = self.load_snapshot()
+		if snapshot is not None and snapshot["dir_mtime_ns"] == os.stat(SERVER_FILES_DIR).st_mtime_ns:
+			names = snapshot["names"].split("\0") if snapshot["names"] else []
+		else:
+			with os.scandir(SERVER_FILES_DIR) as entries:
+				names = [entry.name for entry in entries if entry.is_file() and not entry.name.startswith(TEMP_PREFIX)]
+
+		self.files = {filename: {"locked_by": None, "viewers": {}, "version": None} for filename in names}
+		self.index = sorted(self.files)
+		if snapshot is None:
+			return
+
+		now = time.time()
+		for filename, entry in snapshot["files"].items():
+			if filename not in self.files:
+				continue
+			mtime_ns, size, version, locked_by, lease = entry
+			if version:
+				self.cache.put_version(filename, (mtime_ns, size), version)
+			if locked_by and lease > now:
+				self.files[filename]["locked_by"] = locked_by
+				self.restored_locks[filename] = (locked_by, lease)
+
+	def load_snapshot(self):
+		try:
+			with open(SERVER_INDEX_FILE, "rb") as f:
+				snapshot = json.load(f)
+		except (OSError, ValueError):
+			return None
+		if not isinstance(snapshot, dict) or not isinstance(snapshot.get("files"), dict) or not isinstance(snapshot.get("names"), str):
+			return None
+		return snapshot
+
+	def save_snapshot(self):
+		# names: toate fișierele, separate prin \0; files: doar cele cu versiune sau lock cunoscute,
+		# file -> [mtime_ns, size, version, locked_by, expirarea lock-ului]
+		dir_mtime_ns = os.stat(SERVER_FILES_DIR).st_mtime_ns
+		known = self.cache.known_versions()
+		expires = time.time() + LOCK_LEASE
+		with self.registry_lock:
+			items = [(file, self.files[file]["locked_by"]) for file in self.index]
+
+		files = {}
+		for file, locked_by in items:
+			if file not in known and not locked_by:
+				continue
+			(mtime_ns, size), version = known.get(file, ((0, 0), None))
+			files[file] = [mtime_ns, size, version, locked_by, expires if locked_by else 0]
+
+		names = "\0".join(file for file, _ in items)  # în ordinea indexului, ca sortarea la pornire să fie liniară
+		data = json.dumps({"dir_mtime_ns": dir_mtime_ns, "names": names, "files": files}, separators=(",", ":"))
+		self.store.write(SERVER_INDEX_FILE, data.encode("utf-8"))
+		return len(files)
+
+	def restored_lock_deadline(self):
+		if not self.restored_locks:
+			return None
+		return max(lease for _, lease in self.restored_locks.values())
+
+	def expire_restored_locks(self):
+		# lock-urile din snapshot nerevendicate de deținători până la expirare sunt eliberate
+		now = time.time()
+		for file, (user, lease) in list(self.restored_locks.items()):
+			if lease > now:
+				continue
+			with self.file_lock(file):
+				self.restored_locks.pop(file, None)
+				info = self.files.get(file)
+				if info is None or info["locked_by"] != user or user in self.users:
+					continue
+				info["locked_by"] = None
+				self.notify_all({
+					"type": "FILE_RELEASED",
+					"status": 200,
+					"message": f"Lock-ul lui {user} pe {file} a expirat.",
+					"payload": {"file": file, "user": user},
+				})
+
+	def reconcile_files(self, names: set | None):
+		# aplică modificările făcute în server_files din afara protocolului și le anunță clienților
+		if names is None:
+			with self.registry_lock:
+				names = set(self.files)
+			names.update(os.listdir(SERVER_FILES_DIR))
+
+		for file in sorted(names):
+			if file.startswith(TEMP_PREFIX):
+				continue
+			with self.file_lock(file):
+				exists = os.path.isfile(self.file_path(file))
+				if exists and not self.file_exists(file):
+					with self.registry_lock:
+						self.files[file] = {"locked_by": None, "viewers": {}, "version": None}
+						insort(self.index, file)
+					self.notify_all({
+						"type": "FILE_ADDED",
+						"status": 200,
+						"message": f"Fișierul {file} a apărut pe server.",
+						"payload": {"file": file, "user": None},
+					}, publish=False)
+				elif not exists and self.file_exists(file):
+					self.remove_file(file)
+					self.notify_all({
+						"type": "FILE_DELETED",
+						"status": 200,
+						"message": f"Fișierul {file} a fost șters de pe server.",
+						"payload": {"file": file, "user": None},
+					}, publish=False)
+
+	def attach_coordinator(self, coordinator):
+		# lock-urile restaurate din snapshot nu sunt cunoscute coordonatorului, deci nu pot fi păstrate
+		self.coordinator = coordinator
+		for file in self.restored_locks:
+			self.files[file]["locked_by"] = None
+		self.restored_locks.clear()
+
+	def claim_user(self, username: str):
+		if self.coordinator is None:
+			return True
+		try:
+			return self.coordinator.request("auth", user=username)["ok"]
+		except TimeoutError:
+			# un răspuns întârziat ar putea înregistra totuși utilizatorul: logout ajunge la coordonator după auth
+			self.release_user(username)
+			return False
+
+	def release_user(self, username: str):
+		if self.coordinator is not None:
+			self.coordinator.send("logout", user=username)
+
+	def claim(self, file: str, username: str):
+		# rezervă fișierul la coordonator (lock sau operație exclusivă); fără coordonator nu este nimic de făcut
+		if self.coordinator is None:
+			return True
+		try:
+			return self.coordinator.request("lock", file=file, user=username)["ok"]
+		except TimeoutError:
+			# la fel pentru un lock acordat după expirarea așteptării: release îl anulează
+			self.unclaim(file, username)
+			return False
+
+	def unclaim(self, file: str, username: str):
+		if self.coordinator is not None:
+			self.coordinator.send("release", file=file, user=username)
+
+	def acquire_lock(self, file: str, username: str):
+		# apelat cu lock-ul fișierului deținut, după claim; cu coordonator, acesta a decis deja, iar copia locală
+		# poate fi în urmă cu evenimentele altor workeri. La False, apelantul anulează rezervarea
+		if self.coordinator is None and self.is_file_locked(file):
+			return False
+		if self.coordinator is not None and not os.path.exists(self.file_path(file)):
+			# șters de alt worker, al cărui FILE_DELETED nu a ajuns încă aici
+			return False
+		self.files[file]["locked_by"] = username
+		with self.registry_lock:
+			self.held_locks.setdefault(username, set()).add(file)
+		return True
+
+	def release_lock(self, file: str, username: str):
+		self.files[file]["locked_by"] = None
+		self.unclaim(file, username)
+		with self.registry_lock:
+			files = self.held_locks.get(username)
+			if files is not None:
+				files.discard(file)
+				if not files:
+					del self.held_locks[username]
+
+	def heartbeat_interval(self):
+		timeouts = [timeout for timeout in (self.lock_timeout, self.idle_timeout) if timeout > 0]
+		return min(timeouts) / HEARTBEAT_FRACTION if timeouts else None
+
+	def schedule(self, kind: str, sock: Connection, timeout: float):
+		# un singur termen pe conexiune și tip; activitatea ulterioară îl amână abia când acesta expiră
+		if self.timers is not None and timeout > 0:
+			self.timers.schedule(sock.last_seen + timeout, (kind, sock))
+
+	def on_timer(self, item: tuple):
+		kind, sock = item
+		timeout = self.lock_timeout if kind == "lease" else self.idle_timeout
+		if sock.closed or sock not in self.clients:
+			return
+		if kind == "lease" and self.get_username_by_socket(sock) not in self.held_locks:
+			return  # niciun lock de urmărit; următorul LOCK programează din nou termenul
+		if time.monotonic() - sock.last_seen < timeout:
+			self.schedule(kind, sock, timeout)
+		elif kind == "lease":
+			self.expire_locks(self.get_username_by_socket(sock))
+		else:
+			sock.abort()
+
+	def expire_locks(self, username: str):
+		# deținătorul nu a mai trimis nimic (nici HEARTBEAT) timp de lock_timeout: lock-urile lui sunt eliberate
+		with self.registry_lock:
+			files = list(self.held_locks.get(username, ()))
+		for file in files:
+			with self.file_lock(file):
+				info = self.files.get(file)
+				if info is None or info["locked_by"] != username:
+					continue
+				self.release_lock(file, username)
+				self.notify_all({
+					"type": "FILE_RELEASED",
+					"status": 200,
+					"message": f"Lock-ul lui {username} pe {file} a expirat.",
+					"payload": {"file": file, "user": username},
+				})
 
-	def is_authenticated(self, sock: socket.socket):
-		return sock in self.clients
+	def apply_remote(self, data: dict, delta: dict = None, exclude_username: str = None):
+		# un eveniment al altui worker: actualizează copia locală a stării și îl livrează clienților locali
+		payload = data["payload"]
+		file = payload.get("file")
+		user = payload.get("user")
+		with self.file_lock(file):
+			info = self.files.get(file)
+			match data["type"]:
+				case "FILE_ADDED":
+					if info is not None:
+						return  # deja anunțat, de exemplu de watcher
+					with self.registry_lock:
+						self.files[file] = {"locked_by": None, "viewers": {}, "version": None}
+						insort(self.index, file)
+				case _ if info is None:
+					return
+				case "FILE_LOCKED":
+					# lock-ul unui utilizator local este sigur actual; un FILE_LOCKED întârziat nu îl înlocuiește
+					if info["locked_by"] not in self.users:
+						info["locked_by"] = user
+				case "FILE_RELEASED":
+					if info["locked_by"] == user:
+						info["locked_by"] = None
+				case "FILE_DELETED":
+					self.remove_file(file)
+				case "FILE_UPDATED":
+					info["version"] = payload.get("version")
+					self.notify_viewers(file, data, delta, publish=False)
+					return
+			self.notify_all(data, exclude_username, publish=False)
+
+	def remove_file(self, file: str):
+		# apelat cu lock-ul fișierului deținut: scoate fișierul din index împreună cu viewer-ii, intervalele lor
+		# și lock-ul rămas, ca un fișier șters să nu lase nimic în urmă
+		info = self.files.get(file)
+		if info is None:
+			return
+		for user in list(info["viewers"]):
+			self.remove_viewer(file, user)
+		if file in self.held_locks.get(info["locked_by"], ()):
+			self.release_lock(file, info["locked_by"])
+		self.cache.invalidate(file)
+		with self.registry_lock:
+			self.files.pop(file, None)
+			self.remove_from_index(file)
+
+	def remove_from_index(self, file: str):
+		# apelat cu registry_lock deținut
+		i = bisect_left(self.index, file)
+		if i < len(self.index) and self.index[i] == file:
+			del self.index[i]
+
+	def file_lock(self, file: str):
+		return self.file_locks[hash(file) % FILE_LOCK_STRIPES]
+
+	def register(self, sock: Connection):
+		with self.registry_lock:
+			self.clients[sock] = ""
+		self.metrics.connection_opened()
+		self.schedule("idle", sock, self.idle_timeout)
 
-	def get_username_by_socket(self, sock: socket.socket):
+	def unregister(self, sock: Connection):
+		with self.registry_lock:
+			username = self.clients.pop(sock, None)
+			if username and self.users.get(username) is sock:
+				del self.users[username]
+		self.metrics.connection_closed(sock.bytes_received, sock.bytes_sent)
+		if username:
+			self.cleanup_disconnected_user(username)
+			self.release_user(username)
+
+	def is_authenticated(self, sock: Connection):
+		# conexiunile sunt înregistrate cu numele gol până la AUTH
+		return bool(self.clients.get(sock))
+
+	def get_username_by_socket(self, sock: Connection):
 		return self.clients.get(sock)
 
+	def get_socket_by_username(self, username: str):
+		return self.users.get(username)
+
 	def file_exists(self, file: str):
 		return file in self.files
 
@@ -36,34 +372,340 @@ class ServerState:
 	def can_delete_file(self, file: str):
 		return self.file_exists(file) and not self.is_file_locked(file)
 
-	def add_viewer(self, file: str, user: str):
-		self.files[file]["viewers"].add(user)
+	def add_viewer(self, file: str, user: str, version: str, window: tuple = None):
+		# cu window, viewer-ul primește la FILE_UPDATED doar intervalul respectiv
+		self.files[file]["viewers"][user] = version
+		with self.registry_lock:
+			self.viewing.setdefault(user, set()).add(file)
+		if window is not None:
+			self.windows[(file, user)] = window
+		else:
+			self.windows.pop((file, user), None)
 
 	def remove_viewer(self, file: str, user: str):
-		self.files[file]["viewers"].discard(user)
+		self.files[file]["viewers"].pop(user, None)
+		self.windows.pop((file, user), None)
+		with self.registry_lock:
+			files = self.viewing.get(user)
+			if files is not None:
+				files.discard(file)
+				if not files:
+					del self.viewing[user]
+
+	def file_path(self, file: str):
+		return os.path.join(SERVER_FILES_DIR, file)
+
+	def is_large_file(self, file: str):
+		return os.path.getsize(self.file_path(file)) > self.stream_threshold
+
+	def file_version(self, file: str):
+		# versiunea unui fișier mare, calculată citind fișierul în bucăți și reținută cât timp nu se schimbă pe disc
+		path = self.file_path(file)
+		stat = os.stat(path)
+		stamp = (stat.st_mtime_ns, stat.st_size)
+		version = self.cache.get_version(file, stamp)
+		if version is None:
+			with open(path, "rb") as f:
+				version = file_digest(f)
+			self.cache.put_version(file, stamp, version)
+		self.files[file]["version"] = version
+		return version
+
+	def listed_version(self, file: str):
+		# versiunea anunțată în AUTH și LIST, fără a citi fișierul: pentru unul nefolosit de la pornire este cea
+		# din snapshot, dacă fișierul nu s-a schimbat între timp pe disc
+		version = self.files[file]["version"]
+		if version is not None or not self.cache.has_version(file):
+			return version
+		try:
+			stat = os.stat(self.file_path(file))
+		except OSError:
+			return None
+		return self.cache.get_version(file, (stat.st_mtime_ns, stat.st_size))
+
+	def current_version(self, file: str):
+		if self.is_large_file(file):
+			return self.file_version(file)
+		stat = os.stat(self.file_path(file))
+		version = self.cache.get_version(file, (stat.st_mtime_ns, stat.st_size))
+		if version is None:
+			self.read_file(file)
+			version = self.files[file]["version"]
+		return version
+
+	def line_index(self, file: str):
+		# offset-urile liniilor, construite la prima cerere dintr-o singură parcurgere în bucăți și păstrate cât
+		# timp fișierul nu se schimbă pe disc; pentru un fișier mare, aceeași parcurgere îi calculează și versiunea
+		path = self.file_path(file)
+		stat = os.stat(path)
+		stamp = (stat.st_mtime_ns, stat.st_size)
+		index = self.cache.get_line_index(file, stamp)
+		if index is not None:
+			return index
+
+		offsets = array("Q", [0])
+		digest = hashlib.blake2b(digest_size=16)
+		position = 0
+		with open(path, "rb") as f:
+			while chunk := f.read(CHUNK_SIZE):
+				digest.update(chunk)
+				end = chunk.find(b"\n")
+				while end != -1:
+					offsets.append(position + end + 1)
+					end = chunk.find(b"\n", end + 1)
+				position += len(chunk)
+		if offsets[-1] != position:
+			offsets.append(position)
+		if position > self.stream_threshold:
+			self.cache.put_version(file, stamp, digest.hexdigest())
+		return self.cache.put_line_index(file, offsets, stamp)
+
+	def read_window(self, file: str, window: tuple):
+		# start și end ca la slice: negative de la sfârșitul fișierului, end None până la final. Intervalul este
+		# citit cu un singur seek și limitat la stream_threshold octeți; răspunsul conține intervalul efectiv, iar
+		# truncated arată că a fost scurtat. O primă linie mai lungă decât limita este trimisă doar parțial
+		kind, start, end = window
+		path = self.file_path(file)
+		truncated = False
+		if kind == "lines":
+			index = self.line_index(file)
+			start, end, _ = slice(start, end).indices(index.line_count())
+			end = max(start, end)
+			first, last = index.span(start, end)
+			if last - first > self.stream_threshold:
+				truncated = True
+				end = max(start, bisect_right(index.offsets, first + self.stream_threshold, start, end + 1) - 1)
+				last = index.offsets[end]
+				if end == start:
+					end = start + 1
+					last = first + self.stream_threshold
+			fields = {"lines": [start, end], "total_lines": index.line_count(), "size": index.offsets[-1]}
+		else:
+			size = os.path.getsize(path)
+			first, last, _ = slice(start, end).indices(size)
+			last = max(first, last)
+			if last - first > self.stream_threshold:
+				truncated = True
+				last = first + self.stream_threshold
+			fields = {"bytes": [first, last], "size": size}
+		fields["truncated"] = truncated
+
+		with open(path, "rb") as f:
+			f.seek(first)
+			data = f.read(last - first)
+		# un interval de octeți poate tăia un caracter la capete
+		content = data.decode("utf-8", errors="ignore")
+		if "\r" in content:
+			content = content.replace("\r\n", "\n").replace("\r", "\n")
+		fields["content"] = content
+		return fields
+
+	def requested_window(self, payload: dict):
+		# (tip, start, end) din payload-ul unui VIEW, None pentru fișierul întreg; ValueError dacă este invalid
+		for kind in WINDOW_KINDS:
+			value = payload.get(kind)
+			if value is None:
+				continue
+			if not isinstance(value, list) or len(value) != 2:
+				raise ValueError(kind)
+			for bound in value:
+				if bound is not None and (not isinstance(bound, int) or isinstance(bound, bool)):
+					raise ValueError(kind)
+			return (kind, value[0], value[1])
+		return None
+
+	def not_modified(self, response_type: str, file: str, known_version: str):
+		# răspuns fără conținut când clientul are deja versiunea curentă a fișierului
+		return self.make_response(response_type, 304, "Fișierul nu s-a modificat.", {"file": file, "version": known_version})
+
+	def open_stream(self, response_type: str, message: str, file: str):
+		version = self.file_version(file)
+		size = os.path.getsize(self.file_path(file))
+		response = self.make_response(response_type, 200, message, {"file": file, "version": version, "stream": size})
+		return OutgoingStream(response, self.file_path(file))
+
+	def is_valid_file_name(self, file):
+		# doar nume simple, în server_files; fișierele temporare ale scrierilor atomice nu pot fi adresate
+		return (
+			isinstance(file, str)
+			and file not in ("", ".", "..")
+			and not any(char in file for char in "/\\\0")
+			and not file.startswith(TEMP_PREFIX)
+		)
+
+	def start_upload(self, sock: Connection, message_json: dict):
+		# verifică cererea înainte de a deschide fișierul temporar și pune transferul în sock.upload; un transfer
+		# respins este citit până la capăt fără a fi scris, iar răspunsul de eroare este întors imediat
+		request_type = message_json.get("type")
+		payload = message_json["payload"]
+		file = payload.get("file")
+		if request_type not in ("ADD", "UPDATE"):
+			raise ValueError("Transferul în bucăți este permis doar pentru ADD și UPDATE.")
+
+		response = None
+		username = self.get_username_by_socket(sock)
+		if not username:
+			response = self.make_response(f"{request_type}_RESPONSE", 403, "Nu sunteți autentificat.")
+		elif not self.is_valid_file_name(file):
+			response = self.make_response(f"{request_type}_RESPONSE", 400, "Nume de fișier invalid.")
+		else:
+			with self.file_lock(file):
+				if request_type == "UPDATE" and not self.file_exists(file):
+					response = self.make_response("UPDATE_RESPONSE", 404, "Fișierul nu există.")
+				elif request_type == "UPDATE" and not self.is_file_locked_by_user(file, username):
+					response = self.make_response("UPDATE_RESPONSE", 403, "Nu aveți permisiunea de a modifica acest fișier.")
+				elif request_type == "ADD" and self.file_exists(file):
+					response = self.make_response("ADD_RESPONSE", 400, "Fișierul există deja. Redenumiți-l.")
+
+		sock.upload = IncomingStream(message_json, self.file_path(file) if response is None else None)
+		if response is not None and "id" in message_json:
+			response["id"] = message_json["id"]
+		return response
+
+	def completed_upload(self, sock: Connection, payload: dict):
+		# transferul terminat al acestei cereri; cererile obișnuite nu pot indica un transfer prin payload
+		upload = sock.upload
+		if upload is not None and upload.path is not None and upload.message["payload"] is payload and upload.is_complete():
+			return upload
+		return None
+
+	def read_file(self, file: str):
+		path = self.file_path(file)
+		stat = os.stat(path)
+		entry = self.cache.get(file, (stat.st_mtime_ns, stat.st_size))
+
+		if entry is None:
+			with open(path, "rb") as f:
+				data = f.read()
+			content = data.decode("utf-8")
+			if "\r" in content:
+				# aceleași sfârșituri de linie ca la citirea în mod text
+				content = content.replace("\r\n", "\n").replace("\r", "\n")
+				data = content.encode("utf-8")
+			entry = self.cache.put(file, content, data, content_hash(content), (stat.st_mtime_ns, stat.st_size))
+
+		self.files[file]["version"] = entry.version
+		return entry.content
+
+	def write_file(self, file: str, content: str):
+		path = self.file_path(file)
+		data = content.encode("utf-8")
+		self.store.write(path, data)
+		self.own_change()
 
-	def notify_all(self, data: dict, exclude_username: str = None):
-		for sock, user in self.clients.items():
+		stat = os.stat(path)
+		entry = self.cache.put(file, content, data, content_hash(content), (stat.st_mtime_ns, stat.st_size))
+		return entry.version
+
+	def own_change(self):
+		# modificările făcute de server în server_files nu trebuie redescoperite de watcher
+		if self.watcher is not None:
+			self.watcher.own_change()
+
+	def notify_all(self, data: dict, exclude_username: str = None, publish: bool = True):
+		# mesajul este serializat o singură dată pentru fiecare codec și aceiași octeți sunt puși în coada destinatarilor;
+		# cu publish, este trimis și celorlalți workeri prin coordonator
+		if publish and self.coordinator is not None:
+			self.coordinator.publish(data, None, exclude_username)
+		messages = {}
+		key = self.broadcast_key(data)
+		with self.registry_lock:
+			recipients = list(self.clients.items())
+		sent = 0
+		for sock, user in recipients:
 			if user != exclude_username:
-				self.send(sock, data)
+				sock.send(self.serialize_for(sock, data, messages), key)
+				sent += 1
+		self.metrics.record_broadcast(sent)
 
-	def notify_viewers(self, file: str, data: dict):
+	def notify_viewers(self, file: str, data: dict, delta: dict = None, publish: bool = True):
+		# viewer-ii aflați la versiunea de bază primesc doar patch-ul, ceilalți conținutul complet
+		if publish and self.coordinator is not None:
+			self.coordinator.publish(data, delta)
 		viewers = self.files[file]["viewers"]
-		for sock, user in self.clients.items():
-			if user in viewers:
-				self.send(sock, data)
+		version = data["payload"].get("version")
+		base = delta["payload"]["base"] if delta else None
+		key = self.broadcast_key(data)
+		full_messages = {}
+		delta_messages = {}
+		window_messages = {}  # interval -> (FILE_UPDATED cu intervalul, serializările lui)
+		sent = 0
+		for user, known_version in list(viewers.items()):
+			sock = self.get_socket_by_username(user)
+			if sock is None:
+				continue
+			sent += 1
+
+			window = self.windows.get((file, user))
+			if window is not None:
+				# viewer-ii aceluiași interval (de exemplu sfârșitul unui jurnal) împart citirea și serializarea
+				if window not in window_messages:
+					payload = {"file": file, "user": data["payload"].get("user"), "version": version, **self.read_window(file, window)}
+					window_messages[window] = ({"type": "FILE_UPDATED", "status": 200, "message": data.get("message"), "payload": payload}, {})
+				message, messages = window_messages[window]
+				delivered = sock.send(self.serialize_for(sock, message, messages), key)
+				viewers[user] = version if delivered else None
+				continue
 
-	def send(self, sock: socket.socket, data: dict):
-		message = self.serialize(data)
-		sock.sendall(message.encode())
+			# peste o coadă aglomerată sau când un mesaj mai vechi încă așteaptă se trimite conținutul complet,
+			# care îl poate înlocui; un patch ar presupune că viewer-ul a primit deja versiunea de bază
+			if delta is not None and known_version == base and not sock.is_congested() and not sock.is_pending(key):
+				delivered = sock.send(self.serialize_for(sock, delta, delta_messages), key)
+			elif "stream" in data["payload"]:
+				delivered = sock.send(OutgoingStream(data, self.file_path(file)), key)
+			else:
+				delivered = sock.send(self.serialize_for(sock, data, full_messages), key)
+			viewers[user] = version if delivered else None
+		self.metrics.record_broadcast(sent)
 
-	def serialize(self, data: dict):
-		return json.dumps(data)
+	def send(self, sock: Connection, data: dict, key: tuple = None):
+		if isinstance(data, OutgoingStream):
+			return sock.send(data, key)
+		return sock.send(self.serialize(data, sock.compression, sock.encoding), key)
+
+	def serialize_for(self, sock: Connection, data: dict, messages: dict):
+		message = messages.get((sock.compression, sock.encoding))
+		if message is None:
+			message = messages[(sock.compression, sock.encoding)] = self.serialize(data, sock.compression, sock.encoding)
+		return message
+
+	def broadcast_key(self, data: dict):
+		file = data["payload"].get("file")
+		match data["type"]:
+			case "FILE_LOCKED" | "FILE_RELEASED":
+				return ("lock", file)
+			case "FILE_ADDED" | "FILE_DELETED":
+				return ("file", file)
+			case _:
+				return (data["type"], file)
+
+	def serialize(self, data: dict, compression: str = None, encoding: str = "json"):
+		payload = data.get("payload") or {}
+		compressed_content = None
+		if compression and isinstance(payload.get("content"), str):
+			compressed_content = self.cache.compressed(payload.get("file"), payload["content"], compression)
+		return encode_message(data, compression, compressed_content, encoding=encoding)
 
 	def make_response(self, response_type: str, status: int, message: str, payload: dict = None):
 		return {"type": response_type, "status": status, "message": message, "payload": payload or {}}
 
-	def handle_request(self, sock: socket.socket, message_json: dict):
+	def handle_request(self, sock: Connection, message_json: dict):
+		# id-ul opțional al cererii este copiat în răspuns, ca mai multe cereri să poată fi în zbor simultan
+		start = time.perf_counter()
+		response = self.route(sock, message_json)
+		status = response.get("status", 0) if isinstance(response, dict) else 200
+		request_type = message_json.get("type")
+		if request_type not in REQUEST_TYPES:
+			request_type = UNKNOWN_REQUEST
+		self.metrics.record_request(request_type, time.perf_counter() - start, status)
+		if "id" in message_json:
+			if isinstance(response, OutgoingStream):
+				response.message["id"] = message_json["id"]
+			elif response is not None:
+				response["id"] = message_json["id"]
+		return response
+
+	def route(self, sock: Connection, message_json: dict):
 		request_type = message_json["type"]
 		payload = message_json.get("payload", {})
 
@@ -85,174 +727,501 @@ class ServerState:
 				return self.handle_add(sock, payload)
 			case "DELETE":
 				return self.handle_delete(sock, payload)
+			case "LIST":
+				return self.handle_list(sock, payload)
+			case "BATCH":
+				return self.handle_batch(sock, payload, message_json.get("id"))
+			case "HISTORY":
+				return self.handle_history(sock, payload)
+			case "STATS":
+				return self.make_response("STATS_RESPONSE", 200, "Statistici server.", self.stats())
+			case "HEARTBEAT":
+				# activitatea conexiunii a fost deja înregistrată la primire; răspunsul confirmă termenele
+				return self.make_response(
+					"HEARTBEAT_RESPONSE", 200, "Conexiune activă.", {"lock_timeout": self.lock_timeout, "idle_timeout": self.idle_timeout}
+				)
 			case _:
 				return self.make_response("ERROR", 400, "Comandă necunoscută.")
 
-	def handle_auth(self, sock: socket.socket, payload: dict):
+	def handle_auth(self, sock: Connection, payload: dict):
 		username = payload.get("username")
 		if not username:
 			return self.make_response("AUTH_RESPONSE", 400, "Lipsește numele de utilizator.")
 
-		if username in self.clients.values():
+		# răspunsul coordonatorului poate întârzia până la REQUEST_TIMEOUT: este așteptat fără registry_lock
+		if not self.claim_user(username):
 			return self.make_response("AUTH_RESPONSE", 400, "Utilizator deja conectat.")
 
-		self.clients[sock] = username
+		with self.registry_lock:
+			if username in self.users:
+				self.release_user(username)
+				return self.make_response("AUTH_RESPONSE", 400, "Utilizator deja conectat.")
+
+			previous = self.clients.get(sock)
+			if previous:
+				self.users.pop(previous, None)
+				self.release_user(previous)
+			self.clients[sock] = username
+			self.users[username] = sock
+			file_count = len(self.files)
+			for file, (user, _) in list(self.restored_locks.items()):
+				if user == username:
+					del self.restored_locks[file]
+					self.held_locks.setdefault(username, set()).add(file)
+					self.schedule("lease", sock, self.lock_timeout)
+			# cu "list": false lista este cerută ulterior, pe pagini, prin LIST
+			if payload.get("list", True):
+				files = {f: {"locked_by": info["locked_by"], "version": self.listed_version(f)} for f, info in self.files.items()}
+
+		sock.compression = negotiate_compression(payload.get("compression"))
+		sock.encoding = negotiate_encoding(payload.get("encoding"))
+
+		response = {
+			"username": username,
+			"file_count": file_count,
+			"compression": sock.compression,
+			"encoding": sock.encoding,
+			"heartbeat": self.heartbeat_interval(),
+		}
+		if payload.get("list", True):
+			response["files"] = files
+		return self.make_response("AUTH_RESPONSE", 200, "Autentificare reușită.", response)
+
+	def handle_list(self, sock: Connection, payload: dict):
+		# paginare după cursor (ultimul nume întors) în indexul sortat, cu filtrare după prefix și/sau glob
+		cursor = payload.get("cursor")
+		prefix = payload.get("prefix") or ""
+		pattern = payload.get("glob")
+		limit = payload.get("limit", LIST_PAGE_SIZE)
+
+		if (
+			not isinstance(prefix, str)
+			or not isinstance(cursor, (str, type(None)))
+			or not isinstance(pattern, (str, type(None)))
+			or not isinstance(limit, int)
+			or not 0 < limit <= LIST_MAX_PAGE_SIZE
+		):
+			return self.make_response("LIST_RESPONSE", 400, "Parametri de listare invalizi.")
+
+		if pattern and not prefix:
+			# partea fixă de la începutul tiparului restrânge căutarea în index
+			literal = len(pattern)
+			for char in GLOB_CHARS:
+				position = pattern.find(char)
+				if position != -1:
+					literal = min(literal, position)
+			prefix = pattern[:literal]
+
+		files = {}
+		next_cursor = None
+		with self.registry_lock:
+			if cursor is not None and cursor >= prefix:
+				start = bisect_right(self.index, cursor)
+			else:
+				start = bisect_left(self.index, prefix)
+			end = min(len(self.index), start + limit * LIST_SCAN_FACTOR)
+
+			for i in range(start, end):
+				file = self.index[i]
+				if not file.startswith(prefix):
+					break
+				if pattern is None or fnmatchcase(file, pattern):
+					info = self.files[file]
+					files[file] = {"locked_by": info["locked_by"], "version": self.listed_version(file)}
+				if len(files) >= limit or i == end - 1:
+					if i + 1 < len(self.index) and self.index[i + 1].startswith(prefix):
+						next_cursor = file
+					break
+			total = len(self.files)
 
 		return self.make_response(
-			"AUTH_RESPONSE",
-			200,
-			"Autentificare reușită.",
-			{"username": username, "files": {f: {"locked_by": info["locked_by"]} for f, info in self.files.items()}},
+			"LIST_RESPONSE", 200, f"{len(files)} fișiere.", {"files": files, "next_cursor": next_cursor, "total": total}
 		)
 
-	def handle_view(self, sock: socket.socket, payload: dict):
+	def stats(self):
+		stats = self.metrics.snapshot()
+		with self.registry_lock:
+			connections = list(self.clients.items())
+			stats["files"] = len(self.files)
+
+		queued = [sock.queued_bytes for sock, _ in connections]
+		stats["bytes_in"] += sum(sock.bytes_received for sock, _ in connections)
+		stats["bytes_out"] += sum(sock.bytes_sent for sock, _ in connections)
+		stats["connections"] = {
+			"active": len(connections),
+			"authenticated": sum(1 for _, user in connections if user),
+		}
+		stats["queues"] = {
+			"queued_bytes": sum(queued),
+			"max_queued_bytes": max(queued, default=0),
+			"max_queued_messages": max((len(sock.queue) for sock, _ in connections), default=0),
+			"dropped": sum(sock.dropped for sock, _ in connections),
+			"coalesced": sum(sock.coalesced for sock, _ in connections),
+			"held": sum(len(sock.held) for sock, _ in connections),
+		}
+		stats["cache"] = self.cache.stats()
+		stats["store"] = self.store.stats()
+		if self.history is not None:
+			stats["history"] = self.history.stats()
+		if self.timers is not None:
+			stats["timers"] = self.timers.stats()
+		if self.coordinator is not None:
+			stats["coordinator"] = {"worker": os.getpid(), **self.coordinator.stats()}
+		return stats
+
+	def handle_batch(self, sock: Connection, payload: dict, request_id=None):
+		# rulează o listă de VIEW/LOCK/RELEASE și întoarce rezultatele într-un singur răspuns; fișierele mari
+		# nu încap în el și urmează ca răspunsuri separate, transmise în bucăți
+		requests = payload.get("requests")
+		streams = []
+		if not isinstance(requests, list) or not 0 < len(requests) <= BATCH_MAX_REQUESTS:
+			response = self.make_response("BATCH_RESPONSE", 400, f"BATCH acceptă între 1 și {BATCH_MAX_REQUESTS} cereri.")
+		else:
+			results = []
+			for item in requests:
+				if not isinstance(item, dict) or item.get("type") not in BATCH_TYPES or not isinstance(item.get("payload", {}), dict):
+					result = self.make_response("ERROR", 400, "Cerere nepermisă în BATCH.")
+					if isinstance(item, dict) and "id" in item:
+						result["id"] = item["id"]
+				else:
+					result = self.handle_request(sock, item)
+				if isinstance(result, OutgoingStream):
+					streams.append(result)
+					result = dict(result.message, status=202, message="Fișierul urmează separat, în bucăți.")
+					result["payload"] = {"file": result["payload"]["file"]}
+				results.append(result)
+			response = self.make_response("BATCH_RESPONSE", 200, f"{len(results)} cereri executate.", {"results": results})
+
+		if request_id is not None:
+			response["id"] = request_id
+		self.send(sock, response)
+		for stream in streams:
+			self.send(sock, stream)
+		return None
+
+	def handle_view(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
+		if payload.get("at") is not None:
+			return self.view_version(file, payload["at"])
+		try:
+			window = self.requested_window(payload)
+		except ValueError:
+			return self.make_response("VIEW_RESPONSE", 400, "Interval invalid: [start, end], cu numere întregi sau null.", {"file": file})
 
-		if not self.file_exists(file):
-			return self.make_response("VIEW_RESPONSE", 404, "Fișierul nu există.")
+		with self.file_lock(file):
+			if not self.file_exists(file):
+				return self.make_response("VIEW_RESPONSE", 404, "Fișierul nu există.")
+
+			if window is not None:
+				# un interval nou îl înlocuiește pe cel anterior, fără eroarea de vizualizare dublă
+				fields = self.read_window(file, window)
+				version = self.current_version(file)
+				self.add_viewer(file, username, version, window)
+				message = "Interval trunchiat la limita de transfer." if fields["truncated"] else "Interval descărcat cu succes."
+				return self.make_response("VIEW_RESPONSE", 200, message, {"file": file, "version": version, **fields})
 
-		if username in self.files[file]["viewers"]:
-			return self.make_response("VIEW_RESPONSE", 400, "Fișierul este deja în vizualizare.")
+			if username in self.files[file]["viewers"] and (file, username) not in self.windows:
+				return self.make_response("VIEW_RESPONSE", 400, "Fișierul este deja în vizualizare.")
 
-		self.add_viewer(file, username)
+			known_version = payload.get("version")
+			if known_version and known_version == self.current_version(file):
+				self.add_viewer(file, username, known_version)
+				return self.not_modified("VIEW_RESPONSE", file, known_version)
 
-		with open(os.path.join("server_files", file), "r", encoding="utf-8") as f:
-			content = f.read()
+			if self.is_large_file(file):
+				response = self.open_stream("VIEW_RESPONSE", "Fișier descărcat cu succes.", file)
+				self.add_viewer(file, username, response.message["payload"]["version"])
+				return response
 
+			content = self.read_file(file)
+			version = self.files[file]["version"]
+			self.add_viewer(file, username, version)
+
+			return self.make_response(
+				"VIEW_RESPONSE", 200, "Fișier descărcat cu succes.", {"file": file, "content": content, "version": version}
+			)
+
+	def view_version(self, file: str, at: str):
+		# o versiune anterioară, din istoric: doar o copie, fără abonare la modificări
+		if self.history is None:
+			return self.make_response("VIEW_RESPONSE", 400, "Istoricul versiunilor nu este activat.")
+		if not self.is_valid_file_name(file):
+			return self.make_response("VIEW_RESPONSE", 400, "Nume de fișier invalid.")
+
+		versions = self.history.resolve(file, at)
+		if not versions:
+			return self.make_response("VIEW_RESPONSE", 404, "Versiunea nu există în istoricul fișierului.", {"file": file})
+		if len(versions) > 1:
+			return self.make_response("VIEW_RESPONSE", 400, "Prefixul indică mai multe versiuni.", {"file": file, "versions": sorted(versions)})
+
+		(version, size), = versions.items()
+		try:
+			if size > self.stream_threshold:
+				return self.open_version_stream(file, version)
+			content = self.history.read(version)
+		except OSError:
+			return self.make_response("VIEW_RESPONSE", 404, "Versiunea lipsește din istoric.", {"file": file})
 		return self.make_response(
-			"VIEW_RESPONSE", 200, "Fișier descărcat cu succes.", {"file": file, "content": content}
+			"VIEW_RESPONSE", 200, "Versiune descărcată cu succes.", {"file": file, "content": content, "version": version, "at": version}
 		)
 
-	def handle_lock(self, sock: socket.socket, payload: dict):
+	def open_version_stream(self, file: str, version: str):
+		# o versiune mare este scrisă într-un fișier temporar și trimisă în bucăți, ca fișierele curente; fișierul
+		# este șters imediat, descriptorul deschis de OutgoingStream rămâne valid până la final
+		fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=self.history.directory)
+		os.close(fd)
+		try:
+			self.history.export(version, path)
+			payload = {"file": file, "version": version, "at": version, "stream": os.path.getsize(path)}
+			return OutgoingStream(self.make_response("VIEW_RESPONSE", 200, "Versiune descărcată cu succes.", payload), path)
+		finally:
+			os.remove(path)
+
+	def handle_lock(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
 
 		if not self.file_exists(file):
 			return self.make_response("LOCK_RESPONSE", 404, "Fișierul nu există.")
-
-		if self.is_file_locked(file):
+		# rezervarea la coordonator este așteptată înaintea lock-ului local și anulată la un conflict local
+		if not self.claim(file, username):
 			return self.make_response("LOCK_RESPONSE", 403, "Fișierul este deja blocat.")
 
-		self.files[file]["locked_by"] = username
+		with self.file_lock(file):
+			if not self.file_exists(file):
+				self.unclaim(file, username)
+				return self.make_response("LOCK_RESPONSE", 404, "Fișierul nu există.")
 
-		with open(os.path.join("server_files", file), "r", encoding="utf-8") as f:
-			content = f.read()
+			if not self.acquire_lock(file, username):
+				self.unclaim(file, username)
+				return self.make_response("LOCK_RESPONSE", 403, "Fișierul este deja blocat.")
+			self.schedule("lease", sock, self.lock_timeout)
 
-		broadcast = {
-			"type": "FILE_LOCKED",
-			"status": 200,
-			"message": f"{username} a blocat {file}.",
-			"payload": {"file": file, "user": username},
-		}
-		self.notify_all(broadcast, exclude_username=username)
+			broadcast = {
+				"type": "FILE_LOCKED",
+				"status": 200,
+				"message": f"{username} a blocat {file}.",
+				"payload": {"file": file, "user": username},
+			}
+			self.notify_all(broadcast, exclude_username=username)
+
+			known_version = payload.get("version")
+			if known_version and known_version == self.current_version(file):
+				return self.not_modified("LOCK_RESPONSE", file, known_version)
 
-		return self.make_response("LOCK_RESPONSE", 200, "Fișier blocat cu succes.", {"file": file, "content": content})
+			if self.is_large_file(file):
+				return self.open_stream("LOCK_RESPONSE", "Fișier blocat cu succes.", file)
 
-	def handle_release(self, sock: socket.socket, payload: dict):
+			content = self.read_file(file)
+			version = self.files[file]["version"]
+			return self.make_response(
+				"LOCK_RESPONSE", 200, "Fișier blocat cu succes.", {"file": file, "content": content, "version": version}
+			)
+
+	def handle_release(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
 
-		if not self.file_exists(file):
-			return self.make_response("RELEASE_RESPONSE", 404, "Fișierul nu există.")
+		with self.file_lock(file):
+			if not self.file_exists(file):
+				return self.make_response("RELEASE_RESPONSE", 404, "Fișierul nu există.")
 
-		if not self.is_file_locked_by_user(file, username):
-			return self.make_response("RELEASE_RESPONSE", 403, "Nu aveți lock pe fișier.")
+			if not self.is_file_locked_by_user(file, username):
+				return self.make_response("RELEASE_RESPONSE", 403, "Nu aveți lock pe fișier.")
 
-		self.files[file]["locked_by"] = None
+			self.release_lock(file, username)
 
-		broadcast = {
-			"type": "FILE_RELEASED",
-			"status": 200,
-			"message": f"{username} a eliberat {file}.",
-			"payload": {"file": file, "user": username},
-		}
-		self.notify_all(broadcast, exclude_username=username)
+			broadcast = {
+				"type": "FILE_RELEASED",
+				"status": 200,
+				"message": f"{username} a eliberat {file}.",
+				"payload": {"file": file, "user": username},
+			}
+			self.notify_all(broadcast, exclude_username=username)
 
-		return self.make_response("RELEASE_RESPONSE", 200, "Fișier deblocat.", {"file": file})
+			return self.make_response("RELEASE_RESPONSE", 200, "Fișier deblocat.", {"file": file})
 
-	def handle_update(self, sock: socket.socket, payload: dict):
+	def handle_update(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
 		content = payload.get("content")
+		patch = payload.get("patch")
+		base = payload.get("base")
+		upload = self.completed_upload(sock, payload)
 
-		if not self.file_exists(file):
-			return self.make_response("UPDATE_RESPONSE", 404, "Fișierul nu există.")
+		with self.file_lock(file):
+			if not self.file_exists(file):
+				return self.make_response("UPDATE_RESPONSE", 404, "Fișierul nu există.")
 
-		if not self.is_file_locked_by_user(file, username):
-			return self.make_response("UPDATE_RESPONSE", 403, "Nu aveți permisiunea de a modifica acest fișier.")
+			if not self.is_file_locked_by_user(file, username):
+				return self.make_response("UPDATE_RESPONSE", 403, "Nu aveți permisiunea de a modifica acest fișier.")
 
-		with open(os.path.join("server_files", file), "w", encoding="utf-8") as f:
-			f.write(content)
+			if patch is not None:
+				current = self.read_file(file)
+				if self.files[file]["version"] != base:
+					return self.make_response("UPDATE_RESPONSE", 409, "Versiunea de bază nu corespunde.", {"file": file})
+				try:
+					content = apply_patch(current, patch)
+				except (ValueError, TypeError):
+					return self.make_response("UPDATE_RESPONSE", 400, "Patch invalid.", {"file": file})
+			elif content is None and upload is None:
+				return self.make_response("UPDATE_RESPONSE", 400, "Lipsește conținutul fișierului.", {"file": file})
 
-		self.notify_viewers(
-			file,
-			{
-				"type": "FILE_UPDATED",
-				"status": 200,
-				"message": f"{username} a actualizat fișierul {file}.",
-				"payload": {"file": file, "user": username, "content": content},
-			},
-		)
+			# conținutul înlocuit, ca noua versiune să fie păstrată în istoric ca patch față de el
+			previous = None
+			if self.history is not None and upload is None and not self.is_large_file(file):
+				previous = current if patch is not None else self.read_file(file)
+			previous_version = self.files[file]["version"]
+
+			if upload is not None:
+				upload.commit(store=self.store)
+				self.own_change()
+				self.cache.invalidate(file)
+				version = upload.version()
+			else:
+				version = self.write_file(file, content)
+			self.files[file]["version"] = version
+			# patch-ul clientului pornește de la base, adică exact de la versiunea înlocuită: nu mai este recalculat
+			self.record_version(file, version, username, content, previous, previous_version, patch)
+
+			message = f"{username} a actualizat fișierul {file}."
+			delta = None
+			if patch is not None:
+				delta = {
+					"type": "FILE_UPDATED",
+					"status": 200,
+					"message": message,
+					"payload": {"file": file, "user": username, "version": version, "base": base, "patch": patch},
+				}
+			updated = {"file": file, "user": username, "version": version}
+			if self.is_large_file(file):
+				updated["stream"] = os.path.getsize(self.file_path(file))
+			else:
+				updated["content"] = content if content is not None else self.read_file(file)
+			self.notify_viewers(file, {"type": "FILE_UPDATED", "status": 200, "message": message, "payload": updated}, delta)
 
-		return self.make_response("UPDATE_RESPONSE", 200, "Fișier actualizat.", {"file": file})
+			return self.make_response("UPDATE_RESPONSE", 200, "Fișier actualizat.", {"file": file, "version": version})
 
-	def handle_add(self, sock: socket.socket, payload: dict):
+	def handle_add(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
 		content = payload.get("content")
+		upload = self.completed_upload(sock, payload)
+
+		if not self.is_valid_file_name(file) or (not isinstance(content, str) and upload is None):
+			return self.make_response("ADD_RESPONSE", 400, "Nume de fișier sau conținut invalid.")
 
-		if self.file_exists(file):
+		# alt worker poate adăuga același nume în același timp: numele rămâne rezervat la coordonator până după
+		# scriere; rezervarea este așteptată înaintea lock-ului local
+		if self.file_exists(file) or not self.claim(file, username):
 			return self.make_response("ADD_RESPONSE", 400, "Fișierul există deja. Redenumiți-l.")
 
-		with open(os.path.join("server_files", file), "w", encoding="utf-8") as f:
-			f.write(content)
+		try:
+			with self.file_lock(file):
+				if self.file_exists(file) or self.coordinator is not None and os.path.exists(self.file_path(file)):
+					return self.make_response("ADD_RESPONSE", 400, "Fișierul există deja. Redenumiți-l.")
+				if upload is not None:
+					upload.commit(store=self.store)
+					self.own_change()
+					self.cache.invalidate(file)
+					version = upload.version()
+				else:
+					version = self.write_file(file, content)
+				self.record_version(file, version, username, content)
 
-		self.files[file] = {"locked_by": None, "viewers": set()}
+				with self.registry_lock:
+					self.files[file] = {"locked_by": None, "viewers": {}, "version": version}
+					insort(self.index, file)
 
-		broadcast = {
-			"type": "FILE_ADDED",
-			"status": 200,
-			"message": f"{username} a adăugat {file}.",
-			"payload": {"file": file, "user": username},
-		}
-		self.notify_all(broadcast, exclude_username=username)
+				broadcast = {
+					"type": "FILE_ADDED",
+					"status": 200,
+					"message": f"{username} a adăugat {file}.",
+					"payload": {"file": file, "user": username},
+				}
+				self.notify_all(broadcast, exclude_username=username)
 
-		return self.make_response("ADD_RESPONSE", 200, "Fișier adăugat.", {"file": file})
+				return self.make_response("ADD_RESPONSE", 200, "Fișier adăugat.", {"file": file})
+		finally:
+			self.unclaim(file, username)
 
-	def handle_delete(self, sock: socket.socket, payload: dict):
+	def record_version(
+		self, file: str, version: str, username: str, content: str = None, previous: str = None, previous_version: str = None, patch: list = None
+	):
+		if self.history is None:
+			return
+		if content is None or self.is_large_file(file):
+			self.history.record_file(file, self.file_path(file), version, username)
+		else:
+			self.history.record(file, content, version, username, previous, previous_version, patch)
+
+	def handle_history(self, sock: Connection, payload: dict):
+		# versiunile fișierului, de la cea mai nouă; fișierele șterse își păstrează istoricul
+		file = payload.get("file")
+		limit = payload.get("limit", HISTORY_PAGE_SIZE)
+		if self.history is None:
+			return self.make_response("HISTORY_RESPONSE", 400, "Istoricul versiunilor nu este activat.")
+		if not self.is_valid_file_name(file) or not isinstance(limit, int) or not 0 < limit <= LIST_MAX_PAGE_SIZE:
+			return self.make_response("HISTORY_RESPONSE", 400, "Parametri de istoric invalizi.")
+
+		entries = self.history.log(file)
+		if not entries and not self.file_exists(file):
+			return self.make_response("HISTORY_RESPONSE", 404, "Fișierul nu există.")
+		return self.make_response(
+			"HISTORY_RESPONSE", 200, f"{len(entries)} versiuni în istoric.", {"file": file, "versions": entries[::-1][:limit], "total": len(entries)}
+		)
+
+	def handle_delete(self, sock: Connection, payload: dict):
 		username = self.get_username_by_socket(sock)
 		file = payload.get("file")
 
 		if not self.file_exists(file):
 			return self.make_response("DELETE_RESPONSE", 404, "Fișierul nu există.")
-
-		if self.is_file_locked(file):
+		# rezervarea la coordonator este așteptată înaintea lock-ului local
+		if self.is_file_locked(file) or not self.claim(file, username):
 			return self.make_response("DELETE_RESPONSE", 403, "Fișierul este blocat și nu poate fi șters.")
 
-		os.remove(os.path.join("server_files", file))
-		if file in self.files:
-			del self.files[file]
+		try:
+			with self.file_lock(file):
+				if not self.file_exists(file):
+					return self.make_response("DELETE_RESPONSE", 404, "Fișierul nu există.")
+				if self.is_file_locked(file):
+					return self.make_response("DELETE_RESPONSE", 403, "Fișierul este blocat și nu poate fi șters.")
 
-		broadcast = {
-			"type": "FILE_DELETED",
-			"status": 200,
-			"message": f"{username} a șters fișierul {file}.",
-			"payload": {"file": file, "user": username},
-		}
-		self.notify_all(broadcast, exclude_username=username)
+				os.remove(self.file_path(file))
+				self.own_change()
+				self.remove_file(file)
 
-		return self.make_response("DELETE_RESPONSE", 200, "Fișier șters.", {"file": file})
+				broadcast = {
+					"type": "FILE_DELETED",
+					"status": 200,
+					"message": f"{username} a șters fișierul {file}.",
+					"payload": {"file": file, "user": username},
+				}
+				self.notify_all(broadcast, exclude_username=username)
+
+				return self.make_response("DELETE_RESPONSE", 200, "Fișier șters.", {"file": file})
+		finally:
+			self.unclaim(file, username)
 	
 	def cleanup_disconnected_user(self, username: str):
-		for file, info in self.files.items():
-			if info["locked_by"] == username:
-				info["locked_by"] = None
-				self.notify_all({
-					"type": "FILE_RELEASED",
-					"status": 200,
-					"message": f"{username} s-a deconectat și a eliberat lock-ul pe {file}.",
-					"payload": {"file": file, "user": username}
-				})
-			if username in info["viewers"]:
-				info["viewers"].discard(username)
+		# doar fișierele blocate sau urmărite de utilizator, nu tot indexul
+		with self.registry_lock:
+			files = sorted(self.held_locks.get(username, set()) | self.viewing.pop(username, set()))
+
+		for file in files:
+			with self.file_lock(file):
+				info = self.files.get(file)
+				if info is None:
+					continue
+				if info["locked_by"] == username:
+					self.release_lock(file, username)
+					self.notify_all({
+						"type": "FILE_RELEASED",
+						"status": 200,
+						"message": f"{username} s-a deconectat și a eliberat lock-ul pe {file}.",
+						"payload": {"file": file, "user": username}
+					})
+				info["viewers"].pop(username, None)
+				self.windows.pop((file, username), None)
@@ -0,0 +1,273 @@
+import os
+import shutil
+import threading
+import time
+
+from streaming import TEMP_PREFIX
+
+
+DURABILITY_MODES = ("none", "fsync", "group")
+DURABILITY = "none"
+GROUP_COMMIT_WINDOW = 0.005  # secunde în care se adună scrierile unui lot de fsync
+
+
+def temp_path_for(path: str):
+	directory, name = os.path.split(path)
+	return os.path.join(directory, f"{TEMP_PREFIX}{name}.{os.getpid()}.{threading.get_ident()}")
+
+
+def fsync_path(path: str):
+	fd = os.open(path, os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+class PendingCommit:
+	def __init__(self, temp_path: str, path: str):
+		self.temp_path: str = temp_path
+		self.path: str = path
+		self.done = threading.Event()
+		self.error: OSError | None = None
+
+
+class FileStore:
+	# scrie fișierele într-un fișier temporar și le mută la destinație cu os.replace, astfel încât
+	# cititorii văd fie versiunea veche, fie pe cea nouă, niciodată un fișier scris pe jumătate.
+	# none: fără fsync; fsync: fiecare scriere este sincronizată pe disc înainte de confirmare;
+	# group: scrierile concurente sunt adunate în loturi și sincronizate împreună
+	def __init__(self, durability: str = DURABILITY, window: float = GROUP_COMMIT_WINDOW):
+		self.durability: str = durability
+		self.window: float = window
+		self.pending: list[PendingCommit] = []
+		self.condition = threading.Condition()
+		self.committer: threading.Thread | None = None
+		self.commits: int = 0
+		self.batches: int = 0  # operații de sincronizare pe disc (un lot în modul group)
+
+	def write(self, path: str, data: bytes):
+		temp_path = temp_path_for(path)
+		try:
+			with open(temp_path, "wb") as f:
+				f.write(data)
+		except OSError:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+		self.commit(temp_path, path)
+
+	def commit(self, temp_path: str, path: str):
+		# se întoarce abia după ce fișierul este la destinație și, după caz, pe disc
+		if self.durability == "group":
+			self.commit_grouped(temp_path, path)
+			return
+
+		try:
+			if self.durability == "fsync":
+				fsync_path(temp_path)
+			os.replace(temp_path, path)
+			if self.durability == "fsync":
+				fsync_path(os.path.dirname(path) or ".")
+		except OSError:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+		with self.condition:
+			self.commits += 1
+			if self.durability == "fsync":
+				self.batches += 1
+
+	def commit_grouped(self, temp_path: str, path: str):
+		item = PendingCommit(temp_path, path)
+		with self.condition:
+			if self.committer is None:
+				self.committer = threading.Thread(target=self.run, daemon=True)
+				self.committer.start()
+			self.pending.append(item)
+			self.condition.notify()
+		item.done.wait()
+		if item.error is not None:
+			raise item.error
+
+	def run(self):
+		while True:
+			with self.condition:
+				while not self.pending:
+					self.condition.wait()
+			# lasă fereastra să se umple cu scrierile altor cereri
+			time.sleep(self.window)
+			with self.condition:
+				batch = self.pending
+				self.pending = []
+			self.flush(batch)
+
+	def flush(self, batch: list[PendingCommit]):
+		directories = set()
+		for item in batch:
+			try:
+				fsync_path(item.temp_path)
+				os.replace(item.temp_path, item.path)
+				directories.add(os.path.dirname(item.path) or ".")
+			except OSError as e:
+				item.error = e
+				if os.path.exists(item.temp_path):
+					os.remove(item.temp_path)
+
+		for directory in directories:
+			try:
+				fsync_path(directory)
+			except OSError as e:
+				for item in batch:
+					if item.error is None and (os.path.dirname(item.path) or ".") == directory:
+						item.error = e
+
+		with self.condition:
+			self.commits += len(batch)
+			self.batches += 1
+		for item in batch:
+			item.done.set()
+
+	def stats(self):
+		return {"durability": self.durability, "commits": self.commits, "batches": self.batches}
+
+
+class CopyFrom:
+	# operație de DiskWriter: destinația primește fișierul source, copiat sau mutat (source este atunci un
+	# fișier temporar, de exemplu un transfer în bucăți terminat)
+	def __init__(self, source: str, move: bool = False):
+		self.source: str = source
+		self.move: bool = move
+
+
+class DiskWriter:
+	# scrie fișierele pe un fir separat, ca firul care le cere (de exemplu cel care citește socketul) să nu
+	# aștepte discul. Pentru fiecare cale se păstrează doar ultima operație cerută: conținut nou (str),
+	# None pentru ștergere sau CopyFrom; scrierile trec prin FileStore, deci sunt atomice. Până ajung pe
+	# disc, read() întoarce deja conținutul cel mai nou
+	def __init__(self, store: FileStore = None):
+		self.store: FileStore = store or FileStore()
+		self.pending: dict[str, tuple[str | CopyFrom | None, object]] = {}  # cale -> (operație, apel după scriere)
+		self.current: tuple[str, str | CopyFrom | None] | None = None  # operația în curs pe disc
+		self.condition = threading.Condition()
+		self.thread: threading.Thread | None = None
+		self.written: int = 0
+		self.removed: int = 0
+		self.coalesced: int = 0  # operații înlocuite de una mai nouă pe aceeași cale înainte de a ajunge pe disc
+		self.errors: int = 0
+
+	def write(self, path: str, content: str, on_written=None):
+		# on_written(path) este apelat pe firul de scriere, după ce fișierul este la destinație
+		self.submit(path, content, on_written)
+
+	def remove(self, path: str):
+		self.submit(path, None, None)
+
+	def move(self, source: str, path: str, on_written=None):
+		# source ajunge la path prin redenumire, după operațiile mai vechi pe path, fără a le aștepta
+		self.submit(path, CopyFrom(source, move=True), on_written)
+
+	def copy(self, source: str, path: str, on_written=None):
+		# path primește conținutul lui source de la momentul scrierii; dacă source are încă un conținut
+		# în coadă, acesta este scris direct
+		with self.condition:
+			queued = self.pending.get(source)
+			if queued is None and self.current is not None and self.current[0] == source:
+				queued = (self.current[1], None)
+		if queued is not None and isinstance(queued[0], str):
+			self.submit(path, queued[0], on_written)
+		else:
+			self.submit(path, CopyFrom(source), on_written)
+
+	def submit(self, path: str, content: str | CopyFrom | None, on_written):
+		with self.condition:
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, daemon=True)
+				self.thread.start()
+			replaced = self.pending.pop(path, None)
+			if replaced is not None:
+				self.coalesced += 1
+			self.pending[path] = (content, on_written)
+			self.condition.notify_all()
+		if replaced is not None and isinstance(replaced[0], CopyFrom) and replaced[0].move:
+			# fișierul temporar al unei mutări înlocuite nu mai ajunge nicăieri
+			try:
+				os.remove(replaced[0].source)
+			except OSError:
+				pass
+
+	def read(self, path: str):
+		# conținutul care va ajunge pe disc, dacă există o operație în așteptare; altfel fișierul de pe disc
+		queued = True
+		with self.condition:
+			if path in self.pending:
+				content = self.pending[path][0]
+			elif self.current is not None and self.current[0] == path:
+				content = self.current[1]
+			else:
+				queued = False
+		if not queued:
+			with open(path, "r", encoding="utf-8") as f:
+				return f.read()
+		if content is None:
+			raise FileNotFoundError(path)
+		if isinstance(content, CopyFrom):
+			try:
+				return self.read(content.source)
+			except FileNotFoundError:
+				# mutarea tocmai s-a încheiat
+				with open(path, "r", encoding="utf-8") as f:
+					return f.read()
+		return content
+
+	def is_pending(self, path: str):
+		with self.condition:
+			return path in self.pending or (self.current is not None and self.current[0] == path)
+
+	def flush(self):
+		# așteaptă până când toate operațiile cerute sunt pe disc
+		with self.condition:
+			while self.pending or self.current is not None:
+				self.condition.wait()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while not self.pending:
+					self.condition.wait()
+				path = next(iter(self.pending))
+				content, on_written = self.pending.pop(path)
+				self.current = (path, content)
+			try:
+				if content is None:
+					if os.path.exists(path):
+						os.remove(path)
+					self.removed += 1
+				elif isinstance(content, CopyFrom):
+					if content.move:
+						self.store.commit(content.source, path)
+					else:
+						shutil.copyfile(content.source, path)
+					self.written += 1
+					if on_written is not None:
+						on_written(path)
+				else:
+					self.store.write(path, content.encode("utf-8"))
+					self.written += 1
+					if on_written is not None:
+						on_written(path)
+			except OSError:
+				self.errors += 1
+			with self.condition:
+				self.current = None
+				self.condition.notify_all()
+
+	def stats(self):
+		with self.condition:
+			return {
+				"pending": len(self.pending),
+				"written": self.written,
+				"removed": self.removed,
+				"coalesced": self.coalesced,
+				"errors": self.errors,
+			}
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+from protocol import HEADER, encode_message
+
+
+STREAM_THRESHOLD = 1024 * 1024  # octeți peste care conținutul unui fișier este transmis în bucăți
+CHUNK_SIZE = 256 * 1024
+# al doilea bit de flag după FLAG_CONTENT: cadrul conține octeți bruți dintr-un transfer în bucăți
+FLAG_CHUNK = 0x20
+TEMP_PREFIX = ".tmp-"
+
+# Un mesaj cu payload["stream"] = n în loc de "content" este urmat de cadre FLAG_CHUNK
+# care conțin exact n octeți din fișier.
+
+
+def file_digest(file):
+	# același hash ca delta.content_hash, calculat fără a încărca fișierul în memorie
+	digest = hashlib.blake2b(digest_size=16)
+	file.seek(0)
+	while chunk := file.read(CHUNK_SIZE):
+		digest.update(chunk)
+	return digest.hexdigest()
+
+
+class OutgoingStream:
+	# se creează cu lock-ul fișierului deținut, ca descriptorul deschis să corespundă versiunii anunțate
+	def __init__(self, message: dict, path: str):
+		self.message: dict = message
+		self.file = open(path, "rb")
+		self.size: int = message["payload"]["stream"]
+
+	def __len__(self):
+		chunks = -(-self.size // CHUNK_SIZE)
+		return self.size + chunks * HEADER.size
+
+	def encode_header(self):
+		return encode_message(self.message)
+
+	def chunks(self):
+		for offset in range(0, self.size, CHUNK_SIZE):
+			count = min(CHUNK_SIZE, self.size - offset)
+			yield HEADER.pack(count, FLAG_CHUNK), offset, count
+
+	def send_to(self, sock):
+		sock.sendall(self.encode_header())
+		for frame_header, offset, count in self.chunks():
+			sock.sendall(frame_header)
+			if sock.sendfile(self.file, offset, count) != count:
+				raise OSError("Fișierul s-a modificat în timpul transferului.")
+
+	async def write_to(self, writer, loop):
+		writer.write(self.encode_header())
+		for frame_header, offset, count in self.chunks():
+			writer.write(frame_header)
+			await writer.drain()
+			if await loop.sendfile(writer.transport, self.file, offset, count) != count:
+				raise OSError("Fișierul s-a modificat în timpul transferului.")
+
+	def close(self):
+		self.file.close()
+
+
+class IncomingStream:
+	# scrie bucățile primite direct într-un fișier temporar; path None înseamnă că octeții sunt ignorați
+	def __init__(self, message: dict, path: str | None):
+		self.message: dict = message
+		self.size: int = message["payload"]["stream"]
+		self.received: int = 0
+		self.path: str | None = path
+		self.temp_path: str | None = None
+		self.file = None
+		self.digest = hashlib.blake2b(digest_size=16)
+
+		if not isinstance(self.size, int) or self.size < 0:
+			raise ValueError("Dimensiune de transfer invalidă.")
+		if path is not None:
+			directory, name = os.path.split(path)
+			self.temp_path = os.path.join(directory, f"{TEMP_PREFIX}{name}.{os.getpid()}.{id(self)}")
+			self.file = open(self.temp_path, "wb")
+			if self.is_complete():
+				self.file.close()
+
+	def is_complete(self):
+		return self.received >= self.size
+
+	def write(self, chunk: bytes):
+		if self.received + len(chunk) > self.size:
+			raise ValueError("Transferul depășește dimensiunea anunțată.")
+		if self.file is not None:
+			self.file.write(chunk)
+		self.digest.update(chunk)
+		self.received += len(chunk)
+		if self.is_complete() and self.file is not None:
+			self.file.close()
+		return self.is_complete()
+
+	def version(self):
+		return self.digest.hexdigest()
+
+	def commit(self, path: str = None, store=None):
+		# mută fișierul complet la destinație printr-o redenumire atomică (prin store, dacă se cere durabilitate)
+		if store is not None:
+			store.commit(self.temp_path, path or self.path)
+		else:
+			os.replace(self.temp_path, path or self.path)
+		self.temp_path = None
+
+	def discard(self):
+		if self.file is not None and not self.file.closed:
+			self.file.close()
+		if self.temp_path is not None and os.path.exists(self.temp_path):
+			os.remove(self.temp_path)
+		self.temp_path = None
@@ -0,0 +1,235 @@
+import argparse
+import itertools
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from bench import print_results, start_server
+from protocol import RECV_BUFFER_SIZE, FrameDecoder, encode_message
+from server_state import SERVER_FILES_DIR
+
+
+REQUEST_TIMEOUT = 30.0
+
+# Test de stres pentru invarianții lock-urilor, cu sute de clienți concurenți pe câteva fișiere comune:
+#   - cel mult un client deține lock-ul unui fișier la un moment dat;
+#   - LOCK întoarce conținutul scris de ultimul deținător (UPDATE și LOCK sunt atomice pe fișier);
+#   - UPDATE și RELEASE fără lock sunt refuzate cu 403;
+#   - după ce toți clienții s-au deconectat (unii fără RELEASE), niciun fișier nu mai este blocat.
+# Fără --port pornește propriul server într-un director temporar; codul de ieșire este 1 la orice încălcare.
+
+
+class Invariants:
+	def __init__(self, files: list[str]):
+		self.lock = threading.Lock()
+		self.holders: dict[str, str | None] = {file: None for file in files}
+		self.contents: dict[str, str] = {}  # fișier -> ultimul conținut scris de un deținător
+		self.violations: list[str] = []
+		self.granted: int = 0
+		self.refused: int = 0
+		self.updates: int = 0
+		self.abandoned: int = 0  # deconectări cu lock-ul încă deținut
+
+	def violation(self, message: str):
+		with self.lock:
+			self.violations.append(message)
+
+	def acquired(self, file: str, user: str, content: str | None):
+		with self.lock:
+			self.granted += 1
+			if self.holders[file] is not None:
+				self.violations.append(f"{user} și {self.holders[file]} dețin simultan {file}")
+			self.holders[file] = user
+			expected = self.contents.get(file)
+			if expected is not None and content != expected:
+				self.violations.append(f"{user} a primit la LOCK {file} alt conținut decât ultimul UPDATE")
+
+	def released(self, file: str, user: str):
+		# apelat înainte de trimiterea RELEASE (sau de închiderea conexiunii), deci intervalele nu se suprapun
+		with self.lock:
+			if self.holders[file] == user:
+				self.holders[file] = None
+
+
+class StressClient:
+	def __init__(self, username: str, address: tuple):
+		self.username: str = username
+		self.sock = socket.create_connection(address)
+		self.sock.settimeout(REQUEST_TIMEOUT)
+		self.decoder = FrameDecoder()
+		self.ids = itertools.count(1)
+
+	def request(self, request_type: str, **payload):
+		# cererile sunt trimise pe rând: broadcast-urile primite între timp sunt ignorate, răspunsul are același id
+		request_id = next(self.ids)
+		self.sock.sendall(encode_message({"type": request_type, "id": request_id, "payload": payload}))
+		while True:
+			data = self.sock.recv(RECV_BUFFER_SIZE)
+			if not data:
+				raise ConnectionError("Conexiunea cu serverul s-a închis.")
+			for message in self.decoder.messages(data):
+				if message.get("id") == request_id:
+					return message
+
+	def close(self):
+		self.sock.close()
+
+
+def run_client(index: int, args, address: tuple, files: list[str], invariants: Invariants, start: threading.Barrier):
+	rng = random.Random(args.seed + index)
+	username = f"stress{index}"
+	client = None
+	try:
+		client = StressClient(username, address)
+		if client.request("AUTH", username=username, list=False)["status"] != 200:
+			invariants.violation(f"AUTH refuzat pentru {username}")
+			client.close()
+			client = None
+	except (OSError, ConnectionError) as e:
+		invariants.violation(f"{username} nu s-a putut conecta: {e}")
+		client = None
+	# toți clienții încep împreună, după ce s-au conectat
+	start.wait()
+	if client is None:
+		return
+
+	held = None
+	try:
+		for step in range(args.ops):
+			file = rng.choice(files)
+			response = client.request("LOCK", file=file)
+			if response["status"] == 403:
+				with invariants.lock:
+					invariants.refused += 1
+				# fără lock, modificarea trebuie refuzată
+				if client.request("UPDATE", file=file, content=f"{username} fără lock\n")["status"] != 403:
+					invariants.violation(f"{username} a modificat {file} fără lock")
+				if client.request("RELEASE", file=file)["status"] != 403:
+					invariants.violation(f"{username} a eliberat {file} fără lock")
+				continue
+			if response["status"] != 200:
+				invariants.violation(f"LOCK {file} pentru {username}: {response['status']} {response.get('message')}")
+				continue
+
+			held = file
+			invariants.acquired(file, username, response["payload"].get("content"))
+			for update in range(rng.randint(0, 2)):
+				content = f"{username} {step} {update}\n"
+				with invariants.lock:
+					invariants.contents[file] = content
+					invariants.updates += 1
+				status = client.request("UPDATE", file=file, content=content)["status"]
+				if status != 200:
+					invariants.violation(f"UPDATE {file} de la deținătorul {username}: {status}")
+
+			if rng.random() < args.abandon:
+				# deconectare fără RELEASE: serverul trebuie să elibereze lock-ul
+				invariants.released(file, username)
+				with invariants.lock:
+					invariants.abandoned += 1
+				return
+			invariants.released(file, username)
+			held = None
+			if client.request("RELEASE", file=file)["status"] != 200:
+				invariants.violation(f"RELEASE {file} de la deținătorul {username} refuzat")
+	except (OSError, ConnectionError) as e:
+		if held is not None:
+			invariants.released(held, username)
+		invariants.violation(f"{username}: {e}")
+	finally:
+		client.close()
+
+
+def check_released(address: tuple, files: list[str], invariants: Invariants):
+	# conexiunile închise sunt tratate asincron de server: lock-urile lor sunt așteptate câteva secunde
+	client = StressClient("stress-check", address)
+	try:
+		client.request("AUTH", username="stress-check", list=False)
+		deadline = time.monotonic() + 5.0
+		while True:
+			listed = client.request("LIST", limit=len(files) + 100)["payload"].get("files", {})
+			locked = sorted(file for file in files if listed.get(file, {}).get("locked_by"))
+			if not locked or time.monotonic() > deadline:
+				break
+			time.sleep(0.1)
+		for file in locked:
+			invariants.violation(f"{file} a rămas blocat de {listed[file]['locked_by']} după deconectarea tuturor")
+	finally:
+		client.close()
+
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Test de stres pentru invarianții lock-urilor serverului.")
+	parser.add_argument("--host", default="localhost")
+	parser.add_argument("--port", type=int, help="serverul testat; fără el se pornește unul nou într-un director temporar")
+	parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread", help="motorul serverului pornit de test")
+	parser.add_argument("--clients", type=int, default=300)
+	parser.add_argument("--files", type=int, default=10, help="fișiere comune, disputate de toți clienții")
+	parser.add_argument("--ops", type=int, default=30, help="încercări de LOCK per client")
+	parser.add_argument("--abandon", type=float, default=0.05, help="probabilitatea ca un deținător să se deconecteze fără RELEASE")
+	parser.add_argument("--seed", type=int, default=0)
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	files = [f"stress_{i}.txt" for i in range(args.files)]
+	server = None
+	directory = None
+	if args.port is None:
+		directory = tempfile.TemporaryDirectory(dir=".")
+		os.makedirs(os.path.join(directory.name, SERVER_FILES_DIR))
+		for file in files:
+			with open(os.path.join(directory.name, SERVER_FILES_DIR, file), "w", encoding="utf-8") as f:
+				f.write("\n")
+		server, port = start_server(directory.name, "--engine", args.engine, "--history", "off")
+		address = (args.host, port)
+	else:
+		address = (args.host, args.port)
+
+	invariants = Invariants(files)
+	try:
+		start = threading.Barrier(args.clients + 1)
+		threads = [
+			threading.Thread(target=run_client, args=(i, args, address, files, invariants, start)) for i in range(args.clients)
+		]
+		for thread in threads:
+			thread.start()
+		start.wait()
+		started = time.perf_counter()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - started
+		check_released(address, files, invariants)
+	finally:
+		if server is not None:
+			server.terminate()
+			server.wait()
+		if directory is not None:
+			directory.cleanup()
+
+	print_results(
+		[
+			{
+				"clients": args.clients,
+				"files": args.files,
+				"locks": invariants.granted,
+				"refused": invariants.refused,
+				"updates": invariants.updates,
+				"abandoned": invariants.abandoned,
+				"seconds": round(elapsed, 2),
+				"violations": len(invariants.violations),
+			}
+		]
+	)
+	for message in invariants.violations[:20]:
+		print(f"- {message}")
+	sys.exit(1 if invariants.violations else 0)
+
+
+if __name__ == "__main__":
+	main()
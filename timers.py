@@ -0,0 +1,55 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class TimerHeap:
+	# termene ordonate într-un min-heap, urmărite de un singur fir: la fiecare trezire sunt scoase doar
+	# termenele ajunse la scadență, în O(log n) fiecare, iar on_expire(item) este apelat pentru ele.
+	# Un item are cel mult un termen în heap; cine vrea să-l amâne îl reprogramează când expiră,
+	# în loc să-l mute la fiecare activitate (vezi ServerState.on_timer)
+	def __init__(self, on_expire):
+		self.on_expire = on_expire
+		self.heap: list[tuple[float, int, object]] = []  # (termen monotonic, ordine, item)
+		self.scheduled: set = set()
+		self.counter = itertools.count()
+		self.condition = threading.Condition()
+		self.expired: int = 0
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def schedule(self, deadline: float, item):
+		# întoarce False dacă item are deja un termen în heap
+		with self.condition:
+			if item in self.scheduled:
+				return False
+			self.scheduled.add(item)
+			heapq.heappush(self.heap, (deadline, next(self.counter), item))
+			if self.heap[0][2] is item:
+				self.condition.notify()
+			return True
+
+	def run(self):
+		while True:
+			with self.condition:
+				while True:
+					now = time.monotonic()
+					if self.heap and self.heap[0][0] <= now:
+						break
+					self.condition.wait(self.heap[0][0] - now if self.heap else None)
+				due = []
+				while self.heap and self.heap[0][0] <= now:
+					_, _, item = heapq.heappop(self.heap)
+					self.scheduled.discard(item)
+					due.append(item)
+				self.expired += len(due)
+			for item in due:
+				self.on_expire(item)
+
+	def stats(self):
+		with self.condition:
+			return {"scheduled": len(self.heap), "expired": self.expired}
@@ -0,0 +1,155 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+
+WATCH_MODES = ("auto", "inotify", "poll", "off")
+WATCH_DEBOUNCE = 0.2  # secunde fără evenimente noi după care o rafală de modificări este aplicată
+POLL_INTERVAL = 1.0
+FULL_SCAN_INTERVAL = 30.0  # în modul poll, secunde după care modificările considerate proprii sunt totuși verificate
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOSE_WRITE = 0x00000008
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; urmat de len octeți de nume
+
+
+def load_inotify():
+	if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+		return None
+	name = ctypes.util.find_library("c")
+	if name is None:
+		return None
+	libc = ctypes.CDLL(name, use_errno=True)
+	if not hasattr(libc, "inotify_init1"):
+		return None
+	return libc
+
+
+class DirectoryWatcher:
+	# urmărește intrările unui director și apelează on_change(names) cu numele posibil modificate,
+	# după ce o rafală de evenimente s-a liniștit; names = None cere o rescanare completă
+	def __init__(self, directory: str, on_change, mode: str = "auto", debounce: float = WATCH_DEBOUNCE, poll_interval: float = POLL_INTERVAL):
+		self.directory: str = directory
+		self.on_change = on_change
+		self.debounce: float = debounce
+		self.poll_interval: float = poll_interval
+		self.libc = load_inotify() if mode in ("auto", "inotify") else None
+		if mode == "inotify" and self.libc is None:
+			raise OSError("inotify nu este disponibil pe acest sistem.")
+		self.mode: str = "inotify" if self.libc is not None else "poll"
+		self.lock = threading.Lock()
+		self.own_mtime: int | None = None  # mtime-ul directorului după ultima modificare făcută de server
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def own_change(self):
+		# apelat de server după ce a modificat el însuși directorul: un UPDATE scrie un fișier temporar și îl
+		# redenumește peste original, ceea ce schimbă mtime-ul directorului fără a schimba lista de fișiere
+		if self.mode != "poll":
+			return
+		try:
+			mtime = os.stat(self.directory).st_mtime_ns
+		except OSError:
+			return
+		with self.lock:
+			self.own_mtime = mtime
+
+	def run(self):
+		if self.mode == "inotify":
+			self.run_inotify()
+		else:
+			self.run_poll()
+
+	def run_inotify(self):
+		fd = self.libc.inotify_init1(os.O_CLOEXEC)
+		if fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1")
+		if self.libc.inotify_add_watch(fd, os.fsencode(self.directory), WATCH_MASK | IN_ONLYDIR) < 0:
+			os.close(fd)
+			raise OSError(ctypes.get_errno(), "inotify_add_watch")
+
+		try:
+			while True:
+				select.select([fd], [], [])
+				names: set | None = set()
+				# adună evenimentele până când directorul nu mai primește altele timp de debounce
+				while select.select([fd], [], [], self.debounce)[0]:
+					data = os.read(fd, 64 * 1024)
+					if names is not None:
+						names = self.parse_events(data, names)
+				self.on_change(names)
+		finally:
+			os.close(fd)
+
+	def parse_events(self, data: bytes, names: set):
+		offset = 0
+		while offset < len(data):
+			_, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+			offset += INOTIFY_EVENT.size
+			if mask & IN_Q_OVERFLOW:
+				return None
+			name = data[offset : offset + length].rstrip(b"\0")
+			offset += length
+			if name:
+				names.add(os.fsdecode(name))
+		return names
+
+	def run_poll(self):
+		# mtime-ul directorului se schimbă doar când sunt adăugate, șterse sau redenumite intrări,
+		# deci directorul este listat din nou numai atunci, nu la fiecare interval. Un mtime lăsat de o
+		# modificare a serverului (own_change) nu este listat imediat: o modificare din afară făcută în
+		# același moment este găsită de listarea amânată, după cel mult FULL_SCAN_INTERVAL
+		last_mtime = None
+		snapshot = self.scan()
+		scanned_at = time.monotonic()
+		unverified = False
+		while True:
+			time.sleep(self.poll_interval)
+			try:
+				mtime = os.stat(self.directory).st_mtime_ns
+			except OSError:
+				continue
+			overdue = time.monotonic() - scanned_at >= FULL_SCAN_INTERVAL
+			if mtime == last_mtime:
+				if not (unverified and overdue):
+					continue
+			else:
+				# debounce: așteaptă ca directorul să nu se mai modifice înainte de a-l lista
+				while True:
+					time.sleep(self.debounce)
+					current = os.stat(self.directory).st_mtime_ns
+					if current == mtime:
+						break
+					mtime = current
+				last_mtime = mtime
+				with self.lock:
+					own = mtime == self.own_mtime
+				if own and not overdue:
+					unverified = True
+					continue
+
+			entries = self.scan()
+			scanned_at = time.monotonic()
+			unverified = False
+			changed = set(entries.keys() ^ snapshot.keys())
+			changed.update(name for name, is_file in entries.items() if snapshot.get(name, is_file) != is_file)
+			snapshot = entries
+			if changed:
+				self.on_change(changed)
+
+	def scan(self):
+		with os.scandir(self.directory) as entries:
+			return {entry.name: entry.is_file() for entry in entries}